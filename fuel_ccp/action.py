@@ -5,13 +5,14 @@ import os
 import uuid
 
 from pykube import exceptions as pykube_exc
-import yaml
 
 from fuel_ccp.common import jinja_utils
 from fuel_ccp.common import utils
 from fuel_ccp import config
+from fuel_ccp.config import _yaml
 from fuel_ccp.config import images as config_images
 from fuel_ccp import exceptions
+from fuel_ccp import informer
 from fuel_ccp import kubernetes
 from fuel_ccp import templates
 
@@ -248,15 +249,15 @@ class ActionStatus(object):
 
     @classmethod
     def get_actions(cls, action_name=None):
-        selector = "ccp-action=true"
+        selector = "ccp=true,ccp-action=true"
         if action_name:
             selector += "," + "app=%s" % action_name
         actions = []
         job_names = []
-        for job in kubernetes.list_cluster_jobs(selector=selector):
+        for job in informer.list_objects("Job", selector):
             actions.append(cls(job))
             job_names.append(job.name)
-        for pod in kubernetes.list_cluster_pods(selector=selector):
+        for pod in informer.list_objects("Pod", selector):
             job_name = pod.labels.get("job-name")
             if job_name and job_name not in job_names:
                 actions.append(cls(pod, job_name))
@@ -300,7 +301,7 @@ class ActionStatus(object):
             return self._spec.logs()
         else:
             pod_selector = "job-name=%s" % self._spec.name
-            pods = kubernetes.list_cluster_pods(raw_selector=pod_selector)
+            pods = informer.list_objects("Pod", pod_selector)
             for pod in pods:
                 if pod.obj['status']['phase'] == "Failed":
                     continue
@@ -318,14 +319,11 @@ class ActionStatus(object):
 
     @staticmethod
     def delete_action(action_name):
-        try:
-            action = kubernetes.list_cluster_jobs(name=action_name)
-        except pykube_exc.ObjectDoesNotExist:
-            try:
-                action = kubernetes.list_cluster_pods(name=action_name)
-            except pykube_exc.ObjectDoesNotExist:
-                LOG.error('Action with name %s not found', action_name)
-                return False
+        action = (informer.get_object("Job", action_name) or
+                  informer.get_object("Pod", action_name))
+        if action is None:
+            LOG.error('Action with name %s not found', action_name)
+            return False
         try:
             action.delete()
         except pykube_exc.HTTPError as ex:
@@ -336,11 +334,11 @@ class ActionStatus(object):
 
     @staticmethod
     def delete_configmap(action_name):
+        configmap = informer.get_object("ConfigMap", action_name)
+        if configmap is None:
+            return True
         try:
-            configmap = kubernetes.get_configmap(action_name)
             configmap.delete()
-        except pykube_exc.ObjectDoesNotExist:
-            pass
         except pykube_exc.HTTPError as ex:
             LOG.error(ex.message)
             return False
@@ -363,7 +361,8 @@ def list_actions():
                 action_file = os.path.join(action_path, filename)
                 conf = utils.get_rendering_config()
                 data = jinja_utils.jinja_render(action_file, conf._dict)
-                for action_dict in yaml.load(data).get("actions", ()):
+                for action_dict in _yaml.safe_load(data).get(
+                        "actions", ()):
                     actions.append(Action(component=component_name,
                                           component_dir=repo,
                                           **action_dict))
@@ -1,22 +1,41 @@
+import collections
 from concurrent import futures
 import contextlib
+import hashlib
+import heapq
+import io
+import itertools
 import json
 import logging
 import os
 import re
 import shutil
 import sys
+import tarfile
 import tempfile
+import threading
+import time
 
 import docker
 import git
 
+from fuel_ccp.common import cache
 from fuel_ccp.common import jinja_utils
 from fuel_ccp import config
 from fuel_ccp.config import images
 
 BUILD_TIMEOUT = 2 ** 16  # in seconds
 
+# Digest of all inputs of the image build is stored in this label
+DIGEST_LABEL = 'ccp.build-digest'
+
+_GIT_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+_FROM_RE = re.compile(r'^\s*FROM\s+(\S+)', re.MULTILINE | re.IGNORECASE)
+
+_SOURCES_LOCK = threading.Lock()
+_SOURCE_LOCKS = {}
+_UPDATED_MIRRORS = set()
+
 CONF = config.CONF
 
 LOG = logging.getLogger(__name__)
@@ -61,53 +80,416 @@ def render_dockerfile(path, name, config):
     return content, sources, render_files, parent[0] if parent else None
 
 
-def prepare_source(source_name, name, dest_dir, config):
-    tmp_dir = os.path.join(dest_dir, source_name)
+def _get_lock(key):
+    with _SOURCES_LOCK:
+        return _SOURCE_LOCKS.setdefault(key, threading.Lock())
+
 
-    git_url = config['sources'].get(source_name, {}).get('git_url')
-    source_dir = config['sources'].get(source_name, {}).get('source_dir')
+def update_mirror(git_url, build_dir):
+    """Create or update local bare mirror of the repository
 
-    if git_url:
-        LOG.info('%s: Cloning repository "%s"', name, git_url)
-        repo = git.Repo.clone_from(git_url, tmp_dir)
-        ref = config['sources'][source_name]['git_ref']
-        LOG.info('%s: Changing reference to "%s"', name, ref)
+    Mirrors are stored in the cache and updated once per build.
+
+    :returns: str -- path to the mirror
+    """
+    path = os.path.join(CONF.cache.path, 'sources',
+                        cache.get_key(git_url) + '.git')
+    with _get_lock(path):
+        if (path, build_dir) in _UPDATED_MIRRORS:
+            return path
+        if os.path.isdir(path):
+            LOG.info('Updating mirror of repository "%s"', git_url)
+            git.Repo(path).git.remote('update', '--prune')
+        else:
+            LOG.info('Cloning mirror of repository "%s"', git_url)
+            tmp_path = path + '.tmp'
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path)
+            git.Repo.clone_from(git_url, tmp_path, mirror=True)
+            os.rename(tmp_path, path)
+        _UPDATED_MIRRORS.add((path, build_dir))
+    return path
+
+
+def checkout_source(git_url, ref, build_dir):
+    """Check out the reference of the repository once per build
+
+    Checkout is cloned from the local mirror, so its objects are hardlinks
+    to the mirror ones.
+
+    :returns: str -- path to the checkout
+    """
+    path = os.path.join(build_dir, '.sources', cache.get_key(git_url, ref))
+    with _get_lock(path):
+        if os.path.isdir(path):
+            return path
+        mirror = update_mirror(git_url, build_dir)
+        tmp_path = path + '.tmp'
+        repo = git.Repo.clone_from(mirror, tmp_path, local=True,
+                                   no_checkout=True)
         repo.git.checkout(ref)
-        LOG.info('%s: Repository %s has been cloned', name, git_url)
+        repo.git.remote('set-url', 'origin', git_url)
+        os.rename(tmp_path, path)
+        LOG.info('Repository "%s" has been checked out at "%s"', git_url,
+                 ref)
+    return path
 
-    if source_dir:
-        LOG.info('%s: Using local directory %s', name, source_dir)
-        shutil.copytree(source_dir, tmp_dir)
 
+def get_source_path(source_name, name, build_dir, config):
+    """Get path to the source contents
+
+    :returns: tuple -- (path, dereference), where dereference is True if
+        symlinks in the source should be replaced with their contents
+    """
+    source = config['sources'].get(source_name, {})
+    if source.get('git_url'):
+        LOG.info('%s: Using repository "%s" at "%s"', name,
+                 source['git_url'], source['git_ref'])
+        return checkout_source(source['git_url'], source['git_ref'],
+                               build_dir), False
+    if source.get('source_dir'):
+        LOG.info('%s: Using local directory %s', name, source['source_dir'])
+        return source['source_dir'], True
+    return None, False
 
-def create_rendered_dockerfile(dockerfile, tmp_path, config):
-    src_dir = os.path.dirname(dockerfile['path'])
-    dest_dir = os.path.join(tmp_path, dockerfile['name'])
-    os.makedirs(dest_dir)
-    dockerfilename = os.path.join(dest_dir, 'Dockerfile')
-    with open(dockerfilename, 'w') as f:
-        f.write(dockerfile['content'])
 
-    for source_name in dockerfile['sources']:
-        prepare_source(source_name, dockerfile['name'], dest_dir, config)
+# Member of the build context, either path to a file or directory or
+# content of a file is set
+ContextMember = collections.namedtuple(
+    'ContextMember', 'name path content dereference recursive')
+
+
+def _content_member(name, content):
+    return ContextMember(name, None, content.encode('utf-8'), False, False)
+
+
+def get_build_context(dockerfile, build_dir, config):
+    """Get members of the image build context
+
+    Sources are checked out and files are rendered here, while contents of
+    the directories are read only when the context is streamed.
+
+    :returns: list -- ContextMember tuples
+    """
+    src_dir = os.path.dirname(dockerfile['path'])
+    content = dockerfile['content']
+    if dockerfile.get('digest'):
+        content += '\nLABEL %s=%s\n' % (DIGEST_LABEL, dockerfile['digest'])
+    members = [_content_member('Dockerfile', content)]
+
+    for source_name in sorted(dockerfile['sources']):
+        path, dereference = get_source_path(
+            source_name, dockerfile['name'], build_dir, config)
+        if path:
+            members.append(ContextMember(source_name, path, None,
+                                         dereference, True))
 
     for render_file in dockerfile['render_files']:
         fpath = os.path.join(src_dir, render_file['src'])
-        opath = os.path.join(dest_dir, render_file['dest'])
-        content = jinja_utils.jinja_render(fpath, config['render'])
-        with open(opath, 'wb') as f:
-            f.write(content.encode('utf-8'))
+        members.append(_content_member(
+            render_file['dest'],
+            jinja_utils.jinja_render(fpath, config['render'])))
+
+    dockerignore = os.path.join(src_dir, '.dockerignore')
+    if os.path.exists(dockerignore):
+        with open(dockerignore) as f:
+            patterns = [line for line in f.read().splitlines() if line]
+        names = sorted(docker.utils.exclude_paths(src_dir, patterns))
+        recursive = False
+    else:
+        names = sorted(os.listdir(src_dir))
+        recursive = True
+    for name in names:
+        if 'Dockerfile' in name.split(os.sep)[0]:
+            continue
+        members.append(ContextMember(name, os.path.join(src_dir, name), None,
+                                     True, recursive))
+    return members
 
-    for filename in os.listdir(src_dir):
-        if 'Dockerfile' in filename:
+
+def _iter_tree(member):
+    yield member.name, member.path
+    if not member.recursive or not os.path.isdir(member.path) or (
+            os.path.islink(member.path) and not member.dereference):
+        return
+    for root, dirs, files in os.walk(member.path,
+                                     followlinks=member.dereference):
+        dirs.sort()
+        rel_root = os.path.relpath(root, member.path)
+        for name in sorted(dirs + files):
+            yield (os.path.normpath(os.path.join(member.name, rel_root, name)),
+                   os.path.join(root, name))
+
+
+class _ChunksWriter(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        del self.chunks[:]
+        return data
+
+
+def _add_members(tar, members):
+    for member in members:
+        if member.path is None:
+            info = tarfile.TarInfo(member.name)
+            info.size = len(member.content)
+            info.mtime = time.time()
+            tar.addfile(info, io.BytesIO(member.content))
+            yield
             continue
-        full_filename = os.path.join(src_dir, filename)
-        if os.path.isfile(full_filename):
-            shutil.copy(full_filename, dest_dir)
-        elif os.path.isdir(full_filename):
-            shutil.copytree(full_filename, os.path.join(dest_dir, filename))
+        tar.dereference = member.dereference
+        for name, path in _iter_tree(member):
+            tar.add(path, arcname=name, recursive=False)
+            yield
+    tar.close()
+    yield
+
+
+def stream_build_context(members):
+    """Generate tar archive of the build context chunk by chunk
+
+    Data is produced after every added file, so the whole archive is never
+    kept in memory or written to the disk. Empty chunks are never produced,
+    since older versions of requests end chunked body on the first of them.
+    """
+    writer = _ChunksWriter()
+    tar = tarfile.open(fileobj=writer, mode='w|')
+    for _ in _add_members(tar, members):
+        data = writer.pop()
+        if data:
+            yield data
+
+
+def _update_tree_digest(digest, path, skip_dockerfiles=False):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            if skip_dockerfiles and root == path and 'Dockerfile' in filename:
+                continue
+            full_filename = os.path.join(root, filename)
+            digest.update(os.path.relpath(full_filename, path).encode('utf-8'))
+            with open(full_filename, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+
+
+def get_git_sha(git_url, ref):
+    """Get commit SHA the reference points to without cloning repository
+
+    :returns: str -- SHA or None if the reference is not found
+    """
+    if _GIT_SHA_RE.match(ref):
+        return ref
+    try:
+        output = git.cmd.Git().ls_remote(git_url, ref)
+    except git.exc.GitCommandError as e:
+        LOG.debug('Failed to resolve %s of %s: %s', ref, git_url, e)
+        return None
+    # ls-remote matches references by suffix, so refs/heads/fix/master is
+    # returned for master too
+    shas = {}
+    for line in output.splitlines():
+        sha, name = line.split()
+        shas[name] = sha
+    for name in ('refs/heads/%s' % ref, 'refs/tags/%s^{}' % ref,
+                 'refs/tags/%s' % ref, ref):
+        if name in shas:
+            return shas[name]
+    return None
+
+
+def get_base_image_name(dockerfile):
+    """Get name of the external image the root Dockerfile is built from"""
+    match = _FROM_RE.search(dockerfile['content'] or '')
+    return match.group(1) if match else None
+
+
+def get_base_images(dc, names):
+    """Identify local copies of the external base images
+
+    :returns: dict -- image name to its ID and repo digests, or to None if
+        the image isn't pulled yet
+    """
+    base_images = {}
+    for name in names:
+        try:
+            image = dc.inspect_image(name)
+        except docker.errors.APIError:
+            base_images[name] = None
+            continue
+        base_images[name] = json.dumps(
+            [image['Id'], sorted(image.get('RepoDigests') or [])])
+    return base_images
+
+
+def get_build_digest(dockerfile, config, git_shas, base_images=None):
+    """Get digest of all inputs of the image build
+
+    Rendered Dockerfile, files from its directory, rendered files, sources and
+    digest of the parent image are used. For external parent images the ID
+    of the local copy is used instead of the digest.
+
+    :param git_shas: dict of (git_url, git_ref) to resolved commit SHA
+    :param base_images: dict returned by get_base_images
+    :returns: str -- digest or None if some of the inputs can't be identified
+    """
+    parent = dockerfile['parent']
+    if isinstance(parent, dict):
+        if not parent.get('digest'):
+            return None
+        parent = parent['digest']
+    else:
+        base_name = get_base_image_name(dockerfile)
+        if base_name is not None:
+            parent = (base_images or {}).get(base_name)
+            if parent is None:
+                return None
+    digest = hashlib.sha1()
+    digest.update(json.dumps([dockerfile['content'], parent]).encode('utf-8'))
+    src_dir = os.path.dirname(dockerfile['path'])
+    _update_tree_digest(digest, src_dir, skip_dockerfiles=True)
+    for render_file in dockerfile['render_files']:
+        content = jinja_utils.jinja_render(
+            os.path.join(src_dir, render_file['src']), config['render'])
+        digest.update(render_file['dest'].encode('utf-8'))
+        digest.update(content.encode('utf-8'))
+    for source_name in sorted(dockerfile['sources']):
+        source = config['sources'][source_name]
+        digest.update(source_name.encode('utf-8'))
+        if source.get('git_url'):
+            sha = git_shas.get((source['git_url'], source['git_ref']))
+            if sha is None:
+                return None
+            digest.update(sha.encode('utf-8'))
+        if source.get('source_dir'):
+            _update_tree_digest(digest, source['source_dir'])
+    return digest.hexdigest()
+
+
+def get_image_digest(dc, dockerfile):
+    """Get build digest from the label of the local image
+
+    :returns: str -- digest or None if the image or the label doesn't exist
+    """
+    try:
+        image = dc.inspect_image(dockerfile['full_name'])
+    except docker.errors.APIError:
+        return None
+    labels = (image.get('Config') or {}).get('Labels') or {}
+    return labels.get(DIGEST_LABEL)
+
+
+def set_build_digests(dockerfiles, config, ready_images=()):
+    """Calculate build digests of the matched images and related ones
+
+    Git references of all sources are resolved concurrently, digests are
+    calculated from base images to their children. Images which are not
+    built in this run get the digest of their local copy, since their
+    children are built on top of it.
+    """
+    related = {}
+    for dockerfile in dockerfiles.values():
+        if not dockerfile['match']:
+            continue
+        parent = dockerfile
+        while parent is not None and id(parent) not in related:
+            related[id(parent)] = parent
+            parent = parent['parent']
+        stack = list(dockerfile['children'])
+        while stack:
+            child = stack.pop()
+            related[id(child)] = child
+            stack.extend(child['children'])
+
+    refs = set()
+    for dockerfile in related.values():
+        for source_name in dockerfile['sources']:
+            source = config['sources'][source_name]
+            if source.get('git_url'):
+                refs.add((source['git_url'], source['git_ref']))
+    refs = sorted(refs)
+    with futures.ThreadPoolExecutor(
+            max_workers=max(1, min(len(refs), CONF.builder.workers))) as (
+            executor):
+        git_shas = dict(zip(refs, executor.map(
+            lambda ref: get_git_sha(*ref), refs)))
+
+    roots = [d for d in related.values() if d['parent'] is None]
+    base_names = set(get_base_image_name(d) for d in roots)
+    base_names.discard(None)
+    with get_docker_client() as dc:
+        base_images = get_base_images(dc, sorted(base_names))
+
+        stack = [(d, False) for d in roots]
+        while stack:
+            dockerfile, parent_built = stack.pop()
+            # The same images are processed by process_dockerfile
+            built = dockerfile['match'] or (
+                parent_built and CONF.builder.keep_image_tree_consistency and
+                dockerfile['name'] in ready_images)
+            if built:
+                dockerfile['digest'] = get_build_digest(
+                    dockerfile, config, git_shas, base_images)
+            else:
+                dockerfile['digest'] = get_image_digest(dc, dockerfile)
+            stack.extend((c, built) for c in dockerfile['children']
+                         if id(c) in related)
+
+
+def use_build_cache():
+    """Check if unchanged images can be skipped
 
-    return dockerfilename
+    Explicitly disabled docker cache means that images have to be rebuilt.
+    """
+    return CONF.builder.skip_unchanged and not CONF.builder.no_cache
+
+
+def _get_index_key(dockerfile):
+    return cache.get_key(dockerfile['full_name'])
+
+
+def check_build_cache(dc, dockerfile):
+    """Check if the image has been built from the same inputs already
+
+    Image is built if it exists locally with the same digest label. It is
+    pushed if the local index records a push of the same digest into the
+    configured registry, in this case a local copy isn't required.
+
+    :returns: tuple -- (built, pushed) booleans
+    """
+    digest = dockerfile.get('digest')
+    if not digest or not use_build_cache():
+        return False, False
+    need_push = bool(CONF.builder.push and CONF.registry.address)
+    index = cache.get('images', _get_index_key(dockerfile)) or {}
+    pushed = need_push and index.get('digest') == digest and (
+        index.get('registry') == CONF.registry.address)
+    try:
+        image = dc.inspect_image(dockerfile['full_name'])
+    except docker.errors.APIError:
+        return pushed, pushed
+    labels = (image.get('Config') or {}).get('Labels') or {}
+    if labels.get(DIGEST_LABEL) != digest:
+        return False, False
+    return True, pushed
+
+
+def update_build_index(dockerfile):
+    if not dockerfile.get('digest'):
+        return
+    if dockerfile['push_result'] in ('Success', 'Exists'):
+        registry = CONF.registry.address
+    elif dockerfile['build_result'] == 'Success':
+        registry = None
+    else:
+        return
+    cache.set('images', _get_index_key(dockerfile),
+              {'digest': dockerfile['digest'], 'registry': registry})
 
 
 def find_dockerfiles(repository_name, match=True):
@@ -132,6 +514,7 @@ def find_dockerfiles(repository_name, match=True):
             'push_result': None,
             'content': None,
             'sources': None,
+            'digest': None,
         }
 
     if len(dockerfiles) == 0:
@@ -198,13 +581,117 @@ def get_dockerfiles_tree(match=False, config=None):
     return dockerfiles
 
 
-def build_dockerfile(dc, dockerfile):
+class PriorityExecutor(object):
+    """Thread pool that runs submitted calls with higher priority first"""
+
+    def __init__(self, max_workers):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._threads = []
+        for _ in range(max_workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, priority, fn, *args, **kwargs):
+        future = futures.Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit after shutdown')
+            # Counter keeps calls with the same priority in submission order
+            heapq.heappush(self._queue, (-priority, next(self._counter),
+                                         future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, future, fn, args, kwargs = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+
+
+def _get_duration_key(dockerfile):
+    return cache.get_key(dockerfile['name'])
+
+
+def get_build_durations(dockerfiles):
+    """Get durations of the previous builds of images
+
+    Images that were never built get the average duration of other images.
+    """
+    durations = {}
+    for name, dockerfile in dockerfiles.items():
+        value = cache.get('build-durations', _get_duration_key(dockerfile))
+        if value:
+            durations[name] = value['duration']
+    default = (sum(durations.values()) / len(durations)
+               if durations else 1.0)
+    for name in dockerfiles:
+        durations.setdefault(name, default)
+    return durations
+
+
+def set_build_priorities(dockerfiles, ready_images):
+    """Set priority of each image to the duration of its longest chain
+
+    Priority is the sum of build durations along the longest path from the
+    image to the leaves that are going to be built, so images on the
+    critical path of the whole tree are built first.
+    """
+    durations = get_build_durations(dockerfiles)
+    # Children are visited before their parents
+    stack = [(d, False) for d in dockerfiles.values() if d['parent'] is None]
+    while stack:
+        dockerfile, visited = stack.pop()
+        children = [c for c in dockerfile['children'] if c['match'] or (
+            CONF.builder.keep_image_tree_consistency and
+            c['name'] in ready_images)]
+        if not visited:
+            stack.append((dockerfile, True))
+            stack.extend((child, False) for child in children)
+            continue
+        dockerfile['priority'] = durations[dockerfile['name']] + max(
+            [child['priority'] for child in children] or [0])
+
+
+def build_dockerfile(dc, dockerfile, context):
     LOG.info("%s: Starting image build", dockerfile['name'])
+    start_time = time.time()
     for line in dc.build(rm=True,
                          forcerm=True,
                          nocache=CONF.builder.no_cache,
                          tag=dockerfile['full_name'],
-                         path=os.path.dirname(dockerfile['path'])):
+                         fileobj=stream_build_context(context),
+                         custom_context=True):
         if _SHUTDOWN:
             raise RuntimeError("Building '{}' was interrupted".format(
                 dockerfile['name']
@@ -219,22 +706,21 @@ def build_dockerfile(dc, dockerfile):
             dockerfile['build_result'] = 'Failure'
             return
     dockerfile['build_result'] = 'Success'
+    cache.set('build-durations', _get_duration_key(dockerfile),
+              {'duration': time.time() - start_time})
     LOG.info("%s: Build succeeded", dockerfile['name'])
 
 
-def push_dockerfile(dc, dockerfile):
+def push_dockerfile(dc, dockerfile, auth_config=None):
     if dockerfile['build_result'] == 'Failure':
         dockerfile['push_result'] = 'Failure'
         LOG.error("%s: Push will be skipped due to build failure",
                   dockerfile['name'])
         return
-    if CONF.registry.username and CONF.registry.password:
-        dc.login(username=CONF.registry.username,
-                 password=CONF.registry.password,
-                 registry=CONF.registry.address)
     for line in dc.push(dockerfile['full_name'],
                         stream=True,
-                        insecure_registry=CONF.registry.insecure):
+                        insecure_registry=CONF.registry.insecure,
+                        auth_config=auth_config):
         build_data = json.loads(line.decode("UTF-8"))
 
         status = build_data.get('status', '')
@@ -269,14 +755,109 @@ def get_docker_client():
             timeout=CONF.registry.timeout))
 
 
+def get_auth_config(dc, registry):
+    """Log in to the registry if credentials are configured
+
+    :returns: dict -- credentials to pass with pushes or None
+    """
+    if not (CONF.registry.username and CONF.registry.password):
+        return None
+    dc.login(username=CONF.registry.username,
+             password=CONF.registry.password,
+             registry=registry)
+    return {'username': CONF.registry.username,
+            'password': CONF.registry.password,
+            'serveraddress': registry}
+
+
+class Pusher(object):
+    """Pushes built images concurrently with the builds
+
+    Pushes have their own workers, so build workers don't wait for network
+    I/O. Each registry is logged in once, then the credentials are passed
+    with every push.
+    """
+
+    def __init__(self, max_workers):
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._registry_locks = {}
+        self._auth_configs = {}
+        self._pushed = 0
+        self._start_time = None
+        self._end_time = None
+
+    def _get_auth_config(self, dc, registry):
+        with self._lock:
+            registry_lock = self._registry_locks.setdefault(
+                registry, threading.Lock())
+        # Only pushes into the same registry wait for the login
+        with registry_lock:
+            if registry not in self._auth_configs:
+                self._auth_configs[registry] = get_auth_config(dc, registry)
+            return self._auth_configs[registry]
+
+    def _push(self, dockerfile):
+        with get_docker_client() as dc:
+            auth_config = self._get_auth_config(dc, CONF.registry.address)
+            with self._lock:
+                if self._start_time is None:
+                    self._start_time = time.time()
+            push_dockerfile(dc, dockerfile, auth_config)
+        update_build_index(dockerfile)
+        with self._lock:
+            if dockerfile['push_result'] in ('Success', 'Exists'):
+                self._pushed += 1
+            self._end_time = time.time()
+
+    def submit(self, dockerfile, future_list):
+        future_list.append(self._executor.submit(self._push, dockerfile))
+
+    def report(self):
+        if not self._pushed:
+            return
+        duration = max(self._end_time - self._start_time, 0.001)
+        LOG.info('%d image(s) pushed in %.1f s, %.1f image(s) per minute',
+                 self._pushed, duration, self._pushed * 60 / duration)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
+
+
 def process_dockerfile(dockerfile, tmp_dir, config, executor, future_list,
-                       ready_images):
-    path = create_rendered_dockerfile(dockerfile, tmp_dir, config)
-    dockerfile['path'] = path
+                       ready_images, pusher=None):
+    pusher_submitted = False
     with get_docker_client() as dc:
-        build_dockerfile(dc, dockerfile)
+        built, pushed = check_build_cache(dc, dockerfile)
+        if built:
+            LOG.info("%s: Image is up to date, build skipped",
+                     dockerfile['name'])
+            dockerfile['build_result'] = 'Skipped'
+        else:
+            context = get_build_context(dockerfile, tmp_dir, config)
+            build_dockerfile(dc, dockerfile, context)
         if CONF.builder.push and CONF.registry.address:
-            push_dockerfile(dc, dockerfile)
+            if pushed:
+                LOG.info("%s: Already in %s registry", dockerfile['name'],
+                         CONF.registry.address)
+                dockerfile['push_result'] = 'Exists'
+            elif dockerfile['build_result'] == 'Failure':
+                push_dockerfile(dc, dockerfile)
+            elif pusher is None:
+                push_dockerfile(dc, dockerfile, get_auth_config(
+                    dc, CONF.registry.address))
+            else:
+                # Build index is updated by the pusher after the push
+                pusher.submit(dockerfile, future_list)
+                pusher_submitted = True
+    if not pusher_submitted:
+        update_build_index(dockerfile)
 
     for child in dockerfile['children']:
         if child['match'] or (CONF.builder.keep_image_tree_consistency and
@@ -289,14 +870,14 @@ def process_dockerfile(dockerfile, tmp_dir, config, executor, future_list,
                     child['push_result'] = 'Failure'
             else:
                 submit_dockerfile_processing(child, tmp_dir, config, executor,
-                                             future_list, ready_images)
+                                             future_list, ready_images, pusher)
 
 
 def submit_dockerfile_processing(dockerfile, tmp_dir, config, executor,
-                                 future_list, ready_images):
+                                 future_list, ready_images, pusher=None):
     future_list.append(executor.submit(
-        process_dockerfile, dockerfile, tmp_dir, config,
-        executor, future_list, ready_images
+        dockerfile.get('priority', 0), process_dockerfile, dockerfile,
+        tmp_dir, config, executor, future_list, ready_images, pusher
     ))
 
 
@@ -383,6 +964,12 @@ def _get_summary(dockerfiles):
         LOG.info('%d image(s) build succeeded: %s' % (
             len(build_succeeded), ', '.join(build_succeeded)))
 
+    build_skipped = [d['name'] for d in dockerfiles.values()
+                     if d['build_result'] == 'Skipped']
+    if build_skipped:
+        LOG.info('%d image(s) up to date: %s' % (
+            len(build_skipped), ', '.join(build_skipped)))
+
     build_failed = [d['name'] for d in dockerfiles.values()
                     if d['build_result'] == 'Failure']
     if build_failed:
@@ -412,23 +999,11 @@ def _get_summary(dockerfiles):
         return False
     return True
 
-try:
-    TemporaryDirectory = tempfile.TemporaryDirectory
-except AttributeError:
-    # This is based on TemporaryDirectory class that appeared in Python 3.2
-    class TemporaryDirectory(object):
-        def __init__(self, **kwargs):
-            self.name = tempfile.mkdtemp(**kwargs)
-
-        def __enter__(self):
-            return self.name
-
-        def __exit__(self, exc_type, exc_value, tb):
-            shutil.rmtree(self.name)
-
 
 def build_components(components=None):
-    with TemporaryDirectory() as tmp_dir:
+    # Only checkouts of git sources are stored here
+    tmp_dir = tempfile.mkdtemp()
+    try:
         config = _get_config()
         match = not bool(components)
         dockerfiles = get_dockerfiles_tree(match, config)
@@ -440,8 +1015,13 @@ def build_components(components=None):
                 match_dockerfiles_by_component(dockerfiles, component,
                                                ready_images)
 
-        with futures.ThreadPoolExecutor(max_workers=CONF.builder.workers) as (
-                executor):
+        if use_build_cache():
+            set_build_digests(dockerfiles, config, ready_images)
+
+        set_build_priorities(dockerfiles, ready_images)
+
+        with PriorityExecutor(max_workers=CONF.builder.workers) as executor, \
+                Pusher(max_workers=CONF.builder.push_workers) as pusher:
             future_list = []
             try:
                 for dockerfile in dockerfiles.values():
@@ -450,7 +1030,7 @@ def build_components(components=None):
                             not dockerfile['parent']['match']):
                         submit_dockerfile_processing(
                             dockerfile, tmp_dir, config, executor,
-                            future_list, ready_images)
+                            future_list, ready_images, pusher)
 
                 wait_futures(future_list)
             except SystemExit:
@@ -461,6 +1041,9 @@ def build_components(components=None):
                 wait_futures(future_list, skip_errors=True)
                 raise
             finally:
+                pusher.report()
                 build_succeeded = _get_summary(dockerfiles)
                 if not build_succeeded:
                     sys.exit(1)
+    finally:
+        shutil.rmtree(tmp_dir)
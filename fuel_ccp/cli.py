@@ -73,23 +73,34 @@ class Deploy(BaseCommand):
                             action='store_true',
                             help="Print k8s objects definitions without"
                                  "actual creation")
+        parser.add_argument('--plan',
+                            action='store_true',
+                            help='Show objects that would be created, '
+                                 'updated or deleted and their changes '
+                                 'without applying them')
         parser.add_argument('--export-dir',
                             help='Directory to export created k8s objects')
+        parser.add_argument('--incremental',
+                            action='store_true',
+                            help='Skip services whose definitions, files, '
+                                 'configs and images are not changed since '
+                                 'the last deployment')
         return parser
 
     def take_action(self, parsed_args):
         self._fetch_repos()
         config.load_component_defaults()
-        # only these two are being implicitly passed
+        # only these are being implicitly passed
         CONF.action._update(
             dry_run=parsed_args.dry_run,
+            plan=parsed_args.plan,
             export_dir=parsed_args.export_dir,
+            incremental=parsed_args.incremental,
         )
-        components_map = utils.get_deploy_components_info()
-
         components = parsed_args.components
         if components:
             components = set(components)
+        components_map = utils.get_deploy_components_info(components)
 
         validation_service.validate_service_definitions(
             components_map, components)
@@ -214,6 +225,14 @@ class ShowStatus(lister.Lister):
         parser.add_argument("-s", "--short",
                             action="store_true",
                             help="show only state (ok/wip/not deployed)")
+        parser.add_argument("-w", "--watch",
+                            action="store_true",
+                            help="wait until all components are ready")
+        parser.add_argument("-t", "--timeout",
+                            type=int,
+                            help="fail if components are not ready after "
+                                 "this number of seconds, used with "
+                                 "--watch")
         parser.add_argument("components",
                             nargs="*",
                             help="CCP components to show status")
@@ -221,10 +240,11 @@ class ShowStatus(lister.Lister):
 
     def take_action(self, parsed_args):
         config.load_component_defaults()
+        kwargs = {"watch": parsed_args.watch, "timeout": parsed_args.timeout}
         if parsed_args.short:
-            return status.show_short_status(parsed_args.components)
+            return status.show_short_status(parsed_args.components, **kwargs)
         else:
-            return status.show_long_status(parsed_args.components)
+            return status.show_long_status(parsed_args.components, **kwargs)
 
 
 class ImagesList(BaseCommand, lister.Lister):
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from fuel_ccp import config
+
+CONF = config.CONF
+
+LOG = logging.getLogger(__name__)
+
+
+def get_key(*parts):
+    """Get cache key from the list of strings or bytes"""
+    key = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = part.encode('utf-8')
+        key.update(hashlib.sha1(part).digest())
+    return key.hexdigest()
+
+
+def _get_path(section, key):
+    return os.path.join(CONF.cache.path, section, key + '.json')
+
+
+def get(section, key):
+    """Get cached value
+
+    :returns: cached value or None if there is no such key in the cache
+    """
+    try:
+        with open(_get_path(section, key)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def set(section, key, value):
+    """Store value in the cache
+
+    Value is stored only if it's not changed by serialization to JSON, so
+    the cached values are always equal to the original ones.
+    """
+    dump = json.dumps(value)
+    if json.loads(dump) != value:
+        LOG.debug('Value for %s/%s can not be cached', section, key)
+        return
+    path = _get_path(section, key)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # Write to a temporary file first, so concurrent readers never get
+        # partially written value
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            f.write(dump)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        LOG.debug('Failed to cache %s/%s: %s', section, key, e)
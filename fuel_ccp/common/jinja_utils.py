@@ -1,10 +1,29 @@
+import functools
+import hashlib
+import logging
 import os
 import re
+import threading
 
 import jinja2
+from jinja2 import meta
 
 from six.moves.urllib import parse as urlparse
 
+from fuel_ccp import config
+
+CONF = config.CONF
+
+LOG = logging.getLogger(__name__)
+
+_ENVIRONMENTS = {}
+_ENVIRONMENTS_LOCK = threading.Lock()
+
+_TEMPLATES_INFO = {}
+_TEMPLATES_INFO_LOCK = threading.Lock()
+
+_RENDER_FUNCTIONS = threading.local()
+
 
 class SilentUndefined(jinja2.Undefined):
 
@@ -30,24 +49,149 @@ def j2raise(msg):
     raise AssertionError(msg)
 
 
-def jinja_render(path, context, functions=(), ignore_undefined=False):
-    kwargs = {}
-    if ignore_undefined:
-        kwargs['undefined'] = SilentUndefined
-    else:
-        kwargs['undefined'] = jinja2.StrictUndefined
-
-    env = jinja2.Environment(loader=jinja2.FileSystemLoader(
-        os.path.dirname(path)), **kwargs)
+def _get_environment(**kwargs):
+    env = jinja2.Environment(**kwargs)
     env.filters['host'] = get_host
     # FIXME: gethostbyname should be only used during config files render
     env.filters['gethostbyname'] = lambda x: x
-
-    for func in functions:
-        env.globals[func.__name__] = func
     env.globals['raise_exception'] = j2raise
-    content = env.get_template(os.path.basename(path)).render(context)
-    return content
+    return env
+
+
+def _get_bytecode_cache_dir():
+    if not CONF.cache.templates:
+        return None
+    cache_dir = os.path.join(CONF.cache.path, 'jinja')
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except OSError as e:
+        LOG.debug('Failed to create templates cache directory: %s', e)
+        return None
+    return cache_dir
+
+
+def _get_render_function(func):
+    """Get global calling the function with this name passed to the render
+
+    Environments and compiled templates are shared by renders, which may
+    pass different functions, e.g. closures, with the same name.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        return _RENDER_FUNCTIONS.functions[name](*args, **kwargs)
+    return call
+
+
+def _get_cached_environment(directory, ignore_undefined, functions):
+    """Get environment for rendering templates from directory
+
+    Environments are shared by all renders, so each template is loaded and
+    compiled only once, while its file is not changed. Functions are
+    registered as globals by their names, so that imported templates can use
+    them too, while each render calls the functions passed to it.
+    """
+    key = (directory, ignore_undefined, frozenset(functions),
+           CONF.cache.templates, CONF.cache.path)
+    with _ENVIRONMENTS_LOCK:
+        env = _ENVIRONMENTS.get(key)
+        if env is None:
+            kwargs = {}
+            if ignore_undefined:
+                kwargs['undefined'] = SilentUndefined
+            else:
+                kwargs['undefined'] = jinja2.StrictUndefined
+            cache_dir = _get_bytecode_cache_dir()
+            if cache_dir:
+                kwargs['bytecode_cache'] = jinja2.FileSystemBytecodeCache(
+                    cache_dir)
+            env = _get_environment(
+                loader=jinja2.FileSystemLoader(directory), **kwargs)
+            for func in functions.values():
+                env.globals[func.__name__] = _get_render_function(func)
+            _ENVIRONMENTS[key] = env
+    return env
+
+
+def jinja_render(path, context, functions=(), ignore_undefined=False):
+    functions = {func.__name__: func for func in functions}
+    env = _get_cached_environment(os.path.dirname(path), ignore_undefined,
+                                  functions)
+    # Templates can render other templates from the functions
+    previous = getattr(_RENDER_FUNCTIONS, 'functions', None)
+    _RENDER_FUNCTIONS.functions = functions
+    try:
+        return env.get_template(os.path.basename(path)).render(context)
+    finally:
+        _RENDER_FUNCTIONS.functions = previous
+
+
+def _get_template_info(path):
+    """Analyze the template without rendering it
+
+    Result is cached while the file is not changed.
+
+    :returns: tuple -- sha1 digest of the raw template, set of names of the
+        top-level variables it uses and list of names of the templates it
+        includes or imports, None is used for names that are computed
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime, stat.st_size)
+    with _TEMPLATES_INFO_LOCK:
+        cached = _TEMPLATES_INFO.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(path, 'rb') as f:
+        content = f.read()
+    ast = _get_environment().parse(content.decode('utf-8'))
+    info = (hashlib.sha1(content).hexdigest(),
+            frozenset(meta.find_undeclared_variables(ast)),
+            list(meta.find_referenced_templates(ast)))
+    with _TEMPLATES_INFO_LOCK:
+        _TEMPLATES_INFO[path] = (version, info)
+    return info
+
+
+def get_referenced_variables(path):
+    """Get names of the top-level variables used by the template"""
+    return set(_get_template_info(path)[1])
+
+
+def get_template_digest(path):
+    """Get digest of the template and all templates it includes or imports
+
+    Result of rendering the template may change only if the digest or values
+    of the returned variables are changed, so it can be used to version
+    rendered templates without rendering them.
+
+    :returns: tuple -- digest and set of names of the top-level variables
+        used by the templates, or None if templates can't be analyzed
+    """
+    directory = os.path.dirname(path)
+    digest = hashlib.sha1()
+    variables = set()
+    pending = [os.path.basename(path)]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name is None:
+            # Name of the template is computed during rendering
+            return None
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            template_digest, names, templates = _get_template_info(
+                os.path.join(directory, name))
+        except (IOError, OSError):
+            # Rendering fails the same way regardless of the variables
+            template_digest, names, templates = '', (), ()
+        digest.update(('%s:%s;' % (name, template_digest)).encode('utf-8'))
+        variables.update(names)
+        pending.extend(reversed(templates))
+    return digest.hexdigest(), variables
 
 
 def generate_jinja_imports(exports_map):
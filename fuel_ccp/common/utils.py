@@ -1,15 +1,19 @@
-import copy
 import itertools
 import logging
+import multiprocessing
 import os
 import pkg_resources
+import re
+import threading
 
 import jinja2
-import yaml
 
 import fuel_ccp
+from fuel_ccp.common import cache
 from fuel_ccp.common import jinja_utils
 from fuel_ccp import config
+from fuel_ccp.config import _yaml
+from fuel_ccp import informer
 from fuel_ccp import kubernetes
 
 
@@ -17,6 +21,8 @@ CONF = config.CONF
 
 LOG = logging.getLogger(__name__)
 
+_NAME_RE = re.compile(r'^(-\s+)?name:\s*["\']?([^\s"\']+)["\']?$')
+
 
 def get_ingress_host(ingress_name):
     return '.'.join((ingress_name, CONF.configs.ingress.domain))
@@ -191,20 +197,174 @@ def extend_with_service_configs(service_name, config):
             extend_with_service_configs(target_service, config)
 
 
-def get_deploy_components_info():
-    rendering_context = get_rendering_config()
-    service_definitions_map = get_service_definitions_map()
-    services_map = {}
-    custom_services_map = {}
+def _get_rendering_context_digest(rendering_context):
+    """Get digest of everything service definitions rendering depends on"""
+    if not CONF.cache.services:
+        return None
+    return cache.get_key(
+        fuel_ccp.__version__,
+        rendering_context._json(sort_keys=True),
+        CONF.services._json(sort_keys=True),
+        CONF.kubernetes.namespace,
+        CONF.kubernetes.cluster_domain)
 
-    for repo in get_repositories_paths():
-        service_dir = os.path.join(repo, "service")
-        if not os.path.isdir(service_dir):
-            continue
-        component_name = get_component_name_from_repo_path(repo)
 
+def _render_service_definition(path, context, context_digest,
+                               service=None):
+    """Render and parse service definition, using cache when possible
+
+    :param context_digest: digest of the rendering context, caching is
+        disabled if None
+    :param service: name of the custom service the definition is rendered for
+    """
+    cache_key = None
+    if context_digest:
+        with open(path, 'rb') as f:
+            cache_key = cache.get_key(f.read(), context_digest, service or '')
+        service_definition = cache.get('services', cache_key)
+        if service_definition is not None:
+            LOG.debug("Using cached service definition: %s", path)
+            return service_definition
+
+    LOG.debug("Rendering service definition: %s", path)
+    content = jinja_utils.jinja_render(path, context._dict,
+                                       functions=[address])
+    LOG.debug("Parse service definition: %s", path)
+    service_definition = _yaml.safe_load(content)
+    if cache_key:
+        cache.set('services', cache_key, service_definition)
+    return service_definition
+
+
+def _index_service_file(path):
+    """Find names of the service, its containers and jobs without rendering
+
+    Only literal names are found, names produced by jinja expressions are
+    skipped.
+
+    :returns: tuple -- service name or None and set of other names
+    """
+    service_name = None
+    names = set()
+    in_service = False
+    service_indent = None
+    with open(path) as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('#'):
+                continue
+            indent = len(line) - len(line.lstrip())
+            if not indent:
+                in_service = stripped == 'service:'
+                continue
+            if not in_service:
+                continue
+            if service_indent is None:
+                service_indent = indent
+            match = _NAME_RE.match(stripped)
+            if not match or '{' in match.group(2):
+                continue
+            if indent == service_indent and not match.group(1):
+                service_name = match.group(2)
+            else:
+                names.add(match.group(2))
+    return service_name, names
+
+
+def _get_custom_service_context(service_name, rendering_context):
+    context = _yaml.LayeredAttrDict(rendering_context)
+    context['_current_service'] = service_name
+    extend_with_service_configs(service_name, context)
+    return context
+
+
+# State of the service definitions rendering process
+_RENDER_WORKER = {}
+
+
+def _init_render_worker(conf):
+    config._REAL_CONF = conf
+    _RENDER_WORKER['context'] = get_rendering_config()
+    _RENDER_WORKER['digest'] = _get_rendering_context_digest(
+        _RENDER_WORKER['context'])
+
+
+def _render_service_worker(task):
+    service_path, svc = task
+    context = _RENDER_WORKER['context']
+    if svc:
+        context = _get_custom_service_context(svc, context)
+    return _render_service_definition(
+        service_path, context, _RENDER_WORKER['digest'], svc)
+
+
+class ComponentsMap(dict):
+    """Services map which renders missing services on demand
+
+    Subscription, membership tests and get() load missing services, while
+    iteration, len() and other dict methods only see already loaded ones.
+    Names which are not services are looked up in the index of service files
+    without loading anything.
+    """
+
+    def __init__(self, loader):
+        super(ComponentsMap, self).__init__()
+        self._loader = loader
+
+    def __missing__(self, service_name):
+        self._loader.load([service_name])
+        if not dict.__contains__(self, service_name):
+            raise KeyError(service_name)
+        return dict.__getitem__(self, service_name)
+
+    def __contains__(self, service_name):
+        if not dict.__contains__(self, service_name):
+            self._loader.load([service_name])
+        return dict.__contains__(self, service_name)
+
+    def get(self, service_name, default=None):
+        try:
+            return self[service_name]
+        except KeyError:
+            return default
+
+
+class _ComponentsLoader(object):
+    def __init__(self):
+        self.rendering_context = get_rendering_config()
+        self.context_digest = _get_rendering_context_digest(
+            self.rendering_context)
+        self.service_definitions_map = get_service_definitions_map()
+        # Services are loaded on demand from concurrent render threads
+        self.lock = threading.RLock()
+        self.services_map = ComponentsMap(self)
+        self.default_services_map = {}
+        self.custom_services_map = {}
+        self.components = {}
+        self.loaded_files = set()
+        self.processed = set()
+        # service name -> (repo, service file)
+        self.service_index = None
+        # (repo, service file) with templated service names
+        self.unindexed_files = []
+        # container or job name -> set of service names
+        self.names_index = {}
+
+    def _get_service_files(self):
+        for repo in get_repositories_paths():
+            service_dir = os.path.join(repo, "service")
+            if not os.path.isdir(service_dir):
+                continue
+            for service_file in os.listdir(service_dir):
+                if service_file.endswith('.yaml'):
+                    yield repo, os.path.join(service_dir, service_file)
+
+    def _get_component(self, repo):
+        if repo in self.components:
+            return self.components[repo]
+        service_dir = os.path.join(repo, "service")
         component = {
-            "name": component_name,
+            "name": get_component_name_from_repo_path(repo),
             "upgrades": {},
             "service_dir": service_dir,
         }
@@ -216,53 +376,185 @@ def get_deploy_components_info():
                     continue
                 LOG.debug("Loading upgrade definition: %s", upgrade_fname)
                 with open(os.path.join(upgrade_dir, upgrade_fname)) as f:
-                    upgrade_def = yaml.load(f)
+                    upgrade_def = _yaml.safe_load(f)
                 key = upgrade_fname[:-len('.yaml')]
                 component['upgrades'][key] = upgrade_def
-
-        for service_file in os.listdir(service_dir):
-            if service_file.endswith('.yaml'):
-                LOG.debug("Rendering service definition: %s", service_file)
-                content = jinja_utils.jinja_render(
-                    os.path.join(service_dir, service_file),
-                    rendering_context._dict, functions=[address]
-                )
-                LOG.debug("Parse service definition: %s", service_file)
-                service_definition = yaml.load(content)
+        self.components[repo] = component
+        return component
+
+    def _add_service(self, repo, service_definition, svc=None):
+        component = self._get_component(repo)
+        service = {
+            'component': component,
+            'component_name': component['name'],
+            'service_dir': component['service_dir'],
+            'service_content': service_definition
+        }
+        if svc:
+            service_definition['service']['name'] = svc
+            self.custom_services_map[svc] = service
+        else:
+            self.default_services_map[
+                service_definition['service']['name']] = service
+
+    def _load_file(self, repo, service_path):
+        """Render service definition and its custom services
+
+        :returns: list -- names of the loaded services
+        """
+        if service_path in self.loaded_files:
+            return []
+        self.loaded_files.add(service_path)
+
+        service_definition = _render_service_definition(
+            service_path, self.rendering_context, self.context_digest)
+        self._add_service(repo, service_definition)
+        service_name = service_definition['service']['name']
+        loaded = [service_name]
+        for svc in self.service_definitions_map.get(service_name, ()):
+            service_definition = _render_service_definition(
+                service_path, _get_custom_service_context(
+                    svc, self.rendering_context),
+                self.context_digest, svc)
+            self._add_service(repo, service_definition, svc)
+            loaded.append(svc)
+        return loaded
+
+    def _load_files_parallel(self, service_files, processes):
+        """Render service definitions in a pool of processes
+
+        Results are merged in the same order as if they were rendered
+        sequentially.
+        """
+        pool = multiprocessing.Pool(processes, _init_render_worker,
+                                    (config._REAL_CONF,))
+        try:
+            definitions = pool.map(
+                _render_service_worker,
+                [(service_path, None) for _, service_path in service_files])
+            custom_tasks = []
+            for (repo, service_path), service_definition in zip(
+                    service_files, definitions):
+                self.loaded_files.add(service_path)
+                self._add_service(repo, service_definition)
                 service_name = service_definition['service']['name']
-                services_map[service_name] = {
-                    'component': component,
-                    'component_name': component_name,
-                    'service_dir': service_dir,
-                    'service_content': service_definition
-                }
-                for svc in service_definitions_map.get(service_name, ()):
-                    LOG.debug("Rendering service definition: %s for '%s' "
-                              "service", service_file, svc)
-                    context = copy.deepcopy(rendering_context)
-                    context['_current_service'] = svc
-                    extend_with_service_configs(svc, context)
-                    content = jinja_utils.jinja_render(
-                        os.path.join(service_dir, service_file),
-                        context._dict, functions=[address]
-                    )
-                    LOG.debug("Parse service definition: %s for '%s' "
-                              "service", service_file, svc)
-                    service_definition = yaml.load(content)
-                    service_definition['service']['name'] = svc
-                    custom_services_map[svc] = {
-                        'component': component,
-                        'component_name': component_name,
-                        'service_dir': service_dir,
-                        'service_content': service_definition
-                    }
-
-    deps_map = get_dependencies_map(services_map)
-    services_map.update(custom_services_map)
-    for svc_name, svc in services_map.items():
-        process_dependencies(svc, deps_map, services_map)
-
-    return services_map
+                for svc in self.service_definitions_map.get(service_name, ()):
+                    custom_tasks.append((repo, service_path, svc))
+            definitions = pool.map(
+                _render_service_worker,
+                [(service_path, svc) for _, service_path, svc in custom_tasks])
+            for (repo, _, svc), service_definition in zip(custom_tasks,
+                                                          definitions):
+                self._add_service(repo, service_definition, svc)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _process_dependencies(self):
+        deps_map = get_dependencies_map(self.default_services_map)
+        dict.update(self.services_map, self.default_services_map)
+        dict.update(self.services_map, self.custom_services_map)
+        # Processing of dependencies can load more services into the map
+        for svc_name, svc in list(dict.items(self.services_map)):
+            if svc_name not in self.processed:
+                self.processed.add(svc_name)
+                process_dependencies(svc, deps_map, self.services_map)
+
+    def load_all(self):
+        with self.lock:
+            service_files = [(repo, service_path) for repo, service_path
+                             in self._get_service_files()
+                             if service_path not in self.loaded_files]
+            processes = CONF.repositories.render_processes
+            if processes > 1 and len(service_files) > 1:
+                self._load_files_parallel(service_files, processes)
+            else:
+                for repo, service_path in service_files:
+                    self._load_file(repo, service_path)
+            self._process_dependencies()
+        return self.services_map
+
+    def _build_index(self):
+        if self.service_index is not None:
+            return
+        self.service_index = {}
+        for repo, service_path in self._get_service_files():
+            service_name, names = _index_service_file(service_path)
+            if service_name is None:
+                # Service name is templated, so it can't be loaded lazily
+                LOG.debug("Can't index service definition: %s", service_path)
+                self.unindexed_files.append((repo, service_path))
+                continue
+            self.service_index[service_name] = (repo, service_path)
+            for name in names:
+                self.names_index.setdefault(name, set()).add(service_name)
+
+    def _get_required_services(self, service_name):
+        service = (self.default_services_map.get(service_name) or
+                   self.custom_services_map[service_name])
+        mapping = CONF.services.get(service_name, {}).get('mapping', {})
+        for cont in service['service_content']['service']['containers']:
+            for cmd in itertools.chain(
+                    cont.get('pre', []), [cont.get('daemon', [])],
+                    cont.get('post', [])):
+                for dep in cmd.get('dependencies', ()):
+                    dep_name = dep.split(':')[0]
+                    if dep_name in mapping:
+                        yield mapping[dep_name]
+                    elif dep_name in self.service_index:
+                        yield dep_name
+                    else:
+                        for svc in self.names_index.get(dep_name, (dep_name,)):
+                            yield mapping.get(svc) or svc
+
+    def _find_service_file(self, service_name):
+        if service_name in CONF.services:
+            service_name = CONF.services[service_name]['service_def']
+        return self.service_index.get(service_name)
+
+    def _is_loaded(self, service_name):
+        return (service_name in self.default_services_map or
+                service_name in self.custom_services_map)
+
+    def load(self, service_names):
+        """Load services with all their dependencies
+
+        Unknown names are ignored.
+        """
+        with self.lock:
+            self._build_index()
+            queue = list(service_names)
+            while queue:
+                service_name = queue.pop()
+                if self._is_loaded(service_name):
+                    continue
+                service_file = self._find_service_file(service_name)
+                if service_file is not None:
+                    loaded = self._load_file(*service_file)
+                else:
+                    # Service can be defined only in files with templated
+                    # service names, they are loaded once
+                    loaded = []
+                    for repo, service_path in self.unindexed_files:
+                        loaded.extend(self._load_file(repo, service_path))
+                    if not self._is_loaded(service_name):
+                        LOG.debug('Service "%s" is not found', service_name)
+                for svc in loaded:
+                    queue.extend(self._get_required_services(svc))
+            self._process_dependencies()
+
+
+def get_deploy_components_info(components=None):
+    """Get map of services to their definitions
+
+    :param components: if specified, only these services and their
+        dependencies are rendered, others are rendered on first access
+    """
+    loader = _ComponentsLoader()
+    if components:
+        loader.load(components)
+        return loader.services_map
+    return loader.load_all()
 
 
 def get_dependencies_map(services_map):
@@ -281,8 +573,8 @@ def get_dependencies_map(services_map):
 
 def get_deployed_components():
     """Returns set of deployed components."""
-    deployed_deployments = kubernetes.list_cluster_deployments()
-    deployed_statefulsets = kubernetes.list_cluster_statefulsets()
+    deployed_deployments = informer.list_objects("Deployment", "ccp=true")
+    deployed_statefulsets = informer.list_objects("StatefulSet", "ccp=true")
     deployed_components = set(kubernetes.get_object_names(
         itertools.chain(deployed_deployments, deployed_statefulsets))
     )
@@ -298,9 +590,12 @@ def get_nodes_config(nodes):
 
 
 def get_rendering_config():
-    conf = copy.deepcopy(CONF.configs)
-    conf._merge(CONF.secret_configs)
-    return conf
+    """Get global configs merged with secret configs
+
+    Returned object is a copy-on-write view, changes made to it don't affect
+    CONF.
+    """
+    return _yaml.LayeredAttrDict(CONF.configs, CONF.secret_configs)
 
 
 def get_service_configs(service_name):
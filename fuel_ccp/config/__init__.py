@@ -5,6 +5,7 @@ import os
 
 from fuel_ccp.config import _yaml
 from fuel_ccp.config import builder
+from fuel_ccp.config import cache
 from fuel_ccp.config import cli
 from fuel_ccp.config import files
 from fuel_ccp.config import images
@@ -56,7 +57,7 @@ class _Wrapper(object):
 CONF = _Wrapper()
 
 CONFIG_MODULES = [
-    builder, cli, images, kubernetes, registry, replicas, repositories,
+    builder, cache, cli, images, kubernetes, registry, replicas, repositories,
     sources, url, files, services,
 ]
 
@@ -111,7 +112,7 @@ def validate_config(yconf=None):
     if yconf is None:
         yconf = _REAL_CONF
     schema = get_config_schema()
-    jsonschema.validate(_yaml.UnwrapAttrDict(yconf), schema)
+    jsonschema.validate(_yaml.unwrap(yconf), schema)
 
 
 def load_component_defaults():
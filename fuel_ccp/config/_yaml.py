@@ -1,28 +1,39 @@
 import collections
+import copy
 import json
 import os
 
 import six
 import yaml
 
+_MISSING = object()
+
 
 # NOTE(yorik-sar): Don't implement full dict interface to avoid name conflicts
 class AttrDict(object):
+    # Config values are accessed on every hot path, slots make instances
+    # smaller and attribute lookups faster
+    __slots__ = ('_dict',)
+
     def __init__(self, *args, **kwargs):
         self._dict = dict(*args, **kwargs)
 
     def get(self, name, default=None):
-        try:
-            return self._dict[name]
-        except KeyError:
-            return default
+        return self._dict.get(name, default)
 
     def __getattr__(self, name):
+        # Called only for names that are not slots or methods
         try:
-            return object.__getattribute__(self, '_dict')[name]
+            return self._dict[name]
         except KeyError:
             raise AttributeError(name)
 
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            self[name] = value
+
     def __getitem__(self, name):
         return self._dict[name]
 
@@ -49,26 +60,32 @@ class AttrDict(object):
     def __iter__(self):
         return iter(self._dict)
 
+    def __reduce__(self):
+        return self.__class__, (self._dict,)
+
     def _merge(self, other):
-        if isinstance(other, dict):
-            items = six.iteritems(other)
-        else:
-            items = other._items()
-        for key, other_value in items:
-            try:
-                value = self._dict[key]
-            except KeyError:
-                merge = False
-            else:
-                merge = isinstance(value, AttrDict)
-            if merge:
-                value._merge(other_value)
+        # Nested mappings are merged using explicit stack instead of recursion
+        stack = [(self, other)]
+        while stack:
+            target, other = stack.pop()
+            if type(target) is not AttrDict:
+                # Views store changes differently
+                target._merge(other)
+                continue
+            if isinstance(other, dict):
+                items = six.iteritems(other)
             else:
-                if isinstance(other_value, dict):
-                    val = AttrDict()
-                    val._merge(other_value)
-                    other_value = val
-                self._dict[key] = other_value
+                items = other._items()
+            target_dict = target._dict
+            for key, other_value in items:
+                value = target_dict.get(key)
+                if isinstance(value, AttrDict):
+                    stack.append((value, other_value))
+                elif isinstance(other_value, dict):
+                    val = target_dict[key] = AttrDict()
+                    stack.append((val, other_value))
+                else:
+                    target_dict[key] = other_value
 
     def _json(self, **kwargs):
         return JSONEncoder(**kwargs).encode(self)
@@ -80,6 +97,141 @@ class AttrDict(object):
         return len(self._dict)
 
 
+class LayeredAttrDict(AttrDict):
+    """Copy-on-write view of several stacked AttrDicts
+
+    Keys are looked up from the last layer to the first one, nested
+    AttrDicts are merged the same way AttrDict._merge does it, but lazily.
+    Layers are never modified, all changes are stored in the view itself, so
+    large configs can be shared by many views without deep copying them.
+    """
+
+    __slots__ = ('_layers', '_write_layer', '_children', '_parent', '_name')
+
+    def __init__(self, *layers):
+        self._layers = list(layers)
+        self._write_layer = None
+        self._children = {}
+        self._parent = None
+        self._name = None
+
+    @property
+    def _dict(self):
+        return {key: self[key] for key in self}
+
+    def _is_own_child(self, value):
+        return isinstance(value, LayeredAttrDict) and value._parent is self
+
+    def _lookup(self, name):
+        """Find the value of the key in the topmost layer
+
+        :returns: tuple -- the value and the list of values from the lower
+            layers it should be merged with, topmost first
+        """
+        value = _MISSING
+        lower = []
+        for layer in reversed(self._layers):
+            try:
+                layer_value = layer[name]
+            except KeyError:
+                continue
+            if value is _MISSING:
+                value = layer_value
+            elif isinstance(layer_value, AttrDict):
+                lower.append(layer_value)
+            # Changed child view already includes values from lower layers
+            if (not isinstance(layer_value, AttrDict) or
+                    self._is_own_child(layer_value)):
+                break
+        if value is _MISSING:
+            raise KeyError(name)
+        return value, lower
+
+    def __getitem__(self, name):
+        try:
+            return self._children[name]
+        except KeyError:
+            pass
+        value, lower = self._lookup(name)
+        if not isinstance(value, AttrDict) or self._is_own_child(value):
+            return value
+        # Wrap nested AttrDicts even when there is nothing to merge with, so
+        # that changes made through the view never reach the layers
+        child = LayeredAttrDict(*(list(reversed(lower)) + [value]))
+        child._parent = self
+        child._name = name
+        self._children[name] = child
+        return child
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def _get_write_layer(self):
+        if (self._write_layer is None or
+                self._layers[-1] is not self._write_layer):
+            self._write_layer = {}
+            self._layers.append(self._write_layer)
+            self._pin()
+        return self._write_layer
+
+    def _pin(self):
+        # Keep changed child view in the parent, so it's not lost when the
+        # parent's cache of child views is reset
+        if self._parent is not None:
+            self._parent._get_write_layer()[self._name] = self
+
+    def __setitem__(self, name, value):
+        self._get_write_layer()[name] = value
+        self._children.pop(name, None)
+
+    def _update(self, *args, **kwargs):
+        for key, value in six.iteritems(dict(*args, **kwargs)):
+            self[key] = value
+
+    def _merge(self, other):
+        if isinstance(other, dict):
+            val = AttrDict()
+            val._merge(other)
+            other = val
+        self._layers.append(other)
+        self._children.clear()
+        self._pin()
+
+    def _items(self):
+        return ((key, self[key]) for key in self)
+
+    def __iter__(self):
+        seen = set()
+        for layer in self._layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return 'LayeredAttrDict({})'.format(self._dict)
+
+    def __deepcopy__(self, memo):
+        return AttrDict(copy.deepcopy(self._dict, memo))
+
+    def __reduce__(self):
+        return AttrDict, (self._dict,)
+
+
 class JSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if not isinstance(obj, AttrDict):
@@ -87,7 +239,12 @@ class JSONEncoder(json.JSONEncoder):
         return obj._dict
 
 
-class Loader(yaml.SafeLoader):
+# libyaml based classes are much faster, but PyYAML can be built without it
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+SafeDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+class Loader(SafeLoader):
     pass
 
 
@@ -134,33 +291,34 @@ def load_with_includes(filename):
     return res
 
 
-class Dumper(yaml.SafeDumper):
+def safe_load(stream):
+    """Load YAML document into plain Python objects"""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+class Dumper(SafeDumper):
     pass
 
 
 def represent_attr_dict(dumper, data):
     return dumper.represent_dict(data._dict)
 
-Dumper.add_representer(AttrDict, represent_attr_dict)
-
+Dumper.add_multi_representer(AttrDict, represent_attr_dict)
 
-def dump(obj, stream):
-    yaml.dump(obj, stream, Dumper=Dumper, default_flow_style=False)
 
+def dump(obj, stream=None):
+    return yaml.dump(obj, stream, Dumper=Dumper, default_flow_style=False)
 
-class UnwrapAttrDict(dict):
-    def __init__(self, attr_dict):
-        return super(UnwrapAttrDict, self).__init__(attr_dict._dict)
 
-    @staticmethod
-    def _unwrap(obj):
-        if isinstance(obj, AttrDict):
-            return UnwrapAttrDict(obj)
-        elif isinstance(obj, list):
-            return list(map(UnwrapAttrDict._unwrap, obj))
-        else:
-            return obj
+def unwrap(obj):
+    """Convert AttrDicts in obj to plain dicts
 
-    def __getitem__(self, name):
-        res = super(UnwrapAttrDict, self).__getitem__(name)
-        return self._unwrap(res)
+    Result is a snapshot that shares no mappings or lists with obj, it's
+    meant for read-only consumers like jsonschema that need real dicts.
+    """
+    if isinstance(obj, AttrDict):
+        return {key: unwrap(value) for key, value in obj._items()}
+    elif isinstance(obj, list):
+        return [unwrap(value) for value in obj]
+    else:
+        return obj
@@ -6,7 +6,9 @@ DEFAULTS = {
         'keep_image_tree_consistency': True,
         'build_base_images_if_not_exist': True,
         'push': False,
+        'push_workers': 4,
         'no_cache': False,
+        'skip_unchanged': True,
         'docker': {
             'base_url': 'unix://var/run/docker.sock'
         }
@@ -22,7 +24,9 @@ SCHEMA = {
             'keep_image_tree_consistency': {'type': 'boolean'},
             'build_base_images_if_not_exist': {'type': 'boolean'},
             'push': {'type': 'boolean'},
+            'push_workers': {'type': 'integer', 'minimum': 1},
             'no_cache': {'type': 'boolean'},
+            'skip_unchanged': {'type': 'boolean'},
             'docker': {
                 'type': 'object',
                 'additionalProperties': False,
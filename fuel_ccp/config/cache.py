@@ -0,0 +1,21 @@
+import os
+
+DEFAULTS = {
+    'cache': {
+        'path': os.path.expanduser('~/.ccp/cache'),
+        'services': True,
+        'templates': True,
+    },
+}
+
+SCHEMA = {
+    'cache': {
+        'type': 'object',
+        'additionalProperties': False,
+        'properties': {
+            'path': {'type': 'string'},
+            'services': {'type': 'boolean'},
+            'templates': {'type': 'boolean'},
+        },
+    },
+}
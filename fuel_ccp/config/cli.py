@@ -2,7 +2,9 @@ DEFAULTS = {
     'action': {
         'components': None,
         'dry_run': False,
+        'plan': False,
         'export_dir': None,
+        'incremental': False,
         'auth_url': None,
         'skip_os_cleanup': False,
     },
@@ -19,7 +21,9 @@ SCHEMA = {
                 'items': {'type': 'string'},
             },
             'dry_run': {'type': 'boolean'},
+            'plan': {'type': 'boolean'},
             'export_dir': {'type': 'string'},
+            'incremental': {'type': 'boolean'},
             'auth_url': {'type': 'string'},
             'skip_os_cleanup': {'type': 'boolean'},
             'types': {
@@ -10,6 +10,11 @@ DEFAULTS = {
         'password': None,
         'cluster_domain': 'cluster.local',
         'image_pull_policy': None,
+        'connection_pool_size': 10,
+        'apply_concurrency': 10,
+        'patch_type': 'merge',
+        'skip_unchanged': True,
+        'wave_ready_timeout': None,
         'appcontroller': {
             "enabled": False
         }
@@ -36,6 +41,14 @@ SCHEMA = {
                 {'type': 'null'},
                 {'enum': ['Always', 'IfNotPresent', 'Never']},
             ]},
+            'connection_pool_size': {'type': 'integer', 'minimum': 1},
+            'apply_concurrency': {'type': 'integer', 'minimum': 1},
+            'patch_type': {'enum': ['merge', 'strategic', 'apply']},
+            'skip_unchanged': {'type': 'boolean'},
+            'wave_ready_timeout': {'oneOf': [
+                {'type': 'null'},
+                {'type': 'integer', 'minimum': 1},
+            ]},
             'appcontroller': {
                 'type': 'object',
                 'additionalProperties': False,
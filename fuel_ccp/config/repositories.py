@@ -31,6 +31,7 @@ DEFAULTS = {
     'repositories': {
         'clone': True,
         'clone_concurrency': multiprocessing.cpu_count(),
+        'render_processes': 1,
         'skip_empty': True,
         'path': os.path.expanduser('~/ccp-repos/'),
         'entrypoint_repo_name': 'fuel-ccp-entrypoint',
@@ -48,6 +49,7 @@ SCHEMA = {
         'properties': {
             'clone': {'type': 'boolean'},
             'clone_concurrency': {'type': 'integer'},
+            'render_processes': {'type': 'integer', 'minimum': 1},
             'skip_empty': {'type': 'boolean'},
             'path': {'type': 'string'},
             'entrypoint_repo_name': {'type': 'string'},
@@ -47,6 +47,34 @@ def get_deps_graph(components_map=None):
     return deps_graph
 
 
+def get_deploy_waves(components, components_map):
+    """Split services into waves ordered by dependencies
+
+    Services of a wave depend only on services of the previous waves, so all
+    services of a wave can be deployed in parallel. Dependencies on services
+    that are not being deployed are ignored.
+
+    :returns: list -- lists of service names, sorted inside of a wave
+    """
+    components = set(components)
+    deps_graph = get_deps_graph(components_map)
+    pending = {name: (deps_graph.get(name, set()) & components) - {name}
+               for name in components}
+    waves = []
+    while pending:
+        wave = sorted(name for name, deps in pending.items() if not deps)
+        if not wave:
+            LOG.warning("Circular dependencies between services: %s",
+                        ", ".join(sorted(pending)))
+            wave = sorted(pending)
+        waves.append(wave)
+        for name in wave:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(wave)
+    return waves
+
+
 def get_deps(components, components_map):
     deps_graph = get_deps_graph(components_map)
     dependencies = set()
@@ -57,7 +85,7 @@ def get_deps(components, components_map):
 
 
 def show_dep(components):
-    components_map = utils.get_deploy_components_info()
+    components_map = utils.get_deploy_components_info(components)
     base_validation.validate_components_names(set(components), components_map)
 
     deps = get_deps(components, components_map)
@@ -1,3 +1,4 @@
+from concurrent import futures
 import hashlib
 import itertools
 import json
@@ -5,14 +6,21 @@ import logging
 import os
 import re
 
+from pykube import exceptions as pykube_exc
 import six
 from six.moves import zip_longest
 
+import fuel_ccp
 from fuel_ccp.common import jinja_utils
 from fuel_ccp.common import utils
 from fuel_ccp import config
 from fuel_ccp.config import _yaml
+from fuel_ccp.config import images
+from fuel_ccp import dependencies
+from fuel_ccp import informer
 from fuel_ccp import kubernetes
+from fuel_ccp import plan
+from fuel_ccp import status
 from fuel_ccp import templates
 from fuel_ccp.validation import deploy as deploy_validation
 
@@ -24,6 +32,16 @@ LOG = logging.getLogger(__name__)
 YAML_FILE_RE = re.compile(r'\.yaml$')
 # This role is added to execute k8s Jobs only on nodes affected by deployment
 JOBS_ROLE = '_ccp_jobs'
+APPLY_TIMEOUT = 2 ** 16  # in seconds
+# Objects of these kinds are applied in separate stages before all other
+# objects, because workloads mount them
+APPLY_STAGES = (
+    ('Namespace',),
+    ('ConfigMap', 'Secret'),
+)
+# Images of live objects of these kinds are compared with the rendered ones
+# to detect upgrades
+WORKLOAD_KINDS = ('Deployment', 'StatefulSet')
 
 
 def _expand_items(service, kind, items):
@@ -39,6 +57,21 @@ def _expand_items(service, kind, items):
             _expand(cmd)
 
 
+def _process_object(object_dict):
+    """Create or update object using the informers cache of live objects
+
+    Live objects of each kind are listed once, instead of being requested
+    one by one to check if they have to be updated. In plan mode objects are
+    only added to the plan.
+    """
+    if CONF.action.plan and object_dict['kind'] != 'Namespace':
+        if CONF.action.export_dir:
+            kubernetes.export_object(object_dict)
+        return plan.add_object(object_dict)
+    return kubernetes.process_object(object_dict,
+                                     get_live_object=informer.get_object)
+
+
 def _get_configmaps_version(configmaps, files, configs):
     """Get overall ConfigMaps version
 
@@ -47,20 +80,49 @@ def _get_configmaps_version(configmaps, files, configs):
     was updated or not.
     """
     versions = ''.join(cm.obj['metadata']['resourceVersion']
-                       for cm in configmaps)
+                       for cm in configmaps if cm)
     files_hash = _get_service_files_hash(files, configs)
 
     return versions + files_hash
 
 
+def _get_address_configs(configs):
+    """Get all configs that affect results of utils.address"""
+    return {
+        "current_service": configs.get("_current_service"),
+        "services": CONF.services,
+        "namespace": CONF.kubernetes.namespace,
+        "cluster_domain": CONF.kubernetes.cluster_domain,
+        "ingress": CONF.configs.get("ingress"),
+        "k8s_external_ip": CONF.configs.get("k8s_external_ip"),
+        "tls": {name: value.get("tls") for name, value
+                in CONF.configs._items() if isinstance(value, _yaml.AttrDict)},
+    }
+
+
+def _get_file_version(path, configs):
+    """Get data that identifies the result of rendering the file
+
+    Template is analyzed instead of being rendered, so only its raw content
+    and values of the configs it references are used.
+    """
+    template = jinja_utils.get_template_digest(path)
+    if template is None:
+        return jinja_utils.jinja_render(path, configs._dict, [utils.address],
+                                        ignore_undefined=True)
+    digest, variables = template
+    refs = {name: configs.get(name) for name in variables}
+    if "address" in variables:
+        refs["address"] = _get_address_configs(configs)
+    return {"template": digest, "configs": refs}
+
+
 def _get_service_files_hash(files, configs):
     data = {}
     if files:
         for filename, f in files.items():
-            data[filename] = jinja_utils.jinja_render(
-                f["content"], configs, [utils.address],
-                ignore_undefined=True)
-    dump = json.dumps(data, sort_keys=True).encode("utf-8")
+            data[filename] = _get_file_version(f["content"], configs)
+    dump = _yaml.JSONEncoder(sort_keys=True).encode(data).encode("utf-8")
     return hashlib.sha1(dump).hexdigest()
 
 
@@ -89,6 +151,19 @@ def _process_secrets(secrets):
                                              type, data)
 
 
+def _get_service_rendering_context(service_name, service_configs):
+    rendering_context = utils.get_rendering_config()
+    # update with node-related params
+    for node_name, node in sorted(CONF.nodes._items()):
+        if node.get('configs'):
+            rendering_context._merge(node['configs'])
+
+    # update with service-related params
+    rendering_context._merge(service_configs)
+    rendering_context['_current_service'] = service_name
+    return rendering_context
+
+
 def parse_role(component, topology, configmaps, components_map):
     service_dir = component["service_dir"]
     role = component["service_content"]
@@ -124,17 +199,10 @@ def parse_role(component, topology, configmaps, components_map):
     if CONF.action.dry_run:
         cm_version = 'dry-run'
     else:
-        rendering_context = utils.get_rendering_config()
-        # update with node-related params
-        for node_name, node in sorted(CONF.nodes._items()):
-            rendering_context._merge(node.get('configs', {}))
-
-        # update with service-related params
-        rendering_context._merge(service_configs)
-        rendering_context['_current_service'] = service_name
-
+        rendering_context = _get_service_rendering_context(service_name,
+                                                           service_configs)
         cm_version = _get_configmaps_version(
-            configmaps, files, rendering_context._dict)
+            configmaps, files, rendering_context)
 
     for cont in service["containers"]:
         daemon_cmd = cont["daemon"]
@@ -226,7 +294,7 @@ def _fill_cmd(workflow, cmd):
 def _create_workflow(workflow, name):
     configmap_name = "%s-%s" % (name, templates.ROLE_CONFIG)
     template = templates.serialize_configmap(configmap_name, workflow)
-    return kubernetes.process_object(template)
+    return _process_object(template)
 
 
 def _process_ports(service):
@@ -362,28 +430,28 @@ def _push_files_to_workflow(workflow, files):
 def _create_globals_configmap(config):
     data = {templates.GLOBAL_CONFIG: config._json(sort_keys=True)}
     cm = templates.serialize_configmap(templates.GLOBAL_CONFIG, data)
-    return kubernetes.process_object(cm)
+    return _process_object(cm)
 
 
 def _create_globals_secret(conf):
     data = {templates.GLOBAL_SECRET_CONFIG: conf._json(sort_keys=True)}
     secret = templates.serialize_secret(
         templates.GLOBAL_SECRET_CONFIG, data=data)
-    return kubernetes.process_object(secret)
+    return _process_object(secret)
 
 
 def _create_nodes_configmap(nodes):
     nodes_config = utils.get_nodes_config(nodes)
     data = {templates.NODES_CONFIG: nodes_config}
     cm = templates.serialize_configmap(templates.NODES_CONFIG, data)
-    return kubernetes.process_object(cm)
+    return _process_object(cm)
 
 
 def _create_service_configmap(service_name, service_config):
     configmap_name = "%s-%s" % (service_name, templates.SERVICE_CONFIG)
     data = {templates.SERVICE_CONFIG: service_config._json(sort_keys=True)}
     template = templates.serialize_configmap(configmap_name, data)
-    return kubernetes.process_object(template)
+    return _process_object(template)
 
 
 def get_start_script():
@@ -400,7 +468,7 @@ def create_start_script_configmap():
         templates.SCRIPT_CONFIG: get_start_script()
     }
     cm = templates.serialize_configmap(templates.SCRIPT_CONFIG, data)
-    return kubernetes.process_object(cm)
+    return _process_object(cm)
 
 
 def _create_files_configmap(service_name, files, macros_imports):
@@ -412,7 +480,7 @@ def _create_files_configmap(service_name, files, macros_imports):
                 data[filename] = macros_imports + f.read()
     data["placeholder"] = ""
     template = templates.serialize_configmap(configmap_name, data)
-    return kubernetes.process_object(template)
+    return _process_object(template)
 
 
 def _create_meta_configmap(service):
@@ -423,7 +491,7 @@ def _create_meta_configmap(service):
              "host-net": service.get("hostNetwork", False)}, sort_keys=True)
     }
     template = templates.serialize_configmap(configmap_name, data)
-    return kubernetes.process_object(template)
+    return _process_object(template)
 
 
 def _create_exports_configmap(exports_map):
@@ -433,7 +501,88 @@ def _create_exports_configmap(exports_map):
         exported_files_content[key] = exports_map[key]['body']
     serialized = templates.serialize_configmap(templates.EXPORTS_CONFIG,
                                                exported_files_content)
-    return kubernetes.process_object(serialized)
+    return _process_object(serialized)
+
+
+_REGEX_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _get_literal_prefix(pattern):
+    """Get the string that all matches of the regex pattern start with"""
+    depth = 0
+    in_class = escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            # Top level alternatives may start with anything
+            return ''
+    prefix = []
+    for char in pattern:
+        if char in _REGEX_SPECIAL_CHARS:
+            if char in '*?{' and prefix:
+                # Previous char is optional
+                prefix.pop()
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+def _match_nodes(patterns, node_names):
+    """Find node names matched by each of the patterns
+
+    Patterns are compiled once and indexed by their literal prefixes, so
+    each node is checked only against the patterns that can match it.
+
+    :returns: dict -- pattern to set of matched node names
+    """
+    index = {}
+    for pattern in patterns:
+        index.setdefault(_get_literal_prefix(pattern), []).append(
+            (pattern, re.compile(pattern)))
+    lengths = sorted(set(len(prefix) for prefix in index))
+    matches = {pattern: set() for pattern in patterns}
+    for name in node_names:
+        for length in lengths:
+            if length > len(name):
+                break
+            for pattern, regex in index.get(name[:length], ()):
+                if regex.match(name):
+                    matches[pattern].add(name)
+    return matches
+
+
+def _get_service_nodes(nodes, roles, node_names):
+    """Get names of the nodes for each service
+
+    :returns: dict -- service name to set of node names, including nodes
+        for jobs
+    """
+    node_matches = _match_nodes(list(nodes), node_names)
+    roles_to_node = {JOBS_ROLE: set()}
+    for node in nodes:
+        for role in itertools.chain(nodes[node]["roles"], [JOBS_ROLE]):
+            roles_to_node.setdefault(role, set()).update(node_matches[node])
+    service_to_node = {}
+    for role in sorted(roles):
+        if role in roles_to_node:
+            for svc in roles[role]:
+                service_to_node.setdefault(svc, set()).update(
+                    roles_to_node[role])
+        else:
+            LOG.warning("Role '%s' defined, but unused", role)
+    service_to_node[JOBS_ROLE] = roles_to_node[JOBS_ROLE]
+    return service_to_node
 
 
 def _make_topology(nodes, roles, replicas):
@@ -454,29 +603,7 @@ def _make_topology(nodes, roles, replicas):
     k8s_nodes = kubernetes.list_k8s_nodes()
     k8s_node_names = kubernetes.get_object_names(k8s_nodes)
 
-    def find_match(glob):
-        matcher = re.compile(glob)
-        nodes = []
-        for node in k8s_node_names:
-            match = matcher.match(node)
-            if match:
-                nodes.append(node)
-        return nodes
-
-    roles_to_node = {}
-    for node in sorted(nodes):
-        matched_nodes = find_match(node)
-        for role in nodes[node]["roles"] + [JOBS_ROLE]:
-            roles_to_node.setdefault(role, [])
-            roles_to_node[role].extend(matched_nodes)
-    service_to_node = {}
-    for role in sorted(roles):
-        if role in roles_to_node:
-            for svc in roles[role]:
-                service_to_node.setdefault(svc, [])
-                service_to_node[svc].extend(roles_to_node[role])
-        else:
-            LOG.warning("Role '%s' defined, but unused", role)
+    service_to_node = _get_service_nodes(nodes, roles, k8s_node_names)
 
     replicas = replicas._dict.copy()
     for svc, svc_hosts in six.iteritems(service_to_node):
@@ -489,23 +616,22 @@ def _make_topology(nodes, roles, replicas):
         if svc_replicas > svc_hosts_count:
             LOG.error("Requested %s replicas for %s while only %s hosts able "
                       "to run that service (%s)", svc_replicas, svc,
-                      svc_hosts_count, ", ".join(svc_hosts))
+                      svc_hosts_count, ", ".join(sorted(svc_hosts)))
             raise RuntimeError("Replicas doesn't match available hosts.")
 
     if replicas:
         LOG.error("Replicas defined for unspecified service(s): %s",
                   ", ".join(replicas.keys()))
         raise RuntimeError("Replicas defined for unspecified service(s)")
-    service_to_node[JOBS_ROLE] = roles_to_node[JOBS_ROLE]
-    return {k: sorted(set(v)) for k, v in service_to_node.items()}
+    return {k: sorted(v) for k, v in service_to_node.items()}
 
 
 def _create_namespace(configs):
-    if CONF.action.dry_run:
+    if CONF.action.dry_run or CONF.action.plan:
         return
 
     template = templates.serialize_namespace(configs['namespace'])
-    kubernetes.process_object(template)
+    _process_object(template)
 
 
 def _create_openrc(config):
@@ -532,11 +658,16 @@ def _create_openrc(config):
              os.getcwd(), config['namespace'])
 
 
+def prefetch_workloads():
+    """List all live workloads at once for check_images_change"""
+    informer.sync_informers(WORKLOAD_KINDS)
+
+
 def check_images_change(objects):
     for obj in objects:
-        if obj['kind'] not in ('Deployment', 'DaemonSet', 'PetSet'):
+        if obj['kind'] not in WORKLOAD_KINDS:
             continue
-        kube_obj = kubernetes.get_pykube_object_if_exists(obj)
+        kube_obj = informer.get_object(obj['kind'], obj['metadata']['name'])
         if kube_obj is None:
             continue
         old_obj = kube_obj.obj
@@ -626,7 +757,7 @@ def create_upgrade_jobs(component_name, upgrade_data, configmaps, topology,
 
     job_specs = _create_pre_jobs(service, container, component_name, topology)
     for job_spec in job_specs:
-        kubernetes.process_object(job_spec)
+        _process_object(job_spec)
 
     LOG.info("Upgrade of component %s successfuly scheduled", component_name)
 
@@ -647,7 +778,7 @@ def _create_registry_secret():
     data = {".dockercfg": json.dumps(dockercfg, sort_keys=True)}
     secret = templates.serialize_secret(
         "registry-key", "kubernetes.io/dockercfg", data)
-    kubernetes.process_object(secret)
+    _process_object(secret)
 
 
 def _format_dependency(dep, components_map):
@@ -671,44 +802,150 @@ def create_dependencies(workflows, components_map):
             yield template
 
 
-def deploy_components(components_map, components):
+def _get_apply_workers():
+    # Dry-run output follows the apply order: objects are printed stage by
+    # stage and in the rendering order inside of each stage
+    if CONF.action.dry_run:
+        return 1
+    return CONF.kubernetes.apply_concurrency
 
-    topology = _make_topology(CONF.nodes, CONF.roles, CONF.replicas)
-    if not components:
-        components = set(topology.keys()) & set(components_map.keys())
-    else:
-        diff = components - set(topology.keys())
-        if diff:
-            raise ValueError('The next components are not '
-                             'defined in topology: %s' % list(diff))
 
-    deploy_validation.validate_requested_components(components, components_map)
+def _get_apply_stage(object_dict):
+    for stage, kinds in enumerate(APPLY_STAGES):
+        if object_dict['kind'] in kinds:
+            return stage
+    return len(APPLY_STAGES)
 
-    if CONF.action.export_dir:
-        os.makedirs(os.path.join(CONF.action.export_dir, 'configmaps'))
 
-    _create_namespace(CONF.configs)
-    _create_registry_secret()
-    _create_globals_configmap(CONF.configs)
-    _create_globals_secret(CONF.secret_configs)
-    _create_nodes_configmap(CONF.nodes)
-    start_script_cm = create_start_script_configmap()
+def apply_objects(objects):
+    """Apply k8s objects concurrently
 
-    # load exported j2 templates, which can be used across all repositories
-    exports_map = utils.get_repositories_exports()
-    j2_imports_files_header = jinja_utils.generate_jinja_imports(exports_map)
+    Objects are applied in stages, so that ConfigMaps and Secrets are created
+    before workloads that mount them. Objects inside of a stage are applied
+    in parallel using up to kubernetes.apply_concurrency workers.
 
-    exports_cm = _create_exports_configmap(exports_map)
-    exports_ctx = {'files_header': j2_imports_files_header, 'map': exports_map}
+    :returns: list -- applied pykube objects, None in dry run mode
+    """
+    results = []
+    stages = {}
+    for object_dict in objects:
+        stages.setdefault(_get_apply_stage(object_dict), []).append(
+            object_dict)
 
-    configmaps = (start_script_cm, exports_cm)
+    with futures.ThreadPoolExecutor(max_workers=_get_apply_workers()) as (
+            executor):
+        for stage in sorted(stages):
+            future_list = [executor.submit(_process_object, obj)
+                           for obj in stages[stage]]
+            for future in future_list:
+                results.append(future.result(timeout=APPLY_TIMEOUT))
+    return results
 
-    upgrading_components = {}
-    for service_name in components:
+
+def _parse_service(service, topology, configmaps, components_map):
+    objects_gen = parse_role(service, topology, configmaps, components_map)
+    return list(itertools.chain.from_iterable(objects_gen))
+
+
+def _parse_services(components, components_map, topology, configmaps):
+    """Render objects of the requested services in parallel
+
+    :returns: list -- (service name, list of objects) pairs sorted by name
+    """
+    with futures.ThreadPoolExecutor(max_workers=_get_apply_workers()) as (
+            executor):
+        future_list = []
+        for service_name in sorted(components):
+            future_list.append((service_name, executor.submit(
+                _parse_service, components_map[service_name], topology,
+                configmaps, components_map)))
+        # we need to use timeout because in this case python
+        # thread wakes up time to time to check timeout and don't
+        # block signal processing
+        return [(service_name, future.result(timeout=APPLY_TIMEOUT))
+                for service_name, future in future_list]
+
+
+def get_service_digest(component, topology, configmaps):
+    """Get digest of all inputs used to deploy the service
+
+    Service is redeployed only if this digest is changed since the last
+    deployment, see --incremental option of the deploy command.
+    """
+    service = component["service_content"]["service"]
+    service_name = service["name"]
+    service_configs = utils.get_service_configs(service_name)
+    rendering_context = _get_service_rendering_context(service_name,
+                                                       service_configs)
+    files = {}
+    for filename, f in (component["service_content"].get("files") or
+                        {}).items():
+        path = CONF.files.get(filename) or os.path.join(
+            component["service_dir"], "files", f["content"])
+        files[filename] = _get_file_version(path, rendering_context)
+
+    images_list = []
+    for cont in service["containers"]:
+        images_list.append(images.image_spec(cont["image"]))
+        for job in itertools.chain(cont.get("pre", ()), cont.get("post", ())):
+            images_list.append(images.image_spec(job.get("image") or
+                                                 cont["image"]))
+
+    data = {
+        "version": fuel_ccp.__version__,
+        "service_content": component["service_content"],
+        "files": files,
+        "service_configs": service_configs,
+        "images": images_list,
+        "replicas": CONF.replicas.get(service_name),
+        "topology": [topology.get(service_name), topology.get(JOBS_ROLE)],
+        "configmaps": [cm.obj["metadata"]["resourceVersion"]
+                       for cm in configmaps if cm],
+        "kubernetes": [CONF.kubernetes.namespace,
+                       CONF.kubernetes.image_pull_policy,
+                       CONF.kubernetes.appcontroller],
+        "ingress": CONF.configs.get("ingress"),
+    }
+    dump = _yaml.JSONEncoder(sort_keys=True).encode(data).encode("utf-8")
+    return hashlib.sha1(dump).hexdigest()
+
+
+def get_deploy_state():
+    """Get digests of services saved by the last deployment"""
+    try:
+        configmap = kubernetes.get_configmap(templates.DEPLOY_STATE_CONFIG)
+    except pykube_exc.ObjectDoesNotExist:
+        return {}
+    return configmap.obj.get("data") or {}
+
+
+def _save_deploy_state(state):
+    cm = templates.serialize_configmap(templates.DEPLOY_STATE_CONFIG, state)
+    return _process_object(cm)
+
+
+def _get_wave_ready_timeout():
+    if CONF.action.dry_run or CONF.action.plan:
+        return None
+    return CONF.kubernetes.wave_ready_timeout
+
+
+def _deploy_wave(wave, components_map, topology, configmaps,
+                 upgrading_components):
+    """Render and apply objects of the services concurrently
+
+    Services of the components that have to be upgraded are added to
+    upgrading_components instead of being applied.
+
+    :returns: tuple -- names of the applied services and generations of the
+        applied workloads by their kind and name
+    """
+    applied = []
+    objects_to_apply = []
+    parsed_services = _parse_services(wave, components_map, topology,
+                                      configmaps)
+    for service_name, objects in parsed_services:
         service = components_map[service_name]
-        service["service_content"]['service']['exports_ctx'] = exports_ctx
-        objects_gen = parse_role(service, topology, configmaps, components_map)
-        objects = list(itertools.chain.from_iterable(objects_gen))
         component_name = service['component_name']
         do_upgrade = component_name in upgrading_components
         if not do_upgrade and service['component']['upgrades']:
@@ -731,15 +968,120 @@ def deploy_components(components_map, components):
                          service_name, from_image, to_image)
 
         if not do_upgrade:
-            for obj in objects:
-                kubernetes.process_object(obj)
+            objects_to_apply.extend(objects)
+            applied.append(service_name)
         else:
             upgrading_components[component_name][service_name] = objects
 
+    generations = {}
+    for obj in apply_objects(objects_to_apply):
+        if obj is not None and obj.kind in WORKLOAD_KINDS + ('Job',):
+            generations[(obj.kind, obj.name)] = (
+                obj.obj['metadata'].get('generation', 0))
+    return applied, generations
+
+
+def _deploy_waves(components, components_map, topology, configmaps):
+    """Deploy services in waves ordered by their dependencies
+
+    If kubernetes.wave_ready_timeout is set, each wave is deployed only
+    after services of the previous one are ready.
+
+    :returns: dict -- components that have to be upgraded
+    """
+    upgrading_components = {}
+    if any(components_map[name]['component']['upgrades']
+           for name in components):
+        prefetch_workloads()
+    waves = dependencies.get_deploy_waves(components, components_map)
+    applied, generations = [], {}
+    for num, wave in enumerate(waves, 1):
+        timeout = _get_wave_ready_timeout()
+        if applied and timeout:
+            status.wait_for_ready(applied, timeout, generations)
+        LOG.info("Deploying wave %d of %d: %s", num, len(waves),
+                 ", ".join(wave))
+        applied, generations = _deploy_wave(
+            wave, components_map, topology, configmaps, upgrading_components)
+    return upgrading_components
+
+
+def deploy_components(components_map, components):
+    # Live objects are reported for deletion only if all services are
+    # rendered
+    full_deploy = not components and not CONF.action.incremental
+    if CONF.action.plan:
+        plan.reset()
+
+    topology = _make_topology(CONF.nodes, CONF.roles, CONF.replicas)
+    if not components:
+        components = set(topology.keys()) & set(components_map.keys())
+    else:
+        diff = components - set(topology.keys())
+        if diff:
+            raise ValueError('The next components are not '
+                             'defined in topology: %s' % list(diff))
+
+    deploy_validation.validate_requested_components(components, components_map)
+
+    if CONF.action.export_dir:
+        os.makedirs(os.path.join(CONF.action.export_dir, 'configmaps'))
+
+    if CONF.kubernetes.skip_unchanged and not CONF.action.dry_run:
+        informer.sync_informers(kubernetes.UPDATABLE_OBJECTS)
+
+    _create_namespace(CONF.configs)
+    _create_registry_secret()
+    _create_globals_configmap(CONF.configs)
+    _create_globals_secret(CONF.secret_configs)
+    _create_nodes_configmap(CONF.nodes)
+    start_script_cm = create_start_script_configmap()
+
+    # load exported j2 templates, which can be used across all repositories
+    exports_map = utils.get_repositories_exports()
+    j2_imports_files_header = jinja_utils.generate_jinja_imports(exports_map)
+
+    exports_cm = _create_exports_configmap(exports_map)
+    exports_ctx = {'files_header': j2_imports_files_header, 'map': exports_map}
+
+    configmaps = (start_script_cm, exports_cm)
+
+    deploy_state = {}
+    if CONF.action.incremental:
+        deploy_state = get_deploy_state()
+        digests = {}
+        skipped = []
+        for service_name in sorted(components):
+            service = components_map[service_name]
+            service["service_content"]['service']['exports_ctx'] = exports_ctx
+            digests[service_name] = get_service_digest(service, topology,
+                                                       configmaps)
+            if deploy_state.get(service_name) == digests[service_name]:
+                skipped.append(service_name)
+        if skipped:
+            LOG.info("Services are not changed since the last deployment, "
+                     "skipping: %s", ", ".join(skipped))
+        components = set(components) - set(skipped)
+        deploy_state.update(digests)
+
+    for service_name in components:
+        components_map[service_name]["service_content"]['service'][
+            'exports_ctx'] = exports_ctx
+    upgrading_components = _deploy_waves(components, components_map,
+                                         topology, configmaps)
+
     for component_name, component_upg in upgrading_components.items():
         create_upgrade_jobs(component_name, component_upg, configmaps,
                             topology, exports_ctx)
 
+    if CONF.action.plan:
+        plan.show_changes(plan.get_changes(with_deleted=full_deploy),
+                          with_deleted=full_deploy)
+        return
+
+    if CONF.action.incremental and not CONF.action.dry_run:
+        _save_deploy_state(deploy_state)
+
     if 'keystone' in components:
         conf = utils.get_rendering_config()
         _create_openrc(conf)
@@ -1,2 +1,6 @@
 class NotFoundException(Exception):
     pass
+
+
+class TimeoutException(Exception):
+    pass
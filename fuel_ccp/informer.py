@@ -0,0 +1,259 @@
+"""Local cache of the cluster state
+
+Informer lists all objects of a kind in the namespace once, so that status,
+validation and actions can query the cluster state as often as they need
+without sending requests to the API server. Callers waiting for changes of
+the cluster state start following the watch streams, which keep the cached
+objects up to date, one-shot commands only list the objects.
+"""
+
+from concurrent import futures
+import logging
+import re
+import threading
+import time
+
+from fuel_ccp import config
+from fuel_ccp import kubernetes
+
+CONF = config.CONF
+
+LOG = logging.getLogger(__name__)
+
+# Delay before the watch is restarted after a failure
+WATCH_RETRY_INTERVAL = 1
+
+# Objects created by ccp are labeled with "ccp=true", except for these kinds
+UNLABELED_KINDS = ('Ingress', 'Secret', 'Dependency')
+
+_SELECTOR_RE = re.compile(
+    r"\s*(?:(?P<not_exists>!)\s*(?P<nkey>[\w./-]+)"
+    r"|(?P<key>[\w./-]+)(?:"
+    r"\s*(?P<op>==|=|!=)\s*(?P<value>[\w./-]*)"
+    r"|\s+(?P<set_op>in|notin)\s*\((?P<values>[^)]*)\))?)"
+    r"\s*(?:,|$)")
+
+_INFORMERS = {}
+_INFORMERS_LOCK = threading.Lock()
+
+# Incremented on every change of the cached objects
+_generation = 0
+_CHANGED = threading.Condition()
+
+
+def _notify_changed():
+    global _generation
+    with _CHANGED:
+        _generation += 1
+        _CHANGED.notify_all()
+
+
+def get_generation():
+    return _generation
+
+
+def wait_for_changes(generation, timeout=None):
+    """Wait until any of the cached objects change
+
+    Watches of all listed kinds are started before waiting.
+
+    :param generation: generation of the state seen by the caller
+    :returns: int -- current generation
+    """
+    with _INFORMERS_LOCK:
+        informers = list(_INFORMERS.values())
+    for inf in informers:
+        inf.start_watch()
+    with _CHANGED:
+        if _generation == generation:
+            _CHANGED.wait(timeout)
+        return _generation
+
+
+def parse_selector(selector):
+    """Parse label selector into a list of requirements
+
+    :returns: list -- list of (key, operator, values) tuples, where operator
+        is one of "in", "notin", "exists" or "!exists"
+    """
+    requirements = []
+    if not selector:
+        return requirements
+    pos = 0
+    while pos < len(selector):
+        match = _SELECTOR_RE.match(selector, pos)
+        if not match or match.end() == pos:
+            raise ValueError('Invalid label selector "%s"' % selector)
+        pos = match.end()
+        if match.group("not_exists"):
+            requirements.append((match.group("nkey"), "!exists", ()))
+        elif match.group("op"):
+            op = "notin" if match.group("op") == "!=" else "in"
+            requirements.append(
+                (match.group("key"), op, (match.group("value"),)))
+        elif match.group("set_op"):
+            values = tuple(v.strip() for v in match.group("values").split(","))
+            requirements.append(
+                (match.group("key"), match.group("set_op"), values))
+        else:
+            requirements.append((match.group("key"), "exists", ()))
+    return requirements
+
+
+def match_labels(labels, requirements):
+    for key, op, values in requirements:
+        if op == "exists":
+            matched = key in labels
+        elif op == "!exists":
+            matched = key not in labels
+        elif op == "in":
+            matched = key in labels and labels[key] in values
+        else:
+            matched = key not in labels or labels[key] not in values
+        if not matched:
+            return False
+    return True
+
+
+class Informer(object):
+    """Cache of the objects of a single kind in the namespace"""
+
+    def __init__(self, kind, namespace=None, selector=None, client=None,
+                 watch=True):
+        self.kind = kind
+        self.namespace = namespace or CONF.kubernetes.namespace
+        self.selector = selector
+        self.obj_class = kubernetes.get_object_class(kind)
+        self._client = client
+        self._watch_enabled = watch
+        self._objects = {}
+        self._resource_version = None
+        self._synced = False
+        self._watcher = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = kubernetes.get_client()
+        return self._client
+
+    def _query(self):
+        return self.obj_class.objects(self.client).filter(
+            namespace=self.namespace, selector=self.selector)
+
+    def _list(self):
+        query = self._query()
+        objects = {obj.name: obj for obj in query}
+        with self._lock:
+            self._objects = objects
+            self._resource_version = (
+                query.response["metadata"].get("resourceVersion"))
+            self._synced = True
+        LOG.debug("Listed %d %s objects", len(objects), self.kind)
+        _notify_changed()
+
+    def sync(self):
+        """List objects if they aren't cached yet"""
+        if self._synced:
+            return
+        with self._sync_lock:
+            if self._synced:
+                return
+            self._list()
+
+    def start_watch(self):
+        """Follow changes of the listed objects in the background"""
+        if not self._watch_enabled or not self._synced or self._watcher:
+            return
+        with self._sync_lock:
+            if self._watcher:
+                return
+            self._watcher = threading.Thread(target=self._watch)
+            self._watcher.daemon = True
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self._follow()
+            except Exception as ex:
+                LOG.debug("Watch of %s objects failed: %s", self.kind, ex)
+                time.sleep(WATCH_RETRY_INTERVAL)
+                self._relist()
+
+    def _relist(self):
+        try:
+            self._list()
+        except Exception as ex:
+            LOG.debug("Failed to list %s objects: %s", self.kind, ex)
+
+    def _follow(self):
+        query = self._query().watch(since=self._resource_version)
+        for event in query:
+            if event.type == "ERROR":
+                # Usually means that resource version is too old
+                LOG.debug("Watch of %s objects expired", self.kind)
+                self._relist()
+                return
+            self.handle_event(event.type, event.object)
+
+    def handle_event(self, event_type, obj):
+        with self._lock:
+            if event_type == "DELETED":
+                self._objects.pop(obj.name, None)
+            else:
+                self._objects[obj.name] = obj
+            self._resource_version = obj.obj["metadata"].get(
+                "resourceVersion", self._resource_version)
+        _notify_changed()
+
+    def list(self, selector=None):
+        """List cached objects matching label selector
+
+        :returns: list -- pykube objects sorted by name
+        """
+        requirements = parse_selector(selector)
+        self.sync()
+        with self._lock:
+            objects = [self._objects[name] for name in sorted(self._objects)]
+        return [obj for obj in objects
+                if match_labels(obj.labels, requirements)]
+
+    def get_by_name(self, name):
+        """Get cached object by name
+
+        :returns: pykube object or None if object doesn't exist
+        """
+        self.sync()
+        with self._lock:
+            return self._objects.get(name)
+
+
+def get_informer(kind, namespace=None):
+    namespace = namespace or CONF.kubernetes.namespace
+    key = (kind, namespace)
+    with _INFORMERS_LOCK:
+        informer = _INFORMERS.get(key)
+        if informer is None:
+            selector = None if kind in UNLABELED_KINDS else "ccp=true"
+            informer = Informer(kind, namespace, selector)
+            _INFORMERS[key] = informer
+    return informer
+
+
+def list_objects(kind, selector=None):
+    return get_informer(kind).list(selector)
+
+
+def get_object(kind, name):
+    return get_informer(kind).get_by_name(name)
+
+
+def sync_informers(kinds):
+    """List objects of all given kinds concurrently"""
+    informers = [get_informer(kind) for kind in kinds]
+    with futures.ThreadPoolExecutor(max_workers=len(informers)) as executor:
+        for future in [executor.submit(inf.sync) for inf in informers]:
+            future.result()
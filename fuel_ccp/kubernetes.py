@@ -1,11 +1,16 @@
+import hashlib
+import json
 import logging
 import os
+import threading
 
 import pykube.exceptions
 import pykube.objects
-import yaml
+from requests import adapters
+from six.moves.urllib import parse as urlparse
 
 from fuel_ccp import config
+from fuel_ccp.config import _yaml
 
 CONF = config.CONF
 
@@ -19,6 +24,21 @@ UPDATABLE_OBJECTS = (
     'Secret',
 )
 
+# Hash of the rendered object is stored in this annotation to detect objects
+# that don't need to be updated
+HASH_ANNOTATION = 'ccp/spec-hash'
+
+PATCH_CONTENT_TYPES = {
+    'merge': 'application/merge-patch+json',
+    'strategic': 'application/strategic-merge-patch+json',
+    'apply': 'application/apply-patch+yaml',
+}
+
+# Clients are shared by all callers in the process, so that requests reuse
+# keep-alive connections instead of opening a new TLS session per object
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
 
 def get_client(kube_apiserver=None, key_file=None, cert_file=None,
                ca_cert=None, insecure=None, username=None, password=None):
@@ -30,6 +50,18 @@ def get_client(kube_apiserver=None, key_file=None, cert_file=None,
     username = username or CONF.kubernetes.username
     password = password or CONF.kubernetes.password
 
+    key = (kube_apiserver, key_file, cert_file, ca_cert, insecure, username,
+           password)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _create_client(*key)
+            _CLIENTS[key] = client
+    return client
+
+
+def _create_client(kube_apiserver, key_file, cert_file, ca_cert, insecure,
+                   username, password):
     cluster = {"server": kube_apiserver}
     if ca_cert:
         cluster["certificate-authority"] = ca_cert
@@ -69,7 +101,13 @@ def get_client(kube_apiserver=None, key_file=None, cert_file=None,
         ],
         "current-context": "ccp"
     }
-    return pykube.HTTPClient(pykube.KubeConfig(config))
+    client = pykube.HTTPClient(pykube.KubeConfig(config))
+    pool_size = CONF.kubernetes.connection_pool_size
+    adapter = adapters.HTTPAdapter(pool_connections=pool_size,
+                                   pool_maxsize=pool_size)
+    for prefix in ('http://', 'https://'):
+        client.session.mount(prefix, adapter)
+    return client
 
 
 def export_object(object_dict):
@@ -81,72 +119,136 @@ def export_object(object_dict):
     else:
         file_path = os.path.join(CONF.action.export_dir, file_name)
     with open(file_path, 'w') as object_file:
-        object_file.write(yaml.dump(
-            object_dict, default_flow_style=False))
+        _yaml.dump(object_dict, object_file)
 
 
-def _reload_obj(obj, updated_dict):
-    obj.reload()
-    obj.obj = updated_dict
+def get_object_class(kind):
+    obj_class = getattr(pykube, kind, None) or globals().get(kind, None)
+    if obj_class is None:
+        raise RuntimeError('"%s" object is not supported, skipping.' % kind)
+    return obj_class
 
 
-def get_pykube_object(object_dict, namespace=None, client=None):
+def set_object_namespace(object_dict, namespace=None):
     if namespace is None:
         namespace = CONF.kubernetes.namespace
-    if client is None:
-        client = get_client()
-    obj_class = getattr(pykube, object_dict["kind"], None) or globals().get(
-        object_dict["kind"], None)
-    if obj_class is None:
-        raise RuntimeError('"%s" object is not supported, skipping.'
-                           % object_dict['kind'])
-
     if not object_dict['kind'] == 'Namespace':
         object_dict['metadata']['namespace'] = namespace
 
-    return obj_class(client, object_dict)
 
+def get_pykube_object(object_dict, namespace=None, client=None):
+    if client is None:
+        client = get_client()
+    obj_class = get_object_class(object_dict["kind"])
+    set_object_namespace(object_dict, namespace)
+    return obj_class(client, object_dict)
 
-def get_pykube_object_if_exists(object_dict, namespace=None, client=None):
-    obj = get_pykube_object(object_dict, namespace=namespace, client=client)
-    try:
-        obj.reload()
-    except pykube.exceptions.HTTPError as ex:
-        # pykube 0.13 doesn't provide simple way to get code, so...
-        if 'not found' in ex.args[0].lower():
-            return None
-        raise
-    return obj
 
+def process_object(object_dict, namespace=None, client=None,
+                   get_live_object=None):
+    """Create or update k8s object
 
-def process_object(object_dict, namespace=None, client=None):
+    :param get_live_object: function returning live pykube object of the
+        given kind and name or None, usually from the informers cache. If
+        it's set, objects with the same hash as the live ones are not
+        updated and missing objects are created without trying to patch
+        them first.
+    """
     LOG.debug("Deploying %s: \"%s\"",
               object_dict["kind"], object_dict["metadata"]["name"])
     if not object_dict['kind'] == 'Namespace':
         if CONF.action.export_dir:
             export_object(object_dict)
         if CONF.action.dry_run:
-            LOG.info(yaml.dump(object_dict, default_flow_style=False))
+            LOG.info(_yaml.dump(object_dict))
             return
     obj = get_pykube_object(object_dict, namespace=namespace, client=client)
 
-    if obj.exists():
-        LOG.debug('%s "%s" already exists', object_dict['kind'],
+    updatable = object_dict['kind'] in UPDATABLE_OBJECTS
+    exists = True
+    if updatable and CONF.kubernetes.skip_unchanged:
+        obj_hash = set_object_hash(object_dict)
+        if get_live_object is not None:
+            live_obj = get_live_object(object_dict['kind'],
+                                       object_dict['metadata']['name'])
+            if live_obj is None:
+                exists = False
+            elif live_obj.obj['metadata'].get(
+                    'annotations', {}).get(HASH_ANNOTATION) == obj_hash:
+                LOG.debug('%s "%s" is up to date', object_dict['kind'],
+                          object_dict['metadata']['name'])
+                obj.set_obj(live_obj.obj)
+                return obj
+
+    if updatable and exists and _patch_object(obj):
+        LOG.debug('%s "%s" has been updated', object_dict['kind'],
                   object_dict['metadata']['name'])
-        if object_dict['kind'] in UPDATABLE_OBJECTS:
-            if object_dict['kind'] == 'Service':
-                # Reload object and merge new and old fields
-                _reload_obj(obj, object_dict)
-            obj.update()
-            LOG.debug('%s "%s" has been updated', object_dict['kind'],
-                      object_dict['metadata']['name'])
-    else:
-        obj.create()
+    elif _create_object(obj):
         LOG.debug('%s "%s" has been created', object_dict['kind'],
                   object_dict['metadata']['name'])
+    # Object could be created after the live objects were listed
+    elif updatable and not exists and _patch_object(obj):
+        LOG.debug('%s "%s" has been updated', object_dict['kind'],
+                  object_dict['metadata']['name'])
+    else:
+        LOG.debug('%s "%s" already exists', object_dict['kind'],
+                  object_dict['metadata']['name'])
     return obj
 
 
+def get_object_hash(object_dict):
+    annotations = object_dict['metadata'].get('annotations', {})
+    # Don't include the hash itself into the hashed data
+    stripped = dict(object_dict, metadata=dict(
+        object_dict['metadata'],
+        annotations={k: v for k, v in annotations.items()
+                     if k != HASH_ANNOTATION}))
+    dump = json.dumps(stripped, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(dump).hexdigest()
+
+
+def set_object_hash(object_dict):
+    obj_hash = get_object_hash(object_dict)
+    object_dict['metadata'].setdefault('annotations', {})[
+        HASH_ANNOTATION] = obj_hash
+    return obj_hash
+
+
+def _patch_object(obj):
+    """Update object with a single PATCH request
+
+    :returns: bool -- False if object doesn't exist yet
+    """
+    patch_type = CONF.kubernetes.patch_type
+    kwargs = obj.api_kwargs(
+        headers={"Content-Type": PATCH_CONTENT_TYPES[patch_type]},
+        # JSON is a valid YAML for server-side apply
+        data=json.dumps(obj.obj))
+    if patch_type == 'apply':
+        kwargs['url'] += '?' + urlparse.urlencode(
+            {'fieldManager': 'ccp', 'force': 'true'})
+    resp = obj.api.patch(**kwargs)
+    if resp.status_code == 404:
+        return False
+    obj.api.raise_for_status(resp)
+    obj.set_obj(resp.json())
+    return True
+
+
+def _create_object(obj):
+    """Create object with a single POST request
+
+    :returns: bool -- False if object already exists
+    """
+    resp = obj.api.post(**obj.api_kwargs(data=json.dumps(obj.obj),
+                                         obj_list=True))
+    if resp.status_code == 409:
+        return False
+    obj.api.raise_for_status(resp)
+    obj.set_obj(resp.json())
+    return True
+
+
 def list_k8s_nodes():
     client = get_client()
     return pykube.Node.objects(client).all()
@@ -0,0 +1,188 @@
+"""Changes a deployment would make to the cluster
+
+In plan mode rendered objects are collected instead of being applied, then
+they are compared with the live objects listed in bulk by informers.
+"""
+
+import copy
+import difflib
+import json
+import logging
+import threading
+
+import six
+
+from fuel_ccp import config
+from fuel_ccp import informer
+from fuel_ccp import kubernetes
+
+CONF = config.CONF
+
+LOG = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+DELETE = 'delete'
+
+_SYMBOLS = {CREATE: '+', UPDATE: '~', DELETE: '-'}
+
+# Live objects of these kinds are reported for deletion if they are not
+# rendered anymore, other kinds are also created by actions and upgrades
+DELETABLE_KINDS = ('Deployment', 'StatefulSet', 'Service')
+
+_OBJECTS = []
+_LOCK = threading.Lock()
+
+
+def reset():
+    with _LOCK:
+        del _OBJECTS[:]
+
+
+def add_object(object_dict):
+    """Add rendered object to the plan instead of applying it
+
+    Objects that would be created or updated get a predicted resourceVersion,
+    so that workloads depending on versions of changed ConfigMaps are
+    reported as changed too.
+
+    :returns: pykube object as it would be after applying the rendered one
+    """
+    # Namespace is set before hashing the same way as when applying objects
+    kubernetes.set_object_namespace(object_dict)
+    with _LOCK:
+        _OBJECTS.append(object_dict)
+    live = informer.get_object(object_dict['kind'],
+                               object_dict['metadata']['name'])
+    if live is not None and not _get_diff(live, object_dict):
+        return live
+    planned = copy.deepcopy(object_dict)
+    planned['metadata']['resourceVersion'] = 'plan-%s' % (
+        kubernetes.get_object_hash(object_dict))
+    return kubernetes.get_pykube_object(
+        planned, client=live.api if live is not None else None)
+
+
+def _get_diff(live, object_dict):
+    # Existing objects of other kinds are not updated by deploy
+    if object_dict['kind'] not in kubernetes.UPDATABLE_OBJECTS:
+        return []
+    live_hash = live.obj['metadata'].get('annotations', {}).get(
+        kubernetes.HASH_ANNOTATION)
+    if live_hash == kubernetes.get_object_hash(object_dict):
+        return []
+    return diff_objects(live.obj, object_dict)
+
+
+def diff_objects(live, rendered, path=''):
+    """Compare rendered object with the live one
+
+    Only fields set in the rendered object are compared, so that defaults
+    and status filled in by the API server are not reported.
+
+    :returns: list -- (path, live value, rendered value) tuples
+    """
+    if isinstance(rendered, dict) and isinstance(live, dict):
+        diff = []
+        for key in sorted(rendered):
+            if key == kubernetes.HASH_ANNOTATION:
+                continue
+            key_path = '%s.%s' % (path, key) if path else key
+            if key not in live:
+                diff.append((key_path, None, rendered[key]))
+            else:
+                diff.extend(diff_objects(live[key], rendered[key], key_path))
+        return diff
+    if (isinstance(rendered, list) and isinstance(live, list) and
+            len(rendered) == len(live)):
+        diff = []
+        for i, (live_item, item) in enumerate(zip(live, rendered)):
+            diff.extend(diff_objects(live_item, item, '%s[%d]' % (path, i)))
+        return diff
+    if live != rendered:
+        return [(path, live, rendered)]
+    return []
+
+
+def get_changes(with_deleted=True):
+    """Compare all objects added to the plan with the live objects
+
+    :param with_deleted: report live objects that are not rendered anymore
+    :returns: list -- (action, kind, name, diff) tuples sorted by kind and
+        name, diff is a list returned by diff_objects
+    """
+    with _LOCK:
+        objects = list(_OBJECTS)
+    kinds = sorted(set(obj['kind'] for obj in objects))
+    informer.sync_informers(kinds)
+
+    changes = []
+    rendered = set()
+    for object_dict in objects:
+        kind = object_dict['kind']
+        name = object_dict['metadata']['name']
+        rendered.add((kind, name))
+        live = informer.get_object(kind, name)
+        if live is None:
+            changes.append((CREATE, kind, name, []))
+            continue
+        diff = _get_diff(live, object_dict)
+        changes.append((UPDATE if diff else UNCHANGED, kind, name, diff))
+
+    if with_deleted:
+        for kind in DELETABLE_KINDS:
+            for obj in informer.list_objects(kind):
+                if (kind, obj.name) not in rendered:
+                    changes.append((DELETE, kind, obj.name, []))
+    return sorted(changes, key=lambda change: change[1:3])
+
+
+def _format_value(value):
+    return json.dumps(value, sort_keys=True)
+
+
+def _format_diff(kind, diff):
+    lines = []
+    for path, live, rendered in diff:
+        if kind == 'Secret':
+            lines.append('    %s: changed' % path)
+        elif (isinstance(live, six.string_types) and
+                isinstance(rendered, six.string_types) and
+                '\n' in live + rendered):
+            lines.append('    %s:' % path)
+            lines.extend('      ' + line.rstrip('\n') for line in
+                         difflib.unified_diff(live.splitlines(True),
+                                              rendered.splitlines(True),
+                                              n=1))
+        else:
+            lines.append('    %s: %s -> %s' % (path, _format_value(live),
+                                               _format_value(rendered)))
+    return lines
+
+
+def show_changes(changes, with_deleted=True):
+    """Log summary of the changes and changed fields of updated objects
+
+    :param with_deleted: whether changes include live objects to delete
+    """
+    counts = dict.fromkeys((CREATE, UPDATE, UNCHANGED, DELETE), 0)
+    lines = []
+    for action, kind, name, diff in changes:
+        counts[action] += 1
+        if action == UNCHANGED:
+            continue
+        lines.append('%s %s/%s' % (_SYMBOLS[action], kind, name))
+        lines.extend(_format_diff(kind, diff))
+    LOG.info('Plan: %d to create, %d to update, %d unchanged, %d to delete',
+             counts[CREATE], counts[UPDATE], counts[UNCHANGED],
+             counts[DELETE])
+    if with_deleted:
+        LOG.info('Only %s objects are checked for deletion',
+                 ', '.join(DELETABLE_KINDS))
+    else:
+        LOG.info('Objects to delete are checked only when all components '
+                 'are deployed')
+    if lines:
+        LOG.info('\n'.join(lines))
+    return counts
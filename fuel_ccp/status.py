@@ -3,9 +3,11 @@ from __future__ import print_function
 import copy
 import logging
 import sys
+import time
 
 from fuel_ccp import config
-from fuel_ccp import kubernetes
+from fuel_ccp import exceptions
+from fuel_ccp import informer
 
 CONF = config.CONF
 
@@ -17,6 +19,8 @@ STATE_TEMPLATE = {
     "pod_running": 0,
     "job_total": 0,
     "job_completed": 0,
+    # workloads status describes their latest spec
+    "observed": True,
     "links": []
 }
 COLORS = {
@@ -38,7 +42,20 @@ ST_WIP = colorized("yellow", "wip")
 
 def is_app_ready(state):
     return (state["pod_total"] == state["pod_running"]
-            and state["job_total"] == state["job_completed"])
+            and state["job_total"] == state["job_completed"]
+            and state["observed"])
+
+
+def is_workload_observed(workload):
+    """Check that status of the workload is up to date with its spec
+
+    Until the controller observes the latest generation, status describes
+    the previous revision of the workload.
+    """
+    st = workload.obj.get("status", {})
+    return (st.get("observedGeneration", 0) >=
+            workload.obj["metadata"].get("generation", 0) and
+            st.get("replicas", 0) == workload.obj["spec"]["replicas"])
 
 
 def repr_state(state):
@@ -48,26 +65,40 @@ def repr_state(state):
 def get_pod_states(components=None):
     ext_ip = CONF.configs.get("k8s_external_ip", "")
 
+    if CONF.configs.ingress.enabled:
+        link_kind = "Ingress"
+    else:
+        link_kind = "Service"
+    informer.sync_informers(
+        ("Deployment", "Job", "StatefulSet", "Pod", link_kind))
+
     states = {}
-    selector = "app in (%s)" % ','.join(components) if components else None
-    for dp in kubernetes.list_cluster_deployments(selector):
+    selector = "ccp=true"
+    if components:
+        selector += ",app in (%s)" % ','.join(components)
+    for dp in informer.list_objects("Deployment", selector):
         states.setdefault(dp.name, copy.deepcopy(STATE_TEMPLATE))
         dp_st = dp.obj["status"]
         states[dp.name]["pod_total"] = dp.obj["spec"]["replicas"]
         states[dp.name]["pod_running"] = min(
             dp_st.get("availableReplicas", 0), dp_st.get("updatedReplicas", 0))
+        states[dp.name]["observed"] = is_workload_observed(dp)
 
-    for job in kubernetes.list_cluster_jobs(selector):
+    for job in informer.list_objects("Job", selector):
         app_name = job.obj["metadata"]["labels"].get("app")
         states.setdefault(app_name, copy.deepcopy(STATE_TEMPLATE))
         states[app_name]["job_total"] += job.obj["spec"]["completions"]
         states[app_name]["job_completed"] += (
             job.obj["status"].get("succeeded", 0))
 
-    for ss in kubernetes.list_cluster_statefulsets(selector):
+    pods = {}
+    for pod in informer.list_objects("Pod", selector):
+        pods.setdefault(pod.labels.get("app"), []).append(pod)
+    for ss in informer.list_objects("StatefulSet", selector):
         states.setdefault(ss.name, copy.deepcopy(STATE_TEMPLATE))
         states[ss.name]["pod_total"] = ss.obj["spec"]["replicas"]
-        for pod in kubernetes.list_cluster_pods(ss.name):
+        states[ss.name]["observed"] = is_workload_observed(ss)
+        for pod in pods.get(ss.name, ()):
             if not pod.obj.get("status", {}).get("containerStatuses"):
                 continue
             if all((cont.get("ready", False) for cont in
@@ -78,14 +109,14 @@ def get_pod_states(components=None):
         url_template = "https://%s"
         if CONF.configs.ingress.get("port"):
             url_template += ":%d" % CONF.configs.ingress.port
-        for ing in kubernetes.list_cluster_ingress():
+        for ing in informer.list_objects("Ingress"):
             if components and ing.name not in components:
                 continue
             states.setdefault(ing.name, copy.deepcopy(STATE_TEMPLATE))
             for rule in ing.obj['spec']['rules']:
                 states[ing.name]['links'].append(url_template % rule['host'])
     else:
-        for svc in kubernetes.list_cluster_services():
+        for svc in informer.list_objects("Service", "ccp=true"):
             svc_name = svc.obj["metadata"]["name"]
             if components and svc_name not in components:
                 continue
@@ -98,8 +129,65 @@ def get_pod_states(components=None):
     return states
 
 
-def show_long_status(components=None):
-    states = get_pod_states(components)
+def _get_unseen(generations):
+    """Get names of objects not cached at the given generations yet"""
+    unseen = []
+    for (kind, name), generation in generations.items():
+        obj = informer.get_object(kind, name)
+        if (obj is None or
+                obj.obj["metadata"].get("generation", 0) < generation):
+            unseen.append(name)
+    return unseen
+
+
+def wait_for_ready(components=None, timeout=None, generations=None):
+    """Wait until all applications are ready
+
+    States are recalculated from the informers cache each time the watched
+    objects change, so no requests are sent to the API server while waiting.
+    Requested components which have no objects in the cluster yet are not
+    ready.
+
+    :param generations: dict -- generations of the applied objects by their
+        kind and name, applications are not ready until the informers
+        cache has these objects at least at these generations
+    :returns: dict -- states of the applications
+    :raises: fuel_ccp.exceptions.TimeoutException
+    """
+    deadline = time.time() + timeout if timeout else None
+    waiting_for = None
+    while True:
+        generation = informer.get_generation()
+        states = get_pod_states(components)
+        not_ready = set(name for name, state in states.items()
+                        if not is_app_ready(state))
+        not_ready.update(set(components or ()) - set(states))
+        not_ready.update(_get_unseen(generations or {}))
+        not_ready = sorted(not_ready)
+        if states and not not_ready:
+            return states
+        if not_ready != waiting_for:
+            waiting_for = not_ready
+            LOG.info("Waiting for: %s",
+                     ", ".join(not_ready) or "deployment to start")
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise exceptions.TimeoutException(
+                    "Timed out waiting for: %s" % (
+                        ", ".join(not_ready) or "deployment to start"))
+        informer.wait_for_changes(generation, remaining)
+
+
+def _get_states(components, watch, timeout):
+    if watch:
+        return wait_for_ready(components, timeout)
+    return get_pod_states(components)
+
+
+def show_long_status(components=None, watch=False, timeout=None):
+    states = _get_states(components, watch, timeout)
     columns = ("service", "pod", "job", "ready", "links")
 
     formatted_states = []
@@ -115,8 +203,8 @@ def show_long_status(components=None):
     return columns, formatted_states
 
 
-def show_short_status(components=None):
-    states = get_pod_states(components)
+def show_short_status(components=None, watch=False, timeout=None):
+    states = _get_states(components, watch, timeout)
     if not states:
         status = "not deployed"
     else:
@@ -17,6 +17,7 @@ FILES_CONFIG = "files"
 META_CONFIG = "meta"
 ROLE_CONFIG = "role"
 EXPORTS_CONFIG = "exports"
+DEPLOY_STATE_CONFIG = "deploy-state"
 
 ENTRYPOINT_PATH = "/opt/ccp_start_script/bin/start_script.py"
 PYTHON_PATH = "/usr/bin/python"
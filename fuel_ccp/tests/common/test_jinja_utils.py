@@ -1,3 +1,6 @@
+import os
+
+import fixtures
 from jinja2 import exceptions
 
 from fuel_ccp.common import jinja_utils
@@ -67,3 +70,73 @@ class TestJinjaUtils(base.TestCase):
             "debian\n\n\n\n\nkeystone.ccp.svc.cluster.local\n"
             "keystone.ccp.svc.cluster.local",
             content)
+
+    def test_get_referenced_variables(self):
+        self.assertEqual(
+            {"base_distro", "base_tag", "maintainer", "duck", "address"},
+            jinja_utils.get_referenced_variables(self.filename))
+
+    def test_jinja_render_cached_environment(self):
+        self.useFixture(fixtures.MockPatchObject(
+            jinja_utils, '_ENVIRONMENTS', {}))
+        context = {"base_distro": "debian"}
+        first = jinja_utils.jinja_render(
+            self.filename, context, functions=[utils.address],
+            ignore_undefined=True)
+        self.assertEqual(first, jinja_utils.jinja_render(
+            self.filename, context, functions=[utils.address],
+            ignore_undefined=True))
+        self.assertEqual(1, len(jinja_utils._ENVIRONMENTS))
+        # compiled template is stored in the bytecode cache
+        self.assertEqual(1, len(os.listdir(
+            os.path.join(self.conf.cache.path, 'jinja'))))
+
+        self.assertRaises(exceptions.UndefinedError, jinja_utils.jinja_render,
+                          self.filename, context)
+        self.assertEqual(2, len(jinja_utils._ENVIRONMENTS))
+
+    def test_jinja_render_imported_functions(self):
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        with open(os.path.join(tmp_dir, 'macros.j2'), 'w') as f:
+            f.write("{% macro url() %}{{ address('keystone') }}{% endmacro %}")
+        with open(os.path.join(tmp_dir, 'main.j2'), 'w') as f:
+            f.write("{% import 'macros.j2' as macros %}{{ macros.url() }}")
+        self.assertEqual(
+            "keystone.ccp.svc.cluster.local",
+            jinja_utils.jinja_render(os.path.join(tmp_dir, 'main.j2'), {},
+                                     functions=[utils.address]))
+
+    def test_jinja_render_closures(self):
+        self.useFixture(fixtures.MockPatchObject(
+            jinja_utils, '_ENVIRONMENTS', {}))
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        with open(os.path.join(tmp_dir, 'macros.j2'), 'w') as f:
+            f.write("{% macro show() %}{{ value() }}{% endmacro %}")
+        with open(os.path.join(tmp_dir, 'main.j2'), 'w') as f:
+            f.write("{% import 'macros.j2' as macros %}"
+                    "{{ value() }} {{ macros.show() }}")
+
+        def render(result):
+            def value():
+                return result
+            return jinja_utils.jinja_render(os.path.join(tmp_dir, 'main.j2'),
+                                            {}, functions=[value])
+        self.assertEqual('1 1', render('1'))
+        self.assertEqual('2 2', render('2'))
+        # functions with the same names share the environment
+        self.assertEqual(1, len(jinja_utils._ENVIRONMENTS))
+
+    def test_get_template_digest(self):
+        digest, variables = jinja_utils.get_template_digest(self.filename)
+        self.assertEqual(
+            {"base_distro", "base_tag", "maintainer", "duck", "address"},
+            variables)
+        self.assertEqual((digest, variables),
+                         jinja_utils.get_template_digest(self.filename))
+
+    def test_get_template_digest_computed_include(self):
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        path = os.path.join(tmp_dir, 'template.j2')
+        with open(path, 'w') as f:
+            f.write('{% include name %}')
+        self.assertIsNone(jinja_utils.get_template_digest(path))
@@ -1,9 +1,13 @@
+import multiprocessing
 import os
 
+import fixtures
 from jinja2 import exceptions as jinja_exceptions
+import mock
 import testscenarios
 import yaml
 
+from fuel_ccp.common import jinja_utils
 from fuel_ccp.common import utils
 from fuel_ccp import config
 from fuel_ccp.tests import base
@@ -11,34 +15,38 @@ from fuel_ccp.tests import base
 
 class TestUtils(base.TestCase):
 
-    def test_get_deploy_components_info_with_default_context(self):
-
-        default_params = {
-            "configs": {
-                "service_name": "keystone",
-                "db_root_password": "db_root_password_default",
-                "keystone_db_name": "keystone_db_name_default",
-                "keystone_db_username": "keystone_db_username_default",
-                "keystone_db_password": "keystone_db_password_default",
-                "openstack_user_password": "os_user_password_default",
-                "openstack_user_name": "os_user_name_default",
-                "openstack_project_name": "os_project_name_default",
-                "openstack_role_name": "os_role_name_default",
-                "keystone_admin_port": "keystone_admin_port_default",
-                "keystone_public_port": "keystone_public_port_default"
-            }
+    default_params = {
+        "configs": {
+            "service_name": "keystone",
+            "db_root_password": "db_root_password_default",
+            "keystone_db_name": "keystone_db_name_default",
+            "keystone_db_username": "keystone_db_username_default",
+            "keystone_db_password": "keystone_db_password_default",
+            "openstack_user_password": "os_user_password_default",
+            "openstack_user_name": "os_user_name_default",
+            "openstack_project_name": "os_project_name_default",
+            "openstack_role_name": "os_role_name_default",
+            "keystone_admin_port": "keystone_admin_port_default",
+            "keystone_public_port": "keystone_public_port_default"
         }
+    }
 
+    def _setup_default_context(self):
         conf = config._yaml.AttrDict()
-        conf._merge(default_params)
+        conf._merge(self.default_params)
         conf._merge(config._REAL_CONF)
         config._REAL_CONF = conf
+        self.conf = conf
 
         base_dir = os.path.dirname(__file__)
 
         self.conf.repositories.path = os.path.join(base_dir, "test_repo_dir")
         self.conf.repositories.repos = [{"name": "component"}]
 
+    def test_get_deploy_components_info_with_default_context(self):
+        self._setup_default_context()
+        base_dir = os.path.dirname(__file__)
+
         res = (
             utils.get_deploy_components_info()["keystone"]["service_content"]
         )
@@ -49,6 +57,23 @@ class TestUtils(base.TestCase):
 
         self.assertDictEqual(expected, res)
 
+    def test_get_deploy_components_info_cached(self):
+        self._setup_default_context()
+        with mock.patch.object(jinja_utils, 'jinja_render',
+                               wraps=jinja_utils.jinja_render) as m_render:
+            expected = utils.get_deploy_components_info()
+            self.assertEqual(expected, utils.get_deploy_components_info())
+            self.assertEqual(1, m_render.call_count)
+
+            self.conf.configs._merge({'keystone_admin_port': 'changed'})
+            res = utils.get_deploy_components_info()
+            self.assertEqual(2, m_render.call_count)
+            self.assertNotEqual(expected, res)
+
+            self.conf.cache._merge({'services': False})
+            utils.get_deploy_components_info()
+            self.assertEqual(3, m_render.call_count)
+
     def test_get_deploy_components_info_with_not_enough_context(self):
 
         default_params = {
@@ -85,6 +110,100 @@ class TestUtils(base.TestCase):
         self.assertEqual('service.test', utils.get_ingress_host('service'))
 
 
+class TestLazyComponents(base.TestCase):
+    services = {
+        'a': {'containers': [{'name': 'a', 'daemon': {
+            'dependencies': ['b-init', 'c']}}]},
+        'b': {'containers': [{'name': 'b', 'daemon': {}, 'pre': [
+            {'name': 'b-init', 'type': 'single'}]}]},
+        'c': {'containers': [{'name': 'c', 'daemon': {}}]},
+        'd': {'containers': [{'name': 'd', 'daemon': {
+            'dependencies': ['a']}}]},
+    }
+
+    def setUp(self):
+        super(TestLazyComponents, self).setUp()
+        repos_dir = self.useFixture(fixtures.TempDir()).path
+        self.conf.repositories.path = repos_dir
+        self.conf.repositories.repos = [{"name": "component"}]
+        service_dir = os.path.join(repos_dir, "component", "service")
+        os.makedirs(service_dir)
+        for name, service in self.services.items():
+            with open(os.path.join(service_dir, name + ".yaml"), "w") as f:
+                yaml.safe_dump({"service": dict(service, name=name)}, f,
+                               default_flow_style=False)
+        self.render = self.useFixture(fixtures.MockPatchObject(
+            jinja_utils, 'jinja_render',
+            side_effect=jinja_utils.jinja_render)).mock
+
+    def _get_rendered(self):
+        return sorted(os.path.basename(c[0][0])
+                      for c in self.render.call_args_list)
+
+    def test_index_service_file(self):
+        self.assertEqual(
+            ('b', {'b', 'b-init'}),
+            utils._index_service_file(os.path.join(
+                self.conf.repositories.path, 'component', 'service',
+                'b.yaml')))
+
+    def test_load_with_dependencies(self):
+        components_map = utils.get_deploy_components_info(['a'])
+        self.assertEqual(['a.yaml', 'b.yaml', 'c.yaml'], self._get_rendered())
+        self.assertEqual(
+            ['b/b-init', 'c/c'],
+            components_map['a']['service_content']['service'][
+                'containers'][0]['daemon']['dependencies'])
+
+        self.assertEqual(
+            ['a/a'],
+            components_map['d']['service_content']['service'][
+                'containers'][0]['daemon']['dependencies'])
+        self.assertEqual(4, self.render.call_count)
+        self.assertRaises(KeyError, lambda: components_map['e'])
+
+    def test_contains_and_get(self):
+        components_map = utils.get_deploy_components_info(['c'])
+        self.assertEqual(['c.yaml'], self._get_rendered())
+        self.assertIn('b', components_map)
+        self.assertEqual(
+            'a', components_map.get('a')['service_content']['service']['name'])
+        self.assertNotIn('e', components_map)
+        self.assertIsNone(components_map.get('e'))
+        # unknown names are looked up in the index only
+        self.assertEqual(['a.yaml', 'b.yaml', 'c.yaml'],
+                         self._get_rendered())
+
+    def test_load_parallel(self):
+        self.conf.cache._merge({'services': False})
+        self.conf.services._merge({'e': {'service_def': 'a'},
+                                   'f': {'service_def': 'c'}})
+        expected = utils.get_deploy_components_info()
+        self.conf.repositories._merge({'render_processes': 2})
+        with mock.patch('multiprocessing.Pool',
+                        wraps=multiprocessing.Pool) as m_pool:
+            result = utils.get_deploy_components_info()
+        m_pool.assert_called_once_with(2, mock.ANY, mock.ANY)
+        self.assertEqual(expected, result)
+        self.assertEqual(['a', 'b', 'c', 'd', 'e', 'f'], sorted(result))
+
+    def test_load_not_indexed(self):
+        components_map = utils.get_deploy_components_info(['e'])
+        self.assertEqual([], self._get_rendered())
+        self.assertNotIn('e', components_map)
+
+        service_dir = os.path.join(self.conf.repositories.path, 'component',
+                                   'service')
+        with open(os.path.join(service_dir, 'templated.yaml'), 'w') as f:
+            f.write("service:\n  name: {{ 'e' }}\n  containers:\n"
+                    "  - name: e\n    daemon:\n      dependencies: [a]\n")
+        components_map = utils.get_deploy_components_info(['e'])
+        self.assertIn('e', components_map)
+        # only files with templated names are loaded with dependencies
+        self.assertEqual(['a.yaml', 'b.yaml', 'c.yaml', 'templated.yaml'],
+                         self._get_rendered())
+
+
 class TestAddress(testscenarios.WithScenarios, base.TestCase):
     scenarios = (
         ('internal_without_port',
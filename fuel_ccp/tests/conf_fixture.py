@@ -8,3 +8,4 @@ class Config(fixtures.Fixture):
         self.useFixture(fixtures.MockPatchObject(config, '_REAL_CONF'))
         config.setup_config(None)
         self.conf = config._REAL_CONF
+        self.conf['cache']['path'] = self.useFixture(fixtures.TempDir()).path
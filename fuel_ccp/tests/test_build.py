@@ -1,7 +1,11 @@
 import collections
 import copy
+import io
 import os
+import tarfile
+import threading
 
+import docker
 import fixtures
 import mock
 import testscenarios
@@ -55,7 +59,7 @@ class TestBuild(base.TestCase):
     @mock.patch("docker.Client")
     @mock.patch("fuel_ccp.build.build_dockerfile")
     @mock.patch("fuel_ccp.build.submit_dockerfile_processing")
-    @mock.patch("fuel_ccp.build.create_rendered_dockerfile")
+    @mock.patch("fuel_ccp.build.get_build_context")
     def test_process_dockerfile_middle(
             self, render_mock, submit_dockerfile_processing_mock,
             build_dockerfile_mock, dc_mock):
@@ -101,12 +105,12 @@ class TestBuild(base.TestCase):
 
         submit_dockerfile_processing_mock.assert_called_once_with(
             dockerfiles["leaf"], mock.ANY, mock.ANY, mock.ANY,
-            mock.ANY, ["root", "middle", "leaf"])
+            mock.ANY, ["root", "middle", "leaf"], None)
 
     @mock.patch("docker.Client")
     @mock.patch("fuel_ccp.build.build_dockerfile")
     @mock.patch("fuel_ccp.build.submit_dockerfile_processing")
-    @mock.patch("fuel_ccp.build.create_rendered_dockerfile")
+    @mock.patch("fuel_ccp.build.get_build_context")
     def test_process_dockerfile_parent_build_failed(
             self, render_mock, submit_dockerfile_processing_mock,
             build_dockerfile_mock, dc_mock):
@@ -146,7 +150,7 @@ class TestBuild(base.TestCase):
     @mock.patch("docker.Client")
     @mock.patch("fuel_ccp.build.build_dockerfile")
     @mock.patch("fuel_ccp.build.submit_dockerfile_processing")
-    @mock.patch("fuel_ccp.build.create_rendered_dockerfile")
+    @mock.patch("fuel_ccp.build.get_build_context")
     def test_process_dockerfile_middle_keep_consistency_off(
             self, render_mock, submit_dockerfile_processing_mock,
             build_dockerfile_mock, dc_mock):
@@ -225,12 +229,566 @@ class TestBuild(base.TestCase):
         dockerfiles['ms-debian-base']['build_result'] = 'Failure'
         self.assertFalse(build._get_summary(dockerfiles))
 
+    def test_get_summary_skipped(self):
+        dockerfiles = self.__create_dockerfile_objects()
+        dockerfiles['ms-debian-base']['build_result'] = 'Skipped'
+        dockerfiles['ms-debian-base']['push_result'] = 'Exists'
+        self.assertTrue(build._get_summary(dockerfiles))
+
     def test_get_summary_push_failed(self):
         dockerfiles = self.__create_dockerfile_objects()
         dockerfiles['ms-debian-base']['push_result'] = 'Failure'
         self.assertFalse(build._get_summary(dockerfiles))
 
 
+class TestBuildContext(base.TestCase):
+    def setUp(self):
+        super(TestBuildContext, self).setUp()
+        self.tmp_path = self.useFixture(fixtures.TempDir()).path
+        self.build_dir = os.path.join(self.tmp_path, 'build')
+        self.repos = []
+        self.m_clone = self.useFixture(fixtures.MockPatch(
+            'git.Repo.clone_from', side_effect=self._clone)).mock
+        self.m_repo = self.useFixture(fixtures.MockPatch('git.Repo')).mock
+        self.m_repo.clone_from = self.m_clone
+        self.config = {'render': {'version': '1.0'}, 'sources': {
+            'src': {'git_url': 'https://example.org/src.git',
+                    'git_ref': 'master'}}}
+
+        self.src_dir = os.path.join(self.tmp_path, 'docker', 'nova-api')
+        os.makedirs(os.path.join(self.src_dir, 'conf'))
+        for name, content in [('Dockerfile.j2', 'FROM nova-base'),
+                              ('start.sh', 'start'),
+                              ('conf/api.conf', 'conf'),
+                              ('version.j2', '{{ version }}')]:
+            with open(os.path.join(self.src_dir, name), 'w') as f:
+                f.write(content)
+        self.dockerfile = {
+            'name': 'nova-api',
+            'path': os.path.join(self.src_dir, 'Dockerfile.j2'),
+            'content': 'FROM nova-base',
+            'sources': {'src'},
+            'render_files': [{'src': 'version.j2', 'dest': 'version'}],
+            'digest': 'digest',
+        }
+
+    def _clone(self, url, path, **kwargs):
+        os.makedirs(path)
+        with open(os.path.join(path, 'setup.py'), 'w') as f:
+            f.write(url)
+        os.symlink('setup.py', os.path.join(path, 'link.py'))
+        repo = mock.Mock()
+        self.repos.append(repo)
+        return repo
+
+    def _get_context(self):
+        context = build.get_build_context(self.dockerfile, self.build_dir,
+                                          self.config)
+        return tarfile.open(fileobj=io.BytesIO(b''.join(
+            build.stream_build_context(context))))
+
+    def _read(self, tar, name):
+        return tar.extractfile(name).read().decode('utf-8')
+
+    def test_get_source_path_git(self):
+        path = build.get_source_path('src', 'nova-api', self.build_dir,
+                                     self.config)
+        self.assertEqual(path, build.get_source_path(
+            'src', 'nova-compute', self.build_dir, self.config))
+        self.assertFalse(path[1])
+
+        mirror = os.path.join(self.conf.cache.path, 'sources',
+                              build.cache.get_key(
+                                  'https://example.org/src.git') + '.git')
+        self.assertEqual([
+            mock.call('https://example.org/src.git', mirror + '.tmp',
+                      mirror=True),
+            mock.call(mirror, path[0] + '.tmp', local=True,
+                      no_checkout=True),
+        ], self.m_clone.call_args_list)
+        self.repos[1].git.checkout.assert_called_once_with('master')
+        self.repos[1].git.remote.assert_called_once_with(
+            'set-url', 'origin', 'https://example.org/src.git')
+
+        # Mirror is updated once per build
+        self.build_dir = os.path.join(self.tmp_path, 'build2')
+        build.get_source_path('src', 'nova-api', self.build_dir, self.config)
+        self.m_repo.assert_called_once_with(mirror)
+        self.m_repo.return_value.git.remote.assert_called_once_with(
+            'update', '--prune')
+        self.assertEqual(3, self.m_clone.call_count)
+
+    def test_stream_build_context(self):
+        tar = self._get_context()
+        self.assertEqual([
+            'Dockerfile', 'src', 'src/link.py', 'src/setup.py', 'version',
+            'conf', 'conf/api.conf', 'start.sh', 'version.j2',
+        ], tar.getnames())
+        self.assertEqual('FROM nova-base\nLABEL %s=digest\n' %
+                         build.DIGEST_LABEL, self._read(tar, 'Dockerfile'))
+        self.assertEqual('1.0', self._read(tar, 'version'))
+        self.assertEqual('conf', self._read(tar, 'conf/api.conf'))
+        self.assertTrue(tar.getmember('src/link.py').issym())
+
+    def test_stream_build_context_no_empty_chunks(self):
+        chunks = list(build.stream_build_context([
+            build.ContextMember('Dockerfile', None, b'FROM debian\n', False,
+                                False),
+            build.ContextMember('start.sh', None, b'start', False, False),
+        ]))
+        self.assertTrue(chunks)
+        self.assertNotIn(b'', chunks)
+        tar = tarfile.open(fileobj=io.BytesIO(b''.join(chunks)))
+        self.assertEqual(['Dockerfile', 'start.sh'], tar.getnames())
+
+    def test_stream_build_context_source_dir(self):
+        source_dir = os.path.join(self.tmp_path, 'source')
+        os.makedirs(os.path.join(source_dir, 'pkg'))
+        with open(os.path.join(source_dir, 'pkg', 'module.py'), 'w') as f:
+            f.write('module')
+        os.symlink('pkg', os.path.join(source_dir, 'link'))
+        self.config['sources']['src'] = {'source_dir': source_dir}
+
+        tar = self._get_context()
+        self.assertFalse(self.m_clone.called)
+        self.assertIn('src/pkg/module.py', tar.getnames())
+        self.assertTrue(tar.getmember('src/link').isdir())
+        self.assertEqual('module', self._read(tar, 'src/link/module.py'))
+
+    def test_stream_build_context_dockerignore(self):
+        with open(os.path.join(self.src_dir, '.dockerignore'), 'w') as f:
+            f.write('conf/*.conf\n')
+        self.dockerfile['sources'] = set()
+        tar = self._get_context()
+        self.assertEqual([
+            'Dockerfile', 'version', '.dockerignore', 'conf', 'start.sh',
+            'version.j2',
+        ], tar.getnames())
+
+
+class TestBuildScheduling(base.TestCase):
+    def _dockerfiles(self, tree, match=True):
+        dockerfiles = {}
+        for name, parent in tree:
+            dockerfiles[name] = {'name': name, 'parent': None,
+                                 'children': [], 'match': match}
+            if parent:
+                dockerfiles[name]['parent'] = dockerfiles[parent]
+                dockerfiles[parent]['children'].append(dockerfiles[name])
+        return dockerfiles
+
+    def _set_duration(self, dockerfile, duration):
+        build.cache.set('build-durations',
+                        build._get_duration_key(dockerfile),
+                        {'duration': duration})
+
+    def test_set_build_priorities(self):
+        dockerfiles = self._dockerfiles([
+            ('base', None), ('openstack-base', 'base'),
+            ('nova-base', 'openstack-base'), ('nova-api', 'nova-base'),
+            ('memcached', 'base'), ('other', None)])
+        for name, duration in [('base', 10), ('openstack-base', 5),
+                               ('nova-base', 3), ('nova-api', 2),
+                               ('memcached', 4)]:
+            self._set_duration(dockerfiles[name], duration)
+        dockerfiles['memcached']['match'] = False
+
+        build.set_build_priorities(dockerfiles, [])
+        self.assertEqual({
+            'base': 20, 'openstack-base': 10, 'nova-base': 5, 'nova-api': 2,
+            'other': 4.8,
+        }, {name: d['priority'] for name, d in dockerfiles.items()
+            if 'priority' in d})
+
+        build.set_build_priorities(dockerfiles, ['memcached'])
+        self.assertEqual(4, dockerfiles['memcached']['priority'])
+
+    def test_get_build_durations_default(self):
+        dockerfiles = self._dockerfiles([('base', None), ('mysql', 'base')])
+        self.assertEqual({'base': 1.0, 'mysql': 1.0},
+                         build.get_build_durations(dockerfiles))
+
+    def test_priority_executor(self):
+        order = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        with build.PriorityExecutor(max_workers=1) as executor:
+            blocker = executor.submit(0, block)
+            started.wait()
+            future_list = [executor.submit(priority, order.append, priority)
+                           for priority in (1, 3, 2)]
+            cancelled = executor.submit(4, order.append, 4)
+            cancelled.cancel()
+            release.set()
+            build.wait_futures(future_list + [blocker])
+        self.assertEqual([3, 2, 1], order)
+
+    def test_priority_executor_exception(self):
+        with build.PriorityExecutor(max_workers=2) as executor:
+            future = executor.submit(0, int, 'x')
+            self.assertRaises(ValueError, future.result)
+
+
+class TestBuildCache(base.TestCase):
+    def setUp(self):
+        super(TestBuildCache, self).setUp()
+        self.src_dir = self.useFixture(fixtures.TempDir()).path
+        with open(os.path.join(self.src_dir, 'Dockerfile.j2'), 'w') as f:
+            f.write('FROM debian')
+        with open(os.path.join(self.src_dir, 'start.sh'), 'w') as f:
+            f.write('start')
+        self.config = {'render': {}, 'sources': {
+            'src': {'git_url': 'https://example.org/src.git',
+                    'git_ref': 'master'}}}
+        self.git_shas = {('https://example.org/src.git', 'master'): 'a' * 40}
+        self.dockerfile = {
+            'name': 'mysql',
+            'full_name': 'ccp/mysql:latest',
+            'path': os.path.join(self.src_dir, 'Dockerfile.j2'),
+            'parent': {'name': 'base', 'digest': 'base-digest'},
+            'children': [],
+            'match': True,
+            'content': 'FROM ccp/base',
+            'sources': {'src'},
+            'render_files': [],
+            'build_result': None,
+            'push_result': None,
+            'digest': 'digest',
+        }
+
+    def _get_digest(self):
+        return build.get_build_digest(self.dockerfile, self.config,
+                                      self.git_shas)
+
+    @mock.patch('git.cmd.Git')
+    def test_get_git_sha(self, m_git):
+        m_git.return_value.ls_remote.return_value = (
+            'b' * 40 + '\trefs/heads/master\n')
+        self.assertEqual('a' * 40, build.get_git_sha('url', 'a' * 40))
+        self.assertEqual('b' * 40, build.get_git_sha('url', 'master'))
+        m_git.return_value.ls_remote.assert_called_once_with('url', 'master')
+        m_git.return_value.ls_remote.return_value = (
+            'c' * 40 + '\trefs/heads/bugfix/master\n' +
+            'b' * 40 + '\trefs/heads/master\n')
+        self.assertEqual('b' * 40, build.get_git_sha('url', 'master'))
+        m_git.return_value.ls_remote.return_value = (
+            'c' * 40 + '\trefs/tags/1.0\n' +
+            'd' * 40 + '\trefs/tags/1.0^{}\n')
+        self.assertEqual('d' * 40, build.get_git_sha('url', '1.0'))
+        m_git.return_value.ls_remote.return_value = (
+            'c' * 40 + '\trefs/heads/bugfix/master\n')
+        self.assertIsNone(build.get_git_sha('url', 'master'))
+        m_git.return_value.ls_remote.return_value = ''
+        self.assertIsNone(build.get_git_sha('url', 'missing'))
+
+    def test_get_build_digest(self):
+        digest = self._get_digest()
+        self.assertEqual(digest, self._get_digest())
+
+        # Dockerfile itself is included as the rendered content
+        with open(self.dockerfile['path'], 'w') as f:
+            f.write('FROM ubuntu')
+        self.assertEqual(digest, self._get_digest())
+
+        with open(os.path.join(self.src_dir, 'start.sh'), 'w') as f:
+            f.write('start2')
+        changed_file = self._get_digest()
+        self.assertNotEqual(digest, changed_file)
+
+        self.git_shas[('https://example.org/src.git', 'master')] = 'c' * 40
+        changed_source = self._get_digest()
+        self.assertNotIn(changed_source, (digest, changed_file))
+
+        self.dockerfile['parent']['digest'] = 'other-digest'
+        self.assertNotIn(self._get_digest(),
+                         (digest, changed_file, changed_source))
+
+    def test_get_build_digest_unknown(self):
+        self.git_shas.clear()
+        self.assertIsNone(self._get_digest())
+        self.dockerfile['sources'] = set()
+        self.assertIsNotNone(self._get_digest())
+        self.dockerfile['parent']['digest'] = None
+        self.assertIsNone(self._get_digest())
+
+    def test_get_build_digest_base_image(self):
+        self.dockerfile['parent'] = None
+        # external base image isn't pulled yet
+        self.assertIsNone(self._get_digest())
+        base_images = {'ccp/base': 'id1'}
+        digest = build.get_build_digest(self.dockerfile, self.config,
+                                        self.git_shas, base_images)
+        self.assertIsNotNone(digest)
+        base_images['ccp/base'] = 'id2'
+        self.assertNotEqual(digest, build.get_build_digest(
+            self.dockerfile, self.config, self.git_shas, base_images))
+
+    def test_get_base_images(self):
+        dc = mock.Mock()
+        dc.inspect_image.side_effect = [
+            {'Id': 'sha256:1', 'RepoDigests': ['debian@sha256:2']},
+            docker.errors.NotFound('not found', mock.Mock())]
+        base_images = build.get_base_images(dc, ['debian', 'ubuntu'])
+        self.assertIn('sha256:1', base_images['debian'])
+        self.assertIn('debian@sha256:2', base_images['debian'])
+        self.assertIsNone(base_images['ubuntu'])
+
+    @mock.patch('fuel_ccp.build.get_docker_client')
+    def test_set_build_digests(self, m_client):
+        dc = m_client.return_value.__enter__.return_value
+        dc.inspect_image.return_value = {'Id': 'sha256:1'}
+        parent = dict(self.dockerfile, name='base', parent=None,
+                      full_name='ccp/base:latest',
+                      children=[self.dockerfile], match=True,
+                      sources=set())
+        self.dockerfile['parent'] = parent
+        unrelated = dict(parent, name='other', children=[], digest=None,
+                         match=False)
+        dockerfiles = {'base': parent, 'mysql': self.dockerfile,
+                       'other': unrelated}
+        with mock.patch('fuel_ccp.build.get_git_sha',
+                        return_value='a' * 40) as m_get_git_sha:
+            build.set_build_digests(dockerfiles, self.config)
+        m_get_git_sha.assert_called_once_with('https://example.org/src.git',
+                                              'master')
+        dc.inspect_image.assert_called_once_with('ccp/base')
+        self.assertIsNotNone(parent['digest'])
+        self.assertEqual(self._get_digest(), self.dockerfile['digest'])
+        self.assertIsNone(unrelated['digest'])
+
+    @mock.patch('fuel_ccp.build.get_git_sha', return_value='a' * 40)
+    @mock.patch('fuel_ccp.build.get_docker_client')
+    def test_set_build_digests_parent_not_built(self, m_client, m_sha):
+        dc = m_client.return_value.__enter__.return_value
+        labels = {}
+        dc.inspect_image.side_effect = lambda name: {
+            'Id': name, 'Config': {'Labels': labels.get(name)}}
+        parent = dict(self.dockerfile, name='base', parent=None,
+                      full_name='ccp/base:latest',
+                      children=[self.dockerfile], match=False,
+                      sources=set())
+        self.dockerfile['parent'] = parent
+        child = dict(self.dockerfile, name='mysql-child',
+                     parent=self.dockerfile,
+                     full_name='ccp/mysql-child:latest', match=False,
+                     children=[])
+        self.dockerfile['children'] = [child]
+        dockerfiles = {'base': parent, 'mysql': self.dockerfile,
+                       'mysql-child': child}
+
+        # local copy of the parent doesn't have a digest
+        build.set_build_digests(dockerfiles, self.config)
+        self.assertIsNone(parent['digest'])
+        self.assertIsNone(self.dockerfile['digest'])
+
+        # children are built on the local copy of the parent
+        labels['ccp/base:latest'] = {build.DIGEST_LABEL: 'local-digest'}
+        labels['ccp/mysql-child:latest'] = {build.DIGEST_LABEL: 'child'}
+        build.set_build_digests(dockerfiles, self.config)
+        self.assertEqual('local-digest', parent['digest'])
+        self.assertEqual(self._get_digest(), self.dockerfile['digest'])
+        self.assertEqual('child', child['digest'])
+
+        # ready children are rebuilt to keep the tree consistent
+        self.conf.builder._merge({'keep_image_tree_consistency': True})
+        build.set_build_digests(dockerfiles, self.config, ['mysql-child'])
+        self.assertNotIn(child['digest'], (None, 'child'))
+
+    def _check_build_cache(self, labels=None, pushed_digest=None):
+        self.conf.builder._merge({'push': True})
+        self.conf.registry._merge({'address': 'registry:5000'})
+        if pushed_digest:
+            build.cache.set('images', build._get_index_key(self.dockerfile),
+                            {'digest': pushed_digest,
+                             'registry': 'registry:5000'})
+        dc = mock.Mock()
+        if labels is None:
+            dc.inspect_image.side_effect = docker.errors.NotFound(
+                'not found', mock.Mock())
+        else:
+            dc.inspect_image.return_value = {'Config': {'Labels': labels}}
+        return build.check_build_cache(dc, self.dockerfile)
+
+    def test_check_build_cache(self):
+        self.assertEqual((False, False), self._check_build_cache())
+        self.assertEqual((True, False), self._check_build_cache(
+            labels={build.DIGEST_LABEL: 'digest'}))
+        self.assertEqual((False, False), self._check_build_cache(
+            labels={build.DIGEST_LABEL: 'old'}, pushed_digest='digest'))
+        self.assertEqual((True, True), self._check_build_cache(
+            pushed_digest='digest'))
+        self.assertEqual((False, False), self._check_build_cache(
+            pushed_digest='old'))
+
+    def test_check_build_cache_disabled(self):
+        self.conf.builder._merge({'skip_unchanged': False})
+        self.assertEqual((False, False), self._check_build_cache(
+            labels={build.DIGEST_LABEL: 'digest'}, pushed_digest='digest'))
+
+    def test_check_build_cache_no_cache(self):
+        self.conf.builder._merge({'no_cache': True})
+        self.assertEqual((False, False), self._check_build_cache(
+            labels={build.DIGEST_LABEL: 'digest'}, pushed_digest='digest'))
+
+    @mock.patch('fuel_ccp.build.push_dockerfile')
+    @mock.patch('fuel_ccp.build.build_dockerfile')
+    @mock.patch('fuel_ccp.build.get_build_context')
+    @mock.patch('fuel_ccp.build.check_build_cache')
+    @mock.patch('docker.Client')
+    def test_process_dockerfile_up_to_date(self, m_client, m_check, m_render,
+                                           m_build, m_push):
+        self.conf.builder._merge({'push': True})
+        self.conf.registry._merge({'address': 'registry:5000'})
+        m_check.return_value = (True, False)
+
+        def push(dc, dockerfile, auth_config):
+            dockerfile['push_result'] = 'Success'
+        m_push.side_effect = push
+
+        future_list = []
+        with build.Pusher(max_workers=1) as pusher:
+            build.process_dockerfile(self.dockerfile, mock.ANY, mock.ANY,
+                                     mock.ANY, future_list, [], pusher)
+            build.wait_futures(future_list)
+        self.assertFalse(m_render.called)
+        self.assertFalse(m_build.called)
+        self.assertTrue(m_push.called)
+        self.assertEqual('Skipped', self.dockerfile['build_result'])
+        self.assertEqual(
+            {'digest': 'digest', 'registry': 'registry:5000'},
+            build.cache.get('images', build._get_index_key(self.dockerfile)))
+
+        m_check.return_value = (True, True)
+        m_push.reset_mock()
+        build.process_dockerfile(self.dockerfile, mock.ANY, mock.ANY,
+                                 mock.ANY, mock.ANY, [])
+        self.assertFalse(m_push.called)
+        self.assertEqual('Exists', self.dockerfile['push_result'])
+
+
+class TestPusher(base.TestCase):
+    def setUp(self):
+        super(TestPusher, self).setUp()
+        self.conf.builder._merge({'push': True})
+        self.conf.registry._merge({'address': 'registry:5000',
+                                   'username': 'user',
+                                   'password': 'pass'})
+        self.m_client = self.useFixture(fixtures.MockPatch(
+            'docker.Client')).mock
+        self.m_client.return_value.push.return_value = [
+            b'{"status": "Pushed"}']
+
+    def _dockerfile(self, name, build_result='Success'):
+        return {'name': name, 'full_name': 'registry:5000/ccp/' + name,
+                'build_result': build_result, 'push_result': None}
+
+    def test_push(self):
+        dockerfiles = [self._dockerfile('mysql'), self._dockerfile('nova')]
+        future_list = []
+        with build.Pusher(max_workers=2) as pusher:
+            for dockerfile in dockerfiles:
+                pusher.submit(dockerfile, future_list)
+            build.wait_futures(future_list)
+        dc = self.m_client.return_value
+        dc.login.assert_called_once_with(
+            username='user', password='pass', registry='registry:5000')
+        auth_config = {'username': 'user', 'password': 'pass',
+                       'serveraddress': 'registry:5000'}
+        self.assertEqual([
+            mock.call('registry:5000/ccp/mysql', stream=True,
+                      insecure_registry=False, auth_config=auth_config),
+            mock.call('registry:5000/ccp/nova', stream=True,
+                      insecure_registry=False, auth_config=auth_config),
+        ], sorted(dc.push.call_args_list))
+        self.assertEqual(['Success', 'Success'],
+                         [d['push_result'] for d in dockerfiles])
+
+        m_log = self.useFixture(fixtures.MockPatch('fuel_ccp.build.LOG')).mock
+        pusher.report()
+        self.assertEqual(2, m_log.info.call_args[0][1])
+
+    def test_push_without_credentials(self):
+        self.conf.registry._merge({'username': '', 'password': ''})
+        dockerfile = self._dockerfile('mysql')
+        future_list = []
+        with build.Pusher(max_workers=1) as pusher:
+            pusher.submit(dockerfile, future_list)
+            build.wait_futures(future_list)
+        dc = self.m_client.return_value
+        self.assertFalse(dc.login.called)
+        dc.push.assert_called_once_with(
+            'registry:5000/ccp/mysql', stream=True, insecure_registry=False,
+            auth_config=None)
+
+    @mock.patch('fuel_ccp.build.check_build_cache',
+                return_value=(False, False))
+    @mock.patch('fuel_ccp.build.get_build_context')
+    @mock.patch('fuel_ccp.build.build_dockerfile')
+    def test_process_dockerfile_push(self, m_build, m_context, m_check):
+        dockerfile = self._dockerfile('mysql', build_result=None)
+        dockerfile['children'] = []
+
+        def build_dockerfile(dc, dockerfile, context):
+            dockerfile['build_result'] = 'Failure'
+        m_build.side_effect = build_dockerfile
+        pusher = mock.Mock()
+        build.process_dockerfile(dockerfile, mock.ANY, mock.ANY, mock.ANY,
+                                 [], [], pusher)
+        self.assertFalse(pusher.submit.called)
+        self.assertEqual('Failure', dockerfile['push_result'])
+
+        m_build.side_effect = None
+        dockerfile['build_result'] = 'Success'
+        future_list = []
+        build.process_dockerfile(dockerfile, mock.ANY, mock.ANY, mock.ANY,
+                                 future_list, [], pusher)
+        pusher.submit.assert_called_once_with(dockerfile, future_list)
+
+    @mock.patch('fuel_ccp.build.check_build_cache',
+                return_value=(False, False))
+    @mock.patch('fuel_ccp.build.get_build_context')
+    @mock.patch('fuel_ccp.build.build_dockerfile')
+    def test_process_dockerfile_push_inline(self, m_build, m_context,
+                                            m_check):
+        dockerfile = self._dockerfile('mysql')
+        dockerfile['children'] = []
+        build.process_dockerfile(dockerfile, mock.ANY, mock.ANY, mock.ANY,
+                                 [], [])
+        dc = self.m_client.return_value
+        dc.login.assert_called_once_with(
+            username='user', password='pass', registry='registry:5000')
+        dc.push.assert_called_once_with(
+            'registry:5000/ccp/mysql', stream=True, insecure_registry=False,
+            auth_config={'username': 'user', 'password': 'pass',
+                         'serveraddress': 'registry:5000'})
+        self.assertEqual('Success', dockerfile['push_result'])
+
+    def test_login_per_registry(self):
+        pusher = build.Pusher(max_workers=1)
+        self.addCleanup(pusher.shutdown)
+        dc = mock.Mock()
+        other_registry_dc = mock.Mock()
+
+        def login(**kwargs):
+            # login into another registry isn't blocked by this one
+            self.assertIsNotNone(pusher._get_auth_config(
+                other_registry_dc, 'other:5000'))
+        dc.login.side_effect = login
+        self.assertEqual('registry:5000', pusher._get_auth_config(
+            dc, 'registry:5000')['serveraddress'])
+        self.assertEqual('registry:5000', pusher._get_auth_config(
+            dc, 'registry:5000')['serveraddress'])
+        dc.login.assert_called_once_with(
+            username='user', password='pass', registry='registry:5000')
+        other_registry_dc.login.assert_called_once_with(
+            username='user', password='pass', registry='other:5000')
+
+
 class TestRenderDockerfile(testscenarios.WithScenarios, base.TestCase):
     scenarios = [
         ('empty', {
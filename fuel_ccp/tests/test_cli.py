@@ -116,6 +116,10 @@ class TestDeploy(TestParser):
             'add_argv': ['--dry-run', '--export-dir', 'test'],
             'action_vals': {'dry_run': True, 'export_dir': 'test'}
         }),
+        ('incremental', {
+            'add_argv': ['--incremental'],
+            'action_vals': {'dry_run': False, 'incremental': True}
+        }),
     ])
 
     add_argv = None
@@ -133,7 +137,7 @@ class TestDeploy(TestParser):
             return_value={}))
         self.useFixture(fixtures.MockPatch(
             'fuel_ccp.validation.service.validate_service_versions'))
-        self.argv += self.add_argv
+        self.argv = self.argv + self.add_argv
         self._run_app()
         if self.components is None:
             components = None
@@ -1,7 +1,10 @@
+import copy
 import fixtures
 import io
 import mock
+import pickle
 import six
+import sys
 import testscenarios
 
 from fuel_ccp.config import _yaml
@@ -131,9 +134,123 @@ class TestLoadDump(testscenarios.WithScenarios, base.TestCase):
         _yaml.dump(obj, stream)
         self.assertEqual(self.yaml, stream.getvalue())
 
+    def test_dump_to_string(self):
+        obj = _yaml.AttrDict()
+        obj._merge(self.parsed)
+        self.assertEqual(self.yaml, _yaml.dump(obj))
+
+    def test_safe_load(self):
+        res = _yaml.safe_load(self.yaml)
+        self.assertIsInstance(res, dict)
+        self.assertEqual(self.parsed, res)
+
 
 class TestAttrDict(base.TestCase):
     def test_json(self):
         source = _yaml.AttrDict({'a': 1, 'b': _yaml.AttrDict({'c': 2})})
         res = source._json(sort_keys=True)
         self.assertEqual(res, '{"a": 1, "b": {"c": 2}}')
+
+    def test_merge(self):
+        res = _yaml.AttrDict({'a': 1, 'b': _yaml.AttrDict({'c': 2})})
+        res._merge({'b': {'d': {'e': 3}}, 'f': [4]})
+        self.assertEqual({'a': 1, 'b': {'c': 2, 'd': {'e': 3}}, 'f': [4]},
+                         res)
+        self.assertIsInstance(res.b.d, _yaml.AttrDict)
+
+    def test_merge_deeply_nested(self):
+        other = leaf = {}
+        for i in range(sys.getrecursionlimit() * 2):
+            leaf['a'] = {}
+            leaf = leaf['a']
+        leaf['b'] = 1
+        res = _yaml.AttrDict()
+        res._merge(other)
+        res._merge(other)
+        obj = res
+        while 'a' in obj:
+            obj = obj.a
+        self.assertEqual(1, obj.b)
+
+    def test_setattr(self):
+        obj = _yaml.AttrDict()
+        obj.a = 1
+        self.assertEqual({'a': 1}, obj)
+        self.assertRaises(AttributeError, getattr, obj, 'b')
+
+    def test_pickle(self):
+        obj = _yaml.AttrDict({'a': 1, 'b': _yaml.AttrDict({'c': 2})})
+        res = pickle.loads(pickle.dumps(obj))
+        self.assertEqual(obj, res)
+        self.assertIsInstance(res.b, _yaml.AttrDict)
+        self.assertEqual(obj, copy.deepcopy(obj))
+
+    def test_unwrap(self):
+        obj = _yaml.AttrDict({'a': [_yaml.AttrDict({'b': 1})]})
+        res = _yaml.unwrap(obj)
+        self.assertIs(dict, type(res))
+        self.assertIs(dict, type(res['a'][0]))
+        self.assertEqual({'a': [{'b': 1}]}, res)
+
+
+class TestLayeredAttrDict(base.TestCase):
+    def setUp(self):
+        super(TestLayeredAttrDict, self).setUp()
+        self.base = _yaml.AttrDict()
+        self.base._merge({'a': 1, 'b': {'c': 2, 'd': {'e': 3}}, 'f': {'g': 4}})
+        self.override = _yaml.AttrDict()
+        self.override._merge({'a': 6, 'b': {'d': {'h': 5}}})
+
+    def _get_merged(self):
+        merged = copy.deepcopy(self.base)
+        merged._merge(copy.deepcopy(self.override))
+        return merged
+
+    def test_lookup(self):
+        view = _yaml.LayeredAttrDict(self.base, self.override)
+        self.assertEqual(6, view.a)
+        self.assertEqual(2, view.b.c)
+        self.assertEqual(3, view['b']['d']['e'])
+        self.assertEqual(5, view.b.d.h)
+        self.assertEqual(4, view.f.g)
+        self.assertIsNone(view.get('x'))
+        self.assertRaises(AttributeError, getattr, view, 'x')
+        self.assertEqual(['a', 'b', 'f'], sorted(view))
+        self.assertEqual(self._get_merged(), view)
+        self.assertEqual(self._get_merged()._json(sort_keys=True),
+                         view._json(sort_keys=True))
+
+    def test_merge(self):
+        view = _yaml.LayeredAttrDict(self.base)
+        view._merge(self.override)
+        view._merge({'b': {'c': 7}})
+        expected = self._get_merged()
+        expected._merge({'b': {'c': 7}})
+        self.assertEqual(expected, view)
+
+    def test_layers_not_changed(self):
+        view = _yaml.LayeredAttrDict(self.base, self.override)
+        view['a'] = 10
+        view.b.d['e'] = 11
+        view.b._merge({'i': 12})
+        view._merge({'j': 13})
+        self.assertEqual(10, view.a)
+        self.assertEqual(11, view.b.d.e)
+        self.assertEqual(12, view.b.i)
+        self.assertEqual(13, view.j)
+        self.assertEqual(1, self.base.a)
+        self.assertEqual(3, self.base.b.d.e)
+        self.assertNotIn('i', self.base.b)
+        self.assertNotIn('j', self.base)
+        self.assertEqual(['h'], list(self.override.b.d))
+
+    def test_deepcopy(self):
+        view = _yaml.LayeredAttrDict(self.base, self.override)
+        res = copy.deepcopy(view)
+        self.assertIs(_yaml.AttrDict, type(res))
+        self.assertIs(_yaml.AttrDict, type(res.b))
+        self.assertEqual(self._get_merged(), res)
+
+    def test_dump(self):
+        view = _yaml.LayeredAttrDict(self.base, self.override)
+        self.assertEqual(_yaml.dump(self._get_merged()), _yaml.dump(view))
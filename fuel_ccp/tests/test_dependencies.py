@@ -0,0 +1,41 @@
+from fuel_ccp import dependencies
+from fuel_ccp.tests import base
+
+
+def _component(*deps):
+    return {'service_content': {'service': {'containers': [{
+        'daemon': {'dependencies': list(deps)},
+    }]}}}
+
+
+class TestDependencies(base.TestCase):
+    def setUp(self):
+        super(TestDependencies, self).setUp()
+        self.components_map = {
+            'etcd': _component(),
+            'mysql': _component(),
+            'keystone': _component('mysql', 'etcd'),
+            'nova-api': _component('keystone', 'mysql/db-create'),
+            'horizon': _component('keystone', 'memcached'),
+        }
+
+    def test_get_deploy_waves(self):
+        self.assertEqual(
+            [['etcd', 'mysql'], ['keystone'], ['horizon', 'nova-api']],
+            dependencies.get_deploy_waves(set(self.components_map),
+                                          self.components_map))
+
+    def test_get_deploy_waves_subset(self):
+        # dependencies that are not deployed are ignored
+        self.assertEqual(
+            [['keystone'], ['nova-api']],
+            dependencies.get_deploy_waves({'keystone', 'nova-api'},
+                                          self.components_map))
+
+    def test_get_deploy_waves_circular(self):
+        self.components_map['mysql'] = _component('nova-api')
+        self.assertEqual(
+            [['etcd'], ['keystone', 'mysql', 'nova-api']],
+            dependencies.get_deploy_waves(
+                {'etcd', 'mysql', 'keystone', 'nova-api'},
+                self.components_map))
@@ -1,12 +1,15 @@
 import filecmp
 import os
+import re
 
 import fixtures
 import mock
+import testscenarios
 import yaml
 
 from fuel_ccp.config import _yaml
 from fuel_ccp import deploy
+from fuel_ccp import informer
 from fuel_ccp.tests import base
 from fuel_ccp.validation import deploy as deploy_validation
 
@@ -161,16 +164,42 @@ class TestDeploy(base.TestCase):
         self.assertEqual('222', deploy._get_configmaps_version(
             cm_list, mock.ANY, mock.ANY))
 
+    def _write_template(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
     def test_get_service_files_hash(self):
-        files = {
-            'file': {'content': '/tmp/file'}
-        }
-        self.useFixture(fixtures.MockPatch(
-            "fuel_ccp.common.jinja_utils.jinja_render",
-            return_value='rendered'))
-        expected_hash = '86e85bd63aef5a740d4b7b887ade37ec9017c961'
-        self.assertEqual(
-            expected_hash, deploy._get_service_files_hash(files, {}))
+        tmp_dir = self.useFixture(fixtures.TempDir()).path
+        path = self._write_template(
+            tmp_dir, 'file', '{% include "inc" %}{{ keystone.port }}')
+        inc_path = self._write_template(tmp_dir, 'inc', '{{ debug }}')
+        files = {'file': {'content': path}}
+        configs = _yaml.AttrDict()
+        configs._merge({'keystone': {'port': 5000}, 'debug': False,
+                        'mysql': {'port': 3306}})
+        m_render = self.useFixture(fixtures.MockPatch(
+            "fuel_ccp.common.jinja_utils.jinja_render")).mock
+
+        files_hash = deploy._get_service_files_hash(files, configs)
+        # configs not referenced by the templates don't change the hash
+        configs._merge({'mysql': {'port': 3307}})
+        self.assertEqual(files_hash,
+                         deploy._get_service_files_hash(files, configs))
+        configs._merge({'keystone': {'port': 5001}})
+        new_hash = deploy._get_service_files_hash(files, configs)
+        self.assertNotEqual(files_hash, new_hash)
+        configs._merge({'debug': True})
+        self.assertNotEqual(new_hash,
+                            deploy._get_service_files_hash(files, configs))
+        # templates aren't rendered
+        self.assertFalse(m_render.called)
+
+        self._write_template(tmp_dir, 'inc', '{{ debug }} ')
+        os.utime(inc_path, (0, 0))
+        self.assertNotIn(deploy._get_service_files_hash(files, configs),
+                         (files_hash, new_hash))
 
 
 class TestDeployProcessPorts(base.TestCase):
@@ -554,3 +583,212 @@ class TestDeployMakeTopology(base.TestCase):
 
         self.assertRaises(RuntimeError,
                           deploy._make_topology, nodes, self._roles, replicas)
+
+
+class TestGetLiteralPrefix(testscenarios.WithScenarios, base.TestCase):
+    scenarios = [
+        ('literal', {'pattern': 'node1', 'expected': 'node1'}),
+        ('class', {'pattern': 'node[1-3]$', 'expected': 'node'}),
+        ('group', {'pattern': 'node([4-9]|10)$', 'expected': 'node'}),
+        ('optional', {'pattern': 'nodes?1', 'expected': 'node'}),
+        ('repeated', {'pattern': 'node+1', 'expected': 'node'}),
+        ('alternatives', {'pattern': 'node1|compute', 'expected': ''}),
+        ('escaped_bar', {'pattern': r'node\|1', 'expected': 'node'}),
+        ('bar_in_class', {'pattern': 'node[|]1', 'expected': 'node'}),
+        ('any', {'pattern': '.*', 'expected': ''}),
+    ]
+
+    def test_get_literal_prefix(self):
+        self.assertEqual(self.expected,
+                         deploy._get_literal_prefix(self.pattern))
+
+
+class TestMatchNodes(base.TestCase):
+    def test_match_nodes(self):
+        patterns = ['node[1-3]$', 'node([4-9]|10|11|12)$', 'node1', '.*',
+                    'rack1-node\\d+', 'node1|rack2', 'compute']
+        node_names = ['node%d' % i for i in range(1, 20)] + [
+            'rack%d-node%d' % (i % 3, i) for i in range(20)]
+        expected = {
+            pattern: {name for name in node_names
+                      if re.match(pattern, name)}
+            for pattern in patterns}
+        self.assertEqual(expected, deploy._match_nodes(patterns, node_names))
+
+
+class TestDeployApplyObjects(base.TestCase):
+    def setUp(self):
+        super(TestDeployApplyObjects, self).setUp()
+        self.conf.action.dry_run = False
+        self.applied = []
+        self.useFixture(fixtures.MockPatch(
+            "fuel_ccp.kubernetes.process_object",
+            side_effect=lambda obj, **kwargs: self.applied.append(
+                obj['kind'])))
+
+    def test_apply_objects_stages(self):
+        self.conf.kubernetes.apply_concurrency = 4
+        objects = [
+            {'kind': 'Deployment'},
+            {'kind': 'Service'},
+            {'kind': 'Secret'},
+            {'kind': 'Job'},
+            {'kind': 'ConfigMap'},
+        ]
+        deploy.apply_objects(objects)
+        self.assertEqual(5, len(self.applied))
+        self.assertEqual({'ConfigMap', 'Secret'}, set(self.applied[:2]))
+        self.assertEqual({'Deployment', 'Service', 'Job'},
+                         set(self.applied[2:]))
+
+    def test_process_object_uses_informers(self):
+        with mock.patch('fuel_ccp.kubernetes.process_object') as m_process:
+            deploy._process_object({'kind': 'ConfigMap'})
+        m_process.assert_called_once_with(
+            {'kind': 'ConfigMap'}, get_live_object=informer.get_object)
+
+    def test_apply_objects_dry_run_order(self):
+        self.conf.action.dry_run = True
+        objects = [{'kind': 'Secret'}, {'kind': 'Deployment'},
+                   {'kind': 'Service'}, {'kind': 'ConfigMap'}]
+        deploy.apply_objects(objects)
+        self.assertEqual(['Secret', 'ConfigMap', 'Deployment', 'Service'],
+                         self.applied)
+
+
+class TestDeployIncremental(base.TestCase):
+    def setUp(self):
+        super(TestDeployIncremental, self).setUp()
+        self.service_dir = self.useFixture(fixtures.TempDir()).path
+        os.mkdir(os.path.join(self.service_dir, "files"))
+        with open(os.path.join(self.service_dir, "files", "conf.j2"),
+                  "w") as f:
+            f.write("{{ foo.bar }}")
+        self.conf.configs._merge({"foo": {"bar": 1}, "baz": 2})
+        self.component = {
+            "service_dir": self.service_dir,
+            "service_content": {
+                "service": {
+                    "name": "test",
+                    "containers": [{"name": "test", "image": "test"}],
+                },
+                "files": {"conf": {"path": "/etc/conf",
+                                   "content": "conf.j2"}},
+            },
+        }
+        self.topology = {"test": ["node1"], deploy.JOBS_ROLE: ["node1"]}
+
+    def _get_digest(self):
+        return deploy.get_service_digest(self.component, self.topology, ())
+
+    def test_digest_stable(self):
+        self.assertEqual(self._get_digest(), self._get_digest())
+
+    def test_digest_ignores_unreferenced_configs(self):
+        digest = self._get_digest()
+        self.conf.configs._merge({"baz": 3})
+        self.assertEqual(digest, self._get_digest())
+
+    def test_digest_changes(self):
+        digest = self._get_digest()
+        self.conf.configs._merge({"foo": {"bar": 2}})
+        new_digest = self._get_digest()
+        self.assertNotEqual(digest, new_digest)
+
+        self.topology["test"].append("node2")
+        self.assertNotEqual(new_digest, self._get_digest())
+
+
+class TestDeployWaves(base.TestCase):
+    def setUp(self):
+        super(TestDeployWaves, self).setUp()
+        self.components_map = {
+            name: {'component_name': name,
+                   'component': {'upgrades': {}},
+                   'service_content': {'service': {'containers': [{
+                       'daemon': {'dependencies': deps}}]}}}
+            for name, deps in [('mysql', []), ('etcd', []),
+                               ('keystone', ['mysql'])]}
+        self.m_parse = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.deploy._parse_services',
+            side_effect=lambda wave, *args: [
+                (name, [{'kind': 'Deployment', 'name': name}])
+                for name in wave])).mock
+        self.m_apply = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.deploy.apply_objects',
+            side_effect=lambda objects: [self._applied(obj)
+                                         for obj in objects])).mock
+        self.m_wait = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.status.wait_for_ready')).mock
+
+    def _applied(self, object_dict):
+        if self.conf.action.dry_run:
+            return None
+        obj = mock.Mock(kind=object_dict['kind'],
+                        obj={'metadata': {'generation': 2}})
+        obj.name = object_dict['name']
+        return obj
+
+    def test_deploy_waves(self):
+        self.assertEqual({}, deploy._deploy_waves(
+            set(self.components_map), self.components_map, {}, ()))
+        self.assertEqual([['etcd', 'mysql'], ['keystone']],
+                         [c[0][0] for c in self.m_parse.call_args_list])
+        self.assertEqual(
+            [[{'kind': 'Deployment', 'name': 'etcd'},
+              {'kind': 'Deployment', 'name': 'mysql'}],
+             [{'kind': 'Deployment', 'name': 'keystone'}]],
+            [c[0][0] for c in self.m_apply.call_args_list])
+        self.assertFalse(self.m_wait.called)
+
+    def test_deploy_waves_wait_ready(self):
+        self.conf.kubernetes._merge({'wave_ready_timeout': 60})
+        deploy._deploy_waves(set(self.components_map), self.components_map,
+                             {}, ())
+        self.m_wait.assert_called_once_with(
+            ['etcd', 'mysql'], 60,
+            {('Deployment', 'etcd'): 2, ('Deployment', 'mysql'): 2})
+
+        self.m_wait.reset_mock()
+        self.conf.action._merge({'dry_run': True})
+        deploy._deploy_waves(set(self.components_map), self.components_map,
+                             {}, ())
+        self.assertFalse(self.m_wait.called)
+
+    @mock.patch('fuel_ccp.informer.sync_informers')
+    def test_deploy_waves_prefetch_workloads(self, m_sync):
+        deploy._deploy_waves(set(self.components_map), self.components_map,
+                             {}, ())
+        self.assertFalse(m_sync.called)
+        self.components_map['mysql']['component']['upgrades'] = {
+            'default': {}}
+        with mock.patch('fuel_ccp.deploy.check_images_change',
+                        return_value=False):
+            deploy._deploy_waves(set(self.components_map),
+                                 self.components_map, {}, ())
+        m_sync.assert_called_once_with(('Deployment', 'StatefulSet'))
+
+
+class TestCheckImagesChange(base.TestCase):
+    def _workload(self, kind, name, image):
+        return {'kind': kind, 'metadata': {'name': name},
+                'spec': {'template': {'spec': {'containers': [
+                    {'image': image}]}}}}
+
+    @mock.patch('fuel_ccp.informer.get_object')
+    def test_check_images_change(self, m_get_object):
+        live = {('StatefulSet', 'galera'): self._workload(
+            'StatefulSet', 'galera', 'galera:1')}
+        m_get_object.side_effect = lambda kind, name: (
+            mock.Mock(obj=live[(kind, name)]) if (kind, name) in live
+            else None)
+        objects = [self._workload('Deployment', 'new', 'new:1'),
+                   self._workload('StatefulSet', 'galera', 'galera:1'),
+                   {'kind': 'Service', 'metadata': {'name': 'galera'}}]
+        self.assertFalse(deploy.check_images_change(objects))
+        objects[1] = self._workload('StatefulSet', 'galera', 'galera:2')
+        self.assertEqual(('galera:1', 'galera:2'),
+                         deploy.check_images_change(objects))
+        self.assertEqual(
+            {('Deployment', 'new'), ('StatefulSet', 'galera')},
+            {c[0] for c in m_get_object.call_args_list})
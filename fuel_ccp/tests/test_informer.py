@@ -0,0 +1,145 @@
+import fixtures
+import mock
+import testscenarios
+
+from fuel_ccp import informer
+from fuel_ccp.tests import base
+
+
+class TestParseSelector(testscenarios.WithScenarios, base.TestCase):
+    scenarios = [
+        ('empty', {'selector': None, 'expected': []}),
+        ('equality', {
+            'selector': 'ccp=true,app==keystone',
+            'expected': [('ccp', 'in', ('true',)),
+                         ('app', 'in', ('keystone',))]}),
+        ('inequality', {
+            'selector': 'app != keystone',
+            'expected': [('app', 'notin', ('keystone',))]}),
+        ('set', {
+            'selector': 'ccp=true,app in (keystone, mysql),job notin (a)',
+            'expected': [('ccp', 'in', ('true',)),
+                         ('app', 'in', ('keystone', 'mysql')),
+                         ('job', 'notin', ('a',))]}),
+        ('exists', {
+            'selector': 'ccp-action,!job-name',
+            'expected': [('ccp-action', 'exists', ()),
+                         ('job-name', '!exists', ())]}),
+    ]
+
+    def test_parse_selector(self):
+        self.assertEqual(self.expected,
+                         informer.parse_selector(self.selector))
+
+
+class TestMatchLabels(testscenarios.WithScenarios, base.TestCase):
+    labels = {'ccp': 'true', 'app': 'keystone'}
+    scenarios = [
+        ('all', {'selector': None, 'expected': True}),
+        ('equal', {'selector': 'ccp=true,app=keystone', 'expected': True}),
+        ('not_equal', {'selector': 'app=mysql', 'expected': False}),
+        ('in', {'selector': 'app in (mysql,keystone)', 'expected': True}),
+        ('notin', {'selector': 'app notin (keystone)', 'expected': False}),
+        ('notin_missing', {'selector': 'job notin (a)', 'expected': True}),
+        ('inequality_missing', {'selector': 'job!=a', 'expected': True}),
+        ('exists', {'selector': 'app', 'expected': True}),
+        ('not_exists', {'selector': '!app', 'expected': False}),
+    ]
+
+    def test_match_labels(self):
+        self.assertEqual(self.expected, informer.match_labels(
+            self.labels, informer.parse_selector(self.selector)))
+
+
+class TestInformer(base.TestCase):
+    def setUp(self):
+        super(TestInformer, self).setUp()
+        self.useFixture(fixtures.MockPatchObject(informer, '_INFORMERS', {}))
+        self.query = mock.MagicMock()
+        self.query.response = {'metadata': {'resourceVersion': '1'}}
+        self.query.__iter__.side_effect = lambda: iter([
+            self._get_obj('mysql', {'ccp': 'true', 'app': 'mysql'}),
+            self._get_obj('keystone', {'ccp': 'true', 'app': 'keystone'}),
+        ])
+        self.informer = informer.Informer('Deployment', client=mock.Mock(),
+                                          watch=False)
+        self.useFixture(fixtures.MockPatchObject(
+            self.informer, '_query', return_value=self.query))
+
+    def _get_obj(self, name, labels=None, version='1'):
+        obj = mock.Mock()
+        obj.name = name
+        obj.labels = labels or {}
+        obj.obj = {'metadata': {'name': name, 'resourceVersion': version}}
+        return obj
+
+    def test_list(self):
+        self.assertEqual(
+            ['keystone', 'mysql'],
+            [obj.name for obj in self.informer.list('ccp=true')])
+        self.assertEqual(
+            ['mysql'],
+            [obj.name for obj in self.informer.list('app in (mysql)')])
+        self.assertEqual('keystone',
+                         self.informer.get_by_name('keystone').name)
+        self.assertIsNone(self.informer.get_by_name('nova'))
+        # objects are listed only once
+        self.informer._query.assert_called_once_with()
+
+    def test_handle_event(self):
+        self.informer.sync()
+        self.informer.handle_event(
+            'ADDED', self._get_obj('nova', {'app': 'nova'}, version='2'))
+        self.informer.handle_event('DELETED', self._get_obj('mysql',
+                                                            version='3'))
+        self.assertEqual(['keystone', 'nova'],
+                         [obj.name for obj in self.informer.list()])
+        self.assertEqual('3', self.informer._resource_version)
+
+    def test_follow_watch(self):
+        self.informer.sync()
+        event = mock.Mock(type='MODIFIED',
+                          object=self._get_obj('mysql', version='2'))
+        self.query.watch.return_value = [event]
+        self.informer._follow()
+        self.query.watch.assert_called_once_with(since='1')
+        self.assertEqual({}, self.informer.get_by_name('mysql').labels)
+
+    def test_follow_watch_expired(self):
+        self.informer.sync()
+        self.query.watch.return_value = [mock.Mock(type='ERROR')]
+        self.informer._follow()
+        # objects are listed again
+        self.assertEqual(2, self.query.__iter__.call_count)
+
+    @mock.patch('fuel_ccp.informer.Informer')
+    def test_get_informer(self, m_informer):
+        self.assertIs(informer.get_informer('Pod'),
+                      informer.get_informer('Pod'))
+        informer.get_informer('Ingress')
+        self.assertEqual([mock.call('Pod', 'ccp', 'ccp=true'),
+                          mock.call('Ingress', 'ccp', None)],
+                         m_informer.call_args_list)
+
+    @mock.patch('fuel_ccp.informer.get_informer')
+    def test_sync_informers(self, m_get_informer):
+        informer.sync_informers(('Pod', 'Job'))
+        self.assertEqual([mock.call('Pod'), mock.call('Job')],
+                         m_get_informer.call_args_list)
+        self.assertEqual(2, m_get_informer.return_value.sync.call_count)
+
+    @mock.patch('threading.Thread')
+    def test_watch_started_on_wait(self, m_thread):
+        inf = informer.Informer('Pod', client=mock.Mock())
+        informer._INFORMERS[('Pod', None)] = inf
+        self.useFixture(fixtures.MockPatchObject(
+            inf, '_query', return_value=self.query))
+        inf.sync()
+        # one-shot calls only list objects
+        self.assertFalse(m_thread.called)
+        informer.wait_for_changes(informer.get_generation(), timeout=0)
+        m_thread.assert_called_once_with(target=inf._watch)
+        m_thread.return_value.start.assert_called_once_with()
+        # watch is started only once
+        informer.wait_for_changes(informer.get_generation(), timeout=0)
+        self.assertEqual(1, m_thread.call_count)
@@ -34,6 +34,10 @@ class TestKubernetesClient(base.TestCase):
         'current-context': 'ccp'
     }
 
+    def setUp(self):
+        super(TestKubernetesClient, self).setUp()
+        self.useFixture(fixtures.MockPatchObject(kubernetes, '_CLIENTS', {}))
+
     @mock.patch('pykube.KubeConfig')
     @mock.patch('pykube.HTTPClient')
     def test_get_client_with_conf(self, m_client, m_config):
@@ -47,7 +51,7 @@ class TestKubernetesClient(base.TestCase):
 
         kubernetes.get_client()
         m_config.assert_called_once_with(self.config)
-        m_client.assrt_called_once_with(m_config)
+        m_client.assert_called_once_with(m_config.return_value)
 
     @mock.patch('pykube.KubeConfig')
     @mock.patch('pykube.HTTPClient')
@@ -57,7 +61,21 @@ class TestKubernetesClient(base.TestCase):
             cert_file='test.cert', ca_cert='ca.crt',
             username='test-user', password='test-passwd')
         m_config.assert_called_once_with(self.config)
-        m_client.assrt_called_once_with(m_config)
+        m_client.assert_called_once_with(m_config.return_value)
+
+    @mock.patch('pykube.KubeConfig')
+    @mock.patch('pykube.HTTPClient')
+    def test_get_client_reused(self, m_client, m_config):
+        self.conf['kubernetes']._update(connection_pool_size=3)
+        client = kubernetes.get_client()
+        self.assertIs(client, kubernetes.get_client())
+        m_client.assert_called_once_with(m_config.return_value)
+        self.assertEqual(2, client.session.mount.call_count)
+        adapter = client.session.mount.call_args[0][1]
+        self.assertEqual(3, adapter._pool_maxsize)
+
+        kubernetes.get_client(kube_apiserver='http://otherhost:8080')
+        self.assertEqual(2, m_client.call_count)
 
 
 class TestKubernetesObjects(testscenarios.WithScenarios, base.TestCase):
@@ -67,37 +85,141 @@ class TestKubernetesObjects(testscenarios.WithScenarios, base.TestCase):
         ('DaemonSet', {'kind': 'DaemonSet', 'update': False}),
         ('Job', {'kind': 'Job', 'update': False}),
         ('Namespace', {'kind': 'Namespace', 'update': False}),
-        ('Service', {'kind': 'Service', 'update': True, 'reload': True}),
+        ('Service', {'kind': 'Service', 'update': True}),
         ('Ingress', {'kind': 'Ingress', 'update': True})
     )
-    reload = False
 
     def setUp(self):
         super(TestKubernetesObjects, self).setUp()
         self.conf.action.dry_run = False
         self.conf.action.export_dir = False
 
+    def _get_obj_mock(self, patch_code, post_code):
+        m_obj = mock.Mock(obj={'kind': self.kind})
+        m_obj.api_kwargs.side_effect = lambda **kw: dict(kw, url='test')
+        m_obj.api.patch.return_value = mock.Mock(status_code=patch_code)
+        m_obj.api.post.return_value = mock.Mock(status_code=post_code)
+        return m_obj
+
     def test_object_create(self):
         obj_dict = {'kind': self.kind, 'metadata': {'name': 'test'}}
-        m_obj = mock.Mock(exists=mock.Mock(return_value=False))
+        m_obj = self._get_obj_mock(404, 201)
         m_class = self.useFixture(fixtures.MockPatch(
             'pykube.{}'.format(self.kind), return_value=m_obj))
 
         kubernetes.process_object(obj_dict, client=mock.Mock())
         m_class.mock.assert_called_once_with(mock.ANY, obj_dict)
-        m_obj.create.assert_called_once_with()
+        # Without live objects, updatable objects are patched first
+        self.assertEqual(1 if self.update else 0,
+                         m_obj.api.patch.call_count)
+        m_obj.api.post.assert_called_once_with(
+            data=mock.ANY, obj_list=True, url='test')
+        m_obj.set_obj.assert_called_once_with(
+            m_obj.api.post.return_value.json.return_value)
+
+    def test_object_create_not_listed(self):
+        obj_dict = {'kind': self.kind, 'metadata': {'name': 'test'}}
+        m_obj = self._get_obj_mock(404, 201)
+        self.useFixture(fixtures.MockPatch(
+            'pykube.{}'.format(self.kind), return_value=m_obj))
+        m_get_live = mock.Mock(return_value=None)
+
+        kubernetes.process_object(obj_dict, client=mock.Mock(),
+                                  get_live_object=m_get_live)
+        m_obj.api.patch.assert_not_called()
+        m_obj.api.post.assert_called_once_with(
+            data=mock.ANY, obj_list=True, url='test')
+        if self.update:
+            m_get_live.assert_called_once_with(self.kind, 'test')
+        else:
+            m_get_live.assert_not_called()
+
+    def test_object_update_not_listed(self):
+        # Object was created after live objects had been listed
+        obj_dict = {'kind': self.kind, 'metadata': {'name': 'test'}}
+        m_obj = self._get_obj_mock(200, 409)
+        self.useFixture(fixtures.MockPatch(
+            'pykube.{}'.format(self.kind), return_value=m_obj))
+
+        kubernetes.process_object(obj_dict, client=mock.Mock(),
+                                  get_live_object=lambda kind, name: None)
+        m_obj.api.post.assert_called_once_with(
+            data=mock.ANY, obj_list=True, url='test')
+        if self.update:
+            m_obj.api.patch.assert_called_once_with(
+                data=mock.ANY, url='test', headers={
+                    'Content-Type': 'application/merge-patch+json'})
+        else:
+            m_obj.api.patch.assert_not_called()
 
     def test_object_update(self):
         obj_dict = {'kind': self.kind, 'metadata': {'name': 'test'}}
-        m_obj = mock.Mock(exists=mock.Mock(return_value=True))
+        m_obj = self._get_obj_mock(200, 409)
         m_class = self.useFixture(fixtures.MockPatch(
             'pykube.{}'.format(self.kind), return_value=m_obj))
+        live_obj = mock.Mock(obj={'metadata': {}})
 
-        kubernetes.process_object(obj_dict, client=mock.Mock())
+        kubernetes.process_object(obj_dict, client=mock.Mock(),
+                                  get_live_object=lambda kind, name: live_obj)
         m_class.mock.assert_called_once_with(mock.ANY, obj_dict)
-        m_obj.exists.assert_called_once_with()
-        m_obj.create.assert_not_called()
-        if self.reload:
-            m_obj.reload.assert_called_once_with()
+        m_obj.reload.assert_not_called()
+        if self.update:
+            m_obj.api.patch.assert_called_once_with(
+                data=mock.ANY, url='test', headers={
+                    'Content-Type': 'application/merge-patch+json'})
+            m_obj.api.post.assert_not_called()
+        else:
+            m_obj.api.patch.assert_not_called()
+            m_obj.api.post.assert_called_once_with(
+                data=mock.ANY, obj_list=True, url='test')
+            m_obj.set_obj.assert_not_called()
+
+    def test_object_unchanged(self):
+        obj_dict = {'kind': self.kind, 'metadata': {'name': 'test'}}
+        live_obj = {'kind': self.kind, 'metadata': {
+            'name': 'test', 'namespace': 'ccp', 'resourceVersion': '1',
+            'annotations': {
+                kubernetes.HASH_ANNOTATION: kubernetes.get_object_hash(
+                    dict(obj_dict, metadata={'name': 'test',
+                                             'namespace': 'ccp'}))}}}
+        m_obj = self._get_obj_mock(200, 409)
+        self.useFixture(fixtures.MockPatch(
+            'pykube.{}'.format(self.kind), return_value=m_obj))
+
+        kubernetes.process_object(
+            obj_dict, client=mock.Mock(),
+            get_live_object=lambda kind, name: mock.Mock(obj=live_obj))
+        m_obj.api.get.assert_not_called()
         if self.update:
-            m_obj.update.assert_called_once_with()
+            m_obj.api.patch.assert_not_called()
+            m_obj.api.post.assert_not_called()
+            m_obj.set_obj.assert_called_once_with(live_obj)
+            self.assertEqual(
+                live_obj['metadata']['annotations'],
+                obj_dict['metadata']['annotations'])
+
+
+class TestKubernetesObjectHash(base.TestCase):
+    def test_hash_ignores_own_annotation(self):
+        obj_dict = {'kind': 'ConfigMap', 'metadata': {'name': 'test'},
+                    'data': {'a': 'b'}}
+        obj_hash = kubernetes.set_object_hash(obj_dict)
+        self.assertEqual(obj_hash, kubernetes.get_object_hash(obj_dict))
+        self.assertEqual(obj_hash, kubernetes.set_object_hash(obj_dict))
+
+        obj_dict['data']['a'] = 'c'
+        self.assertNotEqual(obj_hash, kubernetes.get_object_hash(obj_dict))
+
+
+class TestKubernetesPatchType(base.TestCase):
+    def test_server_side_apply(self):
+        self.conf.kubernetes.patch_type = 'apply'
+        m_obj = mock.Mock(obj={'kind': 'Deployment'})
+        m_obj.api_kwargs.side_effect = lambda **kw: dict(kw, url='test')
+        m_obj.api.patch.return_value = mock.Mock(status_code=200)
+
+        self.assertTrue(kubernetes._patch_object(m_obj))
+        m_obj.api.patch.assert_called_once_with(
+            data='{"kind": "Deployment"}',
+            url='test?fieldManager=ccp&force=true',
+            headers={'Content-Type': 'application/apply-patch+yaml'})
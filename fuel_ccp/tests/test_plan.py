@@ -0,0 +1,147 @@
+import fixtures
+import mock
+
+from fuel_ccp import deploy
+from fuel_ccp import kubernetes
+from fuel_ccp import plan
+from fuel_ccp.tests import base
+
+
+def _configmap(name, data, annotations=None):
+    return {
+        'kind': 'ConfigMap',
+        'metadata': {'name': name, 'annotations': annotations or {}},
+        'data': data,
+    }
+
+
+class TestPlan(base.TestCase):
+    def setUp(self):
+        super(TestPlan, self).setUp()
+        self.useFixture(fixtures.MockPatchObject(plan, '_OBJECTS', []))
+        self.live = {}
+        self.m_get_object = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.informer.get_object',
+            side_effect=lambda kind, name: self.live.get((kind, name)))).mock
+        self.m_list = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.informer.list_objects',
+            side_effect=lambda kind: [obj for (k, _), obj
+                                      in sorted(self.live.items())
+                                      if k == kind])).mock
+        self.m_sync = self.useFixture(fixtures.MockPatch(
+            'fuel_ccp.informer.sync_informers')).mock
+
+    def _add_live(self, object_dict):
+        # Live objects always have namespace
+        object_dict['metadata']['namespace'] = 'ccp'
+        obj = mock.Mock(obj=object_dict)
+        obj.name = object_dict['metadata']['name']
+        self.live[(object_dict['kind'], obj.name)] = obj
+        return obj
+
+    def test_diff_objects(self):
+        live = {'metadata': {'name': 'a', 'uid': '1',
+                             'annotations': {kubernetes.HASH_ANNOTATION: 'x'}},
+                'spec': {'replicas': 1, 'ports': [{'port': 1}],
+                         'items': [1, 2]}}
+        rendered = {'metadata': {'name': 'a', 'labels': {'ccp': 'true'}},
+                    'spec': {'replicas': 3, 'ports': [{'port': 2}],
+                             'items': [1]}}
+        self.assertEqual([
+            ('metadata.labels', None, {'ccp': 'true'}),
+            ('spec.items', [1, 2], [1]),
+            ('spec.ports[0].port', 1, 2),
+            ('spec.replicas', 1, 3),
+        ], plan.diff_objects(live, rendered))
+
+    def test_get_changes(self):
+        unchanged = _configmap('unchanged', {'a': '1'})
+        kubernetes.set_object_hash(self._add_live(
+            _configmap('unchanged', {'a': '1'})).obj)
+        self._add_live(_configmap('changed', {'a': '1'}))
+        self._add_live({'kind': 'Job', 'metadata': {'name': 'job'}})
+        self._add_live({'kind': 'Service', 'metadata': {'name': 'removed'}})
+
+        for object_dict in [
+                unchanged,
+                _configmap('changed', {'a': '2'}),
+                _configmap('new', {'a': '1'}),
+                {'kind': 'Job', 'metadata': {'name': 'job'}, 'spec': {}}]:
+            plan.add_object(object_dict)
+
+        self.assertEqual([
+            (plan.UPDATE, 'ConfigMap', 'changed', [('data.a', '1', '2')]),
+            (plan.CREATE, 'ConfigMap', 'new', []),
+            (plan.UNCHANGED, 'ConfigMap', 'unchanged', []),
+            (plan.UNCHANGED, 'Job', 'job', []),
+            (plan.DELETE, 'Service', 'removed', []),
+        ], plan.get_changes())
+        self.m_sync.assert_called_once_with(['ConfigMap', 'Job'])
+        self.assertEqual(4, len(plan.get_changes(with_deleted=False)))
+
+    def test_get_changes_applied_hash(self):
+        # Hash is calculated by process_object after setting the namespace
+        applied = _configmap('conf', {'a': '1'})
+        kubernetes.get_pykube_object(applied, client=mock.Mock())
+        kubernetes.set_object_hash(applied)
+        live = self._add_live(applied)
+        # Fields defaulted by the API server are not compared
+        live.obj['metadata']['uid'] = 'uid'
+        live.obj['data']['b'] = 'default'
+        self.assertEqual('ccp', live.obj['metadata']['namespace'])
+
+        rendered = _configmap('conf', {'a': '1'})
+        with mock.patch('fuel_ccp.plan.diff_objects') as m_diff:
+            self.assertIs(live, plan.add_object(rendered))
+            self.assertEqual([(plan.UNCHANGED, 'ConfigMap', 'conf', [])],
+                             plan.get_changes(with_deleted=False))
+        self.assertFalse(m_diff.called)
+
+    def test_show_changes(self):
+        m_log = self.useFixture(fixtures.MockPatch('fuel_ccp.plan.LOG')).mock
+        counts = plan.show_changes([
+            (plan.UPDATE, 'ConfigMap', 'conf', [('data.a', 'x\ny\n', 'x\n')]),
+            (plan.UPDATE, 'Secret', 'secret', [('data.a', 'eA==', 'eQ==')]),
+            (plan.UNCHANGED, 'Job', 'job', []),
+        ])
+        self.assertEqual({plan.CREATE: 0, plan.UPDATE: 2, plan.UNCHANGED: 1,
+                          plan.DELETE: 0}, counts)
+        output = m_log.info.call_args_list[-1][0][0]
+        self.assertIn('~ ConfigMap/conf\n    data.a:\n', output)
+        self.assertIn('      -y', output)
+        self.assertIn('~ Secret/secret\n    data.a: changed', output)
+        self.assertNotIn('eQ==', output)
+        self.assertNotIn('Job', output)
+
+    def test_add_object(self):
+        self.useFixture(fixtures.MockPatch('fuel_ccp.kubernetes.get_client'))
+        unchanged = self._add_live(_configmap('unchanged', {'a': '1'}))
+        kubernetes.set_object_hash(unchanged.obj)
+        self._add_live(_configmap('changed', {'a': '1'}))
+
+        self.assertIs(unchanged,
+                      plan.add_object(_configmap('unchanged', {'a': '1'})))
+        changed = _configmap('changed', {'a': '2'})
+        version = plan.add_object(changed).obj['metadata']['resourceVersion']
+        self.assertEqual('plan-%s' % kubernetes.get_object_hash(changed),
+                         version)
+        self.assertNotIn('resourceVersion', changed['metadata'])
+        self.assertTrue(plan.add_object(_configmap('new', {})).obj[
+            'metadata']['resourceVersion'].startswith('plan-'))
+        self.assertEqual(3, len(plan._OBJECTS))
+
+    def test_show_changes_partial(self):
+        m_log = self.useFixture(fixtures.MockPatch('fuel_ccp.plan.LOG')).mock
+        plan.show_changes([], with_deleted=False)
+        self.assertIn('only when all components are deployed',
+                      m_log.info.call_args_list[-1][0][0])
+
+    @mock.patch('fuel_ccp.kubernetes.process_object')
+    def test_process_object(self, m_process):
+        self.conf.action._merge({'plan': True})
+        live = self._add_live(_configmap('conf', {}))
+        kubernetes.set_object_hash(live.obj)
+        object_dict = _configmap('conf', {})
+        self.assertIs(live, deploy._process_object(object_dict))
+        self.assertEqual([object_dict], plan._OBJECTS)
+        self.assertFalse(m_process.called)
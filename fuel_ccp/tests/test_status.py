@@ -0,0 +1,122 @@
+import mock
+
+from fuel_ccp import exceptions
+from fuel_ccp import status
+from fuel_ccp.tests import base
+
+
+def _state(pod_total=1, pod_running=1):
+    return dict(status.STATE_TEMPLATE, pod_total=pod_total,
+                pod_running=pod_running)
+
+
+@mock.patch('fuel_ccp.informer.wait_for_changes')
+@mock.patch('fuel_ccp.informer.get_generation', return_value=1)
+@mock.patch('fuel_ccp.status.get_pod_states')
+class TestWaitForReady(base.TestCase):
+    def test_wait_for_ready(self, m_states, m_generation, m_wait):
+        ready = {'keystone': _state(), 'mysql': _state()}
+        m_states.side_effect = [
+            {},
+            {'keystone': _state(), 'mysql': _state(pod_running=0)},
+            ready,
+        ]
+        self.assertEqual(ready, status.wait_for_ready(['keystone', 'mysql']))
+        self.assertEqual([mock.call(1, None)] * 2, m_wait.call_args_list)
+
+    def test_wait_for_ready_missing(self, m_states, m_generation, m_wait):
+        ready = {'keystone': _state(), 'mysql': _state()}
+        m_states.side_effect = [{'keystone': _state()}, ready]
+        self.assertEqual(ready, status.wait_for_ready(['keystone', 'mysql']))
+        m_wait.assert_called_once_with(1, None)
+
+    @mock.patch('fuel_ccp.informer.get_object')
+    def test_wait_for_ready_generations(self, m_get_object, m_states,
+                                        m_generation, m_wait):
+        ready = {'keystone': _state()}
+        m_states.return_value = ready
+        m_get_object.side_effect = [
+            None,
+            mock.Mock(obj={'metadata': {'generation': 1}}),
+            mock.Mock(obj={'metadata': {'generation': 2}}),
+        ]
+        self.assertEqual(ready, status.wait_for_ready(
+            ['keystone'], generations={('Deployment', 'keystone'): 2}))
+        self.assertEqual(2, m_wait.call_count)
+
+    def test_wait_for_ready_not_observed(self, m_states, m_generation,
+                                         m_wait):
+        ready = {'keystone': _state()}
+        m_states.side_effect = [
+            {'keystone': dict(_state(), observed=False)}, ready]
+        self.assertEqual(ready, status.wait_for_ready(['keystone']))
+        m_wait.assert_called_once_with(1, None)
+
+    @mock.patch('fuel_ccp.status.time')
+    def test_wait_for_ready_timeout(self, m_time, m_states, m_generation,
+                                    m_wait):
+        m_time.time.side_effect = [0, 5, 15]
+        m_states.return_value = {'mysql': _state(pod_running=0)}
+        self.assertRaisesRegexp(
+            exceptions.TimeoutException, 'Timed out waiting for: mysql',
+            status.wait_for_ready, timeout=10)
+        m_wait.assert_called_once_with(1, 5)
+
+    def test_show_short_status_watch(self, m_states, m_generation, m_wait):
+        m_states.return_value = {'mysql': _state()}
+        self.assertEqual(
+            (('status',), ((status.ST_OK,),)),
+            status.show_short_status(watch=True, timeout=10))
+        self.assertFalse(m_wait.called)
+
+
+class TestGetPodStates(base.TestCase):
+    def _get_obj(self, name, labels=None, **kwargs):
+        obj = mock.Mock()
+        obj.name = name
+        obj.labels = dict(labels or {}, app=name.split('-')[0])
+        obj.obj = dict(kwargs, metadata={'name': name, 'labels': obj.labels})
+        return obj
+
+    @mock.patch('fuel_ccp.informer.list_objects')
+    @mock.patch('fuel_ccp.informer.sync_informers')
+    def test_get_pod_states(self, m_sync, m_list):
+        ready = {'containerStatuses': [{'ready': True}]}
+        objects = {
+            'Deployment': [
+                self._get_obj(
+                    'keystone', spec={'replicas': 1},
+                    status={'availableReplicas': 1, 'updatedReplicas': 1,
+                            'replicas': 1}),
+                # status of the previous generation
+                self._get_obj(
+                    'nova', spec={'replicas': 1},
+                    status={'availableReplicas': 1, 'updatedReplicas': 1,
+                            'replicas': 1, 'observedGeneration': -1})],
+            'Job': [self._get_obj(
+                'keystone-db-create', spec={'completions': 1},
+                status={})],
+            'StatefulSet': [self._get_obj('galera', spec={'replicas': 3}),
+                            self._get_obj('etcd', spec={'replicas': 1},
+                                          status={'replicas': 1})],
+            'Pod': [self._get_obj('galera-0', status=ready),
+                    self._get_obj('galera-1', status=ready),
+                    self._get_obj('galera-2', status={}),
+                    self._get_obj('etcd-0', status=ready)],
+            'Service': [],
+        }
+        m_list.side_effect = lambda kind, selector=None: objects[kind]
+        self.conf.configs._merge({'ingress': {'enabled': False}})
+
+        states = status.get_pod_states()
+        self.assertEqual(
+            {'keystone': (1, 1, 1, 0, True), 'nova': (1, 1, 0, 0, False),
+             'galera': (3, 2, 0, 0, False), 'etcd': (1, 1, 0, 0, True)},
+            {name: (st['pod_total'], st['pod_running'], st['job_total'],
+                    st['job_completed'], st['observed'])
+             for name, st in states.items()})
+        m_sync.assert_called_once_with(
+            ('Deployment', 'Job', 'StatefulSet', 'Pod', 'Service'))
+        # pods are listed only once for all statefulsets
+        self.assertEqual(1, [c[0][0] for c in m_list.call_args_list].count(
+            'Pod'))
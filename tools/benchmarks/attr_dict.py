@@ -0,0 +1,145 @@
+"""Compare config AttrDict with the previous dict wrapper implementation.
+
+Loads the full config, including component defaults from the repositories
+configured in the given ccp config, and measures attribute access, merging
+and unwrapping for jsonschema with both implementations.
+
+Usage:
+    python tools/benchmarks/attr_dict.py [--repeat N] [config_file]
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+
+import six
+
+from fuel_ccp import config
+from fuel_ccp.config import _yaml
+
+
+class LegacyAttrDict(object):
+    """AttrDict as it was implemented before __slots__ were used"""
+
+    def __init__(self, *args, **kwargs):
+        self._dict = dict(*args, **kwargs)
+
+    def __getattr__(self, name):
+        try:
+            return object.__getattribute__(self, '_dict')[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def _items(self):
+        return six.iteritems(self._dict)
+
+    def _merge(self, other):
+        if isinstance(other, dict):
+            items = six.iteritems(other)
+        else:
+            items = other._items()
+        for key, other_value in items:
+            try:
+                value = self._dict[key]
+            except KeyError:
+                merge = False
+            else:
+                merge = isinstance(value, LegacyAttrDict)
+            if merge:
+                value._merge(other_value)
+            else:
+                if isinstance(other_value, dict):
+                    val = LegacyAttrDict()
+                    val._merge(other_value)
+                    other_value = val
+                self._dict[key] = other_value
+
+
+class LegacyUnwrapAttrDict(dict):
+    def __init__(self, attr_dict):
+        super(LegacyUnwrapAttrDict, self).__init__(attr_dict._dict)
+
+    @staticmethod
+    def _unwrap(obj):
+        if isinstance(obj, LegacyAttrDict):
+            return LegacyUnwrapAttrDict(obj)
+        elif isinstance(obj, list):
+            return list(map(LegacyUnwrapAttrDict._unwrap, obj))
+        else:
+            return obj
+
+    def __getitem__(self, name):
+        res = super(LegacyUnwrapAttrDict, self).__getitem__(name)
+        return self._unwrap(res)
+
+
+def read_all(obj):
+    """Access every value in the config as an attribute"""
+    stack = [obj]
+    count = 0
+    while stack:
+        obj = stack.pop()
+        for key in list(obj._dict):
+            value = getattr(obj, key)
+            count += 1
+            if hasattr(value, '_dict'):
+                stack.append(value)
+    return count
+
+
+def read_all_unwrapped(obj):
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        for key in list(obj):
+            value = obj[key]
+            if isinstance(value, dict):
+                stack.append(value)
+
+
+def run(data, cls, unwrap, repeat):
+    def merge():
+        res = cls()
+        res._merge(data)
+        return res
+
+    conf = merge()
+
+    def unwrap_all():
+        read_all_unwrapped(unwrap(conf))
+
+    def timed(func):
+        return min(timeit.repeat(func, number=1, repeat=repeat))
+
+    return (timed(lambda: read_all(conf)), timed(merge), timed(unwrap_all))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file', nargs='?')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    config.setup_config(args.config_file or config.find_config())
+    config.load_component_defaults()
+    data = _yaml.unwrap(config._REAL_CONF)
+    print("Config values: %d" % read_all(config._REAL_CONF))
+
+    implementations = [
+        ('legacy', LegacyAttrDict, LegacyUnwrapAttrDict),
+        ('current', _yaml.AttrDict, _yaml.unwrap),
+    ]
+    results = {}
+    print("%-10s %10s %10s %10s" % ("impl", "access, s", "merge, s",
+                                    "unwrap, s"))
+    for name, cls, unwrap in implementations:
+        results[name] = run(data, cls, unwrap, args.repeat)
+        print("%-10s %10.4f %10.4f %10.4f" % ((name,) + results[name]))
+    print("speedup    %9.1fx %9.1fx %9.1fx" % tuple(
+        old / new for old, new in zip(results['legacy'], results['current'])))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Measure resolution of the topology for a large number of nodes.
+
+Uses nodes and roles from the given topology file and generates Kubernetes
+node names. Besides patterns from the file, a pattern per rack is added, to
+show how resolution scales with the number of patterns. Results are compared
+with the previous implementation that matched every pattern against every
+node.
+
+Usage:
+    python tools/benchmarks/topology.py [--nodes N] [--racks N]
+        [--repeat N] [topology_file]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+from fuel_ccp.config import _yaml
+from fuel_ccp import deploy
+
+DEFAULT_TOPOLOGY = os.path.join(
+    os.path.dirname(__file__), '..', '..', 'etc',
+    'topology-with-large-number-of-nodes.yaml')
+
+
+def legacy_get_service_nodes(nodes, roles, node_names):
+    def find_match(glob):
+        matcher = re.compile(glob)
+        return [node for node in node_names if matcher.match(node)]
+
+    roles_to_node = {}
+    for node in sorted(nodes):
+        matched_nodes = find_match(node)
+        for role in nodes[node]["roles"] + [deploy.JOBS_ROLE]:
+            roles_to_node.setdefault(role, [])
+            roles_to_node[role].extend(matched_nodes)
+    service_to_node = {}
+    for role in sorted(roles):
+        if role in roles_to_node:
+            for svc in roles[role]:
+                service_to_node.setdefault(svc, [])
+                service_to_node[svc].extend(roles_to_node[role])
+    service_to_node[deploy.JOBS_ROLE] = roles_to_node[deploy.JOBS_ROLE]
+    return {k: sorted(set(v)) for k, v in service_to_node.items()}
+
+
+def get_service_nodes(nodes, roles, node_names):
+    return {k: sorted(v) for k, v in deploy._get_service_nodes(
+        nodes, roles, node_names).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('topology_file', nargs='?', default=DEFAULT_TOPOLOGY)
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--racks', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.topology_file) as f:
+        topology = _yaml.load(f)
+    nodes = topology.nodes
+    for rack in range(args.racks):
+        nodes['rack%d-node\\d+$' % rack] = _yaml.AttrDict(
+            roles=['compute', 'openvswitch'])
+    node_names = ['node%d' % i for i in range(1, 13)] + [
+        'rack%d-node%d' % (i % max(args.racks, 1), i)
+        for i in range(args.nodes - 12)]
+    print("Nodes: %d, patterns: %d" % (len(node_names), len(nodes)))
+
+    results = {}
+    times = {}
+    for name, func in [('legacy', legacy_get_service_nodes),
+                       ('current', get_service_nodes)]:
+        results[name] = func(nodes, topology.roles, node_names)
+        times[name] = min(timeit.repeat(
+            lambda: func(nodes, topology.roles, node_names),
+            number=1, repeat=args.repeat))
+        print("%-10s %8.3f s" % (name, times[name]))
+    if results['legacy'] != results['current']:
+        print("Results are different")
+        return 1
+    print("speedup    %7.1fx" % (times['legacy'] / times['current']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
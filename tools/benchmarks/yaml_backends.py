@@ -0,0 +1,78 @@
+"""Compare pure Python and libyaml based YAML loading and dumping.
+
+Parses component defaults from the repositories configured in the given ccp
+config and dumps all rendered service definitions using both backends.
+
+Usage:
+    python tools/benchmarks/yaml_backends.py [--repeat N] [config_file]
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+
+import yaml
+
+from fuel_ccp.common import utils
+from fuel_ccp import config
+
+
+def get_documents():
+    texts = []
+    for path in utils.get_config_paths():
+        try:
+            with open(path) as f:
+                texts.append(f.read())
+        except IOError:
+            continue
+    definitions = [service['service_content'] for service
+                   in utils.get_deploy_components_info().values()]
+    texts.extend(yaml.dump(d, Dumper=yaml.SafeDumper) for d in definitions)
+    return texts, definitions
+
+
+def run(texts, definitions, loader, dumper, repeat):
+    def load():
+        for text in texts:
+            yaml.load(text, Loader=loader)
+
+    def dump():
+        for definition in definitions:
+            yaml.dump(definition, Dumper=dumper, default_flow_style=False)
+
+    return (min(timeit.repeat(load, number=1, repeat=repeat)),
+            min(timeit.repeat(dump, number=1, repeat=repeat)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config_file', nargs='?')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    config.setup_config(args.config_file or config.find_config())
+    config.load_component_defaults()
+    texts, definitions = get_documents()
+    print("Documents: %d, service definitions: %d" % (
+        len(texts), len(definitions)))
+
+    backends = [('python', yaml.SafeLoader, yaml.SafeDumper)]
+    if hasattr(yaml, 'CSafeLoader'):
+        backends.append(('libyaml', yaml.CSafeLoader, yaml.CSafeDumper))
+    else:
+        print("PyYAML is built without libyaml, only python backend is used")
+
+    results = {}
+    print("%-10s %10s %10s" % ("backend", "load, s", "dump, s"))
+    for name, loader, dumper in backends:
+        results[name] = run(texts, definitions, loader, dumper, args.repeat)
+        print("%-10s %10.3f %10.3f" % ((name,) + results[name]))
+    if len(results) > 1:
+        print("speedup    %9.1fx %9.1fx" % tuple(
+            py / c for py, c in zip(results['python'], results['libyaml'])))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
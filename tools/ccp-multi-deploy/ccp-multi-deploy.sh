@@ -38,19 +38,14 @@ EOF
 }
 
 function ccp_wait_for_deployment_to_finish {
-    cnt=0
-    until [[ `${CCP} status -s -f value -c status` == "ok" ]]; do
-        echo "Waiting for OpenStack deployment to finish..."
-        sleep 5
-        cnt=$((cnt + 1))
-        if [ ${cnt} -eq 300 ]; then
-            echo "Max time exceeded"
-            if [ -n "${DEBUG}" ]; then
-                ./tools/diagnostic-snapshot.sh -n "${1}"
-            fi
-            exit 1
+    echo "Waiting for OpenStack deployment to finish..."
+    if ! ${CCP} status -s --watch --timeout 1500 -f value -c status; then
+        echo "Max time exceeded"
+        if [ -n "${DEBUG}" ]; then
+            ./tools/diagnostic-snapshot.sh -n "${1}"
         fi
-    done
+        exit 1
+    fi
     echo "...................................."
     echo "Jobs and pods in namespace: $1"
     kubectl --namespace $1 get jobs